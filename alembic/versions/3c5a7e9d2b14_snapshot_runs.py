@@ -0,0 +1,32 @@
+"""add snapshot_runs table for change-only seat history
+
+Revision ID: 3c5a7e9d2b14
+Revises: fb93e353abb0
+Create Date: 2026-10-16 10:12:41.118503
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5a7e9d2b14'
+down_revision: Union[str, None] = 'fb93e353abb0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'snapshot_runs',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('month', sa.Integer(), nullable=True),
+        sa.Column('year', sa.Integer(), nullable=True),
+        sa.Column('timestamp', sa.Integer(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('snapshot_runs')
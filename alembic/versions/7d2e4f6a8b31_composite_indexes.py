@@ -0,0 +1,59 @@
+"""composite and partial indexes for hot query shapes
+
+Revision ID: 7d2e4f6a8b31
+Revises: 3c5a7e9d2b14
+Create Date: 2026-10-16 11:02:17.402611
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e4f6a8b31'
+down_revision: Union[str, None] = '3c5a7e9d2b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_shows_active_year_month',
+        'shows',
+        ['year', 'month', 'seats'],
+        unique=False,
+        postgresql_where=sa.text('NOT is_deleted'),
+    )
+    op.create_index(
+        'ix_shows_year_month_updated_at',
+        'shows',
+        ['year', 'month', 'updated_at'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_show_seat_history_show_id_timestamp',
+        'show_seat_history',
+        ['show_id', 'timestamp'],
+        unique=False,
+    )
+    # (show_id, timestamp) covers every lookup by show_id alone
+    op.drop_index(
+        'ix_show_seat_history_show_id', table_name='show_seat_history'
+    )
+
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_show_seat_history_show_id',
+        'show_seat_history',
+        ['show_id'],
+        unique=False,
+    )
+    op.drop_index(
+        'ix_show_seat_history_show_id_timestamp',
+        table_name='show_seat_history',
+    )
+    op.drop_index('ix_shows_year_month_updated_at', table_name='shows')
+    op.drop_index('ix_shows_active_year_month', table_name='shows')
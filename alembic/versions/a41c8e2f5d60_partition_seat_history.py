@@ -0,0 +1,162 @@
+"""partition show_seat_history by month and add daily rollups
+
+Revision ID: a41c8e2f5d60
+Revises: 7d2e4f6a8b31
+Create Date: 2026-10-16 12:24:05.731942
+
+"""
+from datetime import UTC, datetime
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c8e2f5d60'
+down_revision: Union[str, None] = '7d2e4f6a8b31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Секции на текущий и два следующих месяца, дальше их создаёт
+# services/profticket/history_maintenance.ensure_partitions
+PARTITIONS_AHEAD = 2
+
+
+def _month(index: int) -> datetime:
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=UTC)
+
+
+def _create_partitions(first_ts: int) -> None:
+    first = datetime.fromtimestamp(first_ts, UTC)
+    now = datetime.now(UTC)
+    start = first.year * 12 + first.month - 1
+    stop = now.year * 12 + now.month - 1 + PARTITIONS_AHEAD
+    for index in range(start, stop + 1):
+        lower, upper = _month(index), _month(index + 1)
+        op.execute(
+            f'CREATE TABLE show_seat_history_p{lower:%Y%m} '
+            'PARTITION OF show_seat_history FOR VALUES '
+            f'FROM ({int(lower.timestamp())}) TO ({int(upper.timestamp())})'
+        )
+
+
+def upgrade() -> None:
+    op.execute('ALTER TABLE show_seat_history RENAME TO show_seat_history_old')
+    op.execute(
+        'ALTER TABLE show_seat_history_old '
+        'RENAME CONSTRAINT show_seat_history_pkey '
+        'TO show_seat_history_old_pkey'
+    )
+    op.execute('ALTER SEQUENCE show_seat_history_id_seq OWNED BY NONE')
+
+    # Ключ секционирования обязан входить в первичный ключ
+    op.execute(
+        'CREATE TABLE show_seat_history ('
+        "id INTEGER NOT NULL DEFAULT nextval('show_seat_history_id_seq'), "
+        'show_id VARCHAR REFERENCES shows (id), '
+        '"timestamp" INTEGER NOT NULL, '
+        'seats INTEGER, '
+        'PRIMARY KEY (id, "timestamp")'
+        ') PARTITION BY RANGE ("timestamp")'
+    )
+    op.execute(
+        'ALTER SEQUENCE show_seat_history_id_seq '
+        'OWNED BY show_seat_history.id'
+    )
+    op.execute(
+        'CREATE TABLE show_seat_history_default '
+        'PARTITION OF show_seat_history DEFAULT'
+    )
+
+    first_ts = (
+        op.get_bind()
+        .execute(sa.text('SELECT min("timestamp") FROM show_seat_history_old'))
+        .scalar()
+    )
+    _create_partitions(first_ts or int(datetime.now(UTC).timestamp()))
+
+    # Строки без timestamp не попадают ни в один отчёт
+    op.execute(
+        'INSERT INTO show_seat_history (id, show_id, "timestamp", seats) '
+        'SELECT id, show_id, "timestamp", seats FROM show_seat_history_old '
+        'WHERE "timestamp" IS NOT NULL'
+    )
+    op.drop_table('show_seat_history_old')
+
+    op.create_index(
+        'ix_show_seat_history_show_id_timestamp',
+        'show_seat_history',
+        ['show_id', 'timestamp'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_show_seat_history_timestamp',
+        'show_seat_history',
+        ['timestamp'],
+        unique=False,
+    )
+
+    op.create_table(
+        'show_seat_history_daily',
+        sa.Column(
+            'show_id',
+            sa.String(),
+            sa.ForeignKey('shows.id'),
+            primary_key=True,
+        ),
+        sa.Column('day', sa.Integer(), primary_key=True),
+        sa.Column('first_timestamp', sa.Integer(), nullable=True),
+        sa.Column('last_timestamp', sa.Integer(), nullable=True),
+        sa.Column('first_seats', sa.Integer(), nullable=True),
+        sa.Column('last_seats', sa.Integer(), nullable=True),
+        sa.Column('gross', sa.Integer(), nullable=True),
+        sa.Column('returned', sa.Integer(), nullable=True),
+        sa.Column('snapshots', sa.Integer(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    # Свёрнутая в дневные агрегаты история не восстанавливается
+    op.drop_table('show_seat_history_daily')
+
+    op.execute('ALTER TABLE show_seat_history RENAME TO show_seat_history_old')
+    op.execute('ALTER SEQUENCE show_seat_history_id_seq OWNED BY NONE')
+    op.execute(
+        'ALTER TABLE show_seat_history_old '
+        'RENAME CONSTRAINT show_seat_history_pkey '
+        'TO show_seat_history_old_pkey'
+    )
+
+    op.execute(
+        'CREATE TABLE show_seat_history ('
+        "id INTEGER NOT NULL DEFAULT nextval('show_seat_history_id_seq') "
+        'PRIMARY KEY, '
+        'show_id VARCHAR REFERENCES shows (id), '
+        '"timestamp" INTEGER, '
+        'seats INTEGER'
+        ')'
+    )
+    op.execute(
+        'ALTER SEQUENCE show_seat_history_id_seq '
+        'OWNED BY show_seat_history.id'
+    )
+    op.execute(
+        'INSERT INTO show_seat_history (id, show_id, "timestamp", seats) '
+        'SELECT id, show_id, "timestamp", seats FROM show_seat_history_old'
+    )
+    # Удаляет и все секции
+    op.drop_table('show_seat_history_old')
+
+    op.create_index(
+        'ix_show_seat_history_show_id_timestamp',
+        'show_seat_history',
+        ['show_id', 'timestamp'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_show_seat_history_timestamp',
+        'show_seat_history',
+        ['timestamp'],
+        unique=False,
+    )
@@ -0,0 +1,51 @@
+"""add show_actors index table
+
+Revision ID: c8f1d3a6e279
+Revises: a41c8e2f5d60
+Create Date: 2026-10-16 13:40:52.205117
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8f1d3a6e279'
+down_revision: Union[str, None] = 'a41c8e2f5d60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'show_actors',
+        sa.Column(
+            'show_id',
+            sa.String(),
+            sa.ForeignKey('shows.id'),
+            primary_key=True,
+        ),
+        sa.Column('position', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(), nullable=True),
+    )
+    # Заполняем из JSON-списков shows.actors
+    op.execute(
+        'INSERT INTO show_actors (show_id, position, name) '
+        'SELECT id, '
+        'row_number() OVER (PARTITION BY id ORDER BY ordinality) - 1, '
+        'name '
+        'FROM ('
+        'SELECT shows.id, actor.ordinality, btrim(actor.value) AS name '
+        'FROM shows, '
+        'json_array_elements_text(shows.actors::json) '
+        'WITH ORDINALITY AS actor(value, ordinality) '
+        "WHERE shows.actors IS NOT NULL AND shows.actors LIKE '[%'"
+        ') AS actors '
+        "WHERE name <> ''"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('show_actors')
@@ -0,0 +1,148 @@
+"""add show_stats summary table
+
+Revision ID: d2b7e4c91f05
+Revises: c8f1d3a6e279
+Create Date: 2026-10-16 15:12:38.604193
+
+"""
+import json
+from typing import Sequence, Union
+
+import numpy as np
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b7e4c91f05'
+down_revision: Union[str, None] = 'c8f1d3a6e279'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Копия services/profticket/show_stats.window_rate на момент ревизии:
+# миграция считает скорость так, как её считал снапшотер тогда, и не
+# зависит от кода приложения
+RATE_LOOKBACK_HOURS = 24
+RATE_MIN_DT = 900
+
+
+def _clipped_slope(t_hours: np.ndarray, y_seats: np.ndarray) -> float:
+    a1, b1 = np.polyfit(t_hours, y_seats, 1)
+    resid = y_seats - (a1 * t_hours + b1)
+    med = np.median(resid)
+    mad = np.median(np.abs(resid - med)) if np.any(resid) else 0.0
+    thr = 3.0 * mad if mad > 0 else 2.0 * np.std(resid)
+    if thr > 0:
+        mask = np.abs(resid - med) <= thr
+        if mask.sum() >= 2:
+            return np.polyfit(t_hours[mask], y_seats[mask], 1)[0]
+    return a1
+
+
+def window_rate(window: list[list[int]]) -> tuple[float | None, int]:
+    """Скорость продаж (билетов/с или None) и число интервалов окна"""
+    if len(window) < 2:
+        return None, 0
+    timestamps = np.asarray([point[0] for point in window], dtype=np.int64)
+    seats = np.asarray([point[1] for point in window], dtype=float)
+    cutoff = timestamps[-1] - RATE_LOOKBACK_HOURS * 3600
+    start = int(np.searchsorted(timestamps, cutoff, 'left'))
+    if len(timestamps) - start < 2:
+        return None, 0
+    keep = [start]
+    while True:
+        nxt = int(
+            np.searchsorted(timestamps, timestamps[keep[-1]] + RATE_MIN_DT)
+        )
+        if nxt >= len(timestamps):
+            break
+        keep.append(nxt)
+    intervals = len(keep) - 1
+    if intervals < 1:
+        return None, 0
+    ts, y_seats = timestamps[keep], seats[keep]
+    if len(keep) >= 7:
+        slope = _clipped_slope((ts - ts[0]) / 3600, y_seats)
+        rate = max(0.0, -slope / 3600.0)
+        return (rate if rate > 0 else None), intervals
+    rates = -np.diff(y_seats) / np.diff(ts)
+    age_hours = (timestamps[-1] - ts[1:]) / 3600
+    weights = np.exp(-age_hours / (RATE_LOOKBACK_HOURS / 2))
+    return float(np.average(rates, weights=weights)), intervals
+
+
+def upgrade() -> None:
+    op.create_table(
+        'show_stats',
+        sa.Column(
+            'show_id',
+            sa.String(),
+            sa.ForeignKey('shows.id'),
+            primary_key=True,
+        ),
+        sa.Column('gross', sa.Integer(), nullable=True),
+        sa.Column('returned', sa.Integer(), nullable=True),
+        sa.Column('snapshots', sa.Integer(), nullable=True),
+        sa.Column('first_seen', sa.Integer(), nullable=True),
+        sa.Column('last_timestamp', sa.Integer(), nullable=True),
+        sa.Column('last_seats', sa.Integer(), nullable=True),
+        sa.Column('rate_window', sa.String(), nullable=True),
+        sa.Column('current_rate', sa.Float(), nullable=True),
+        sa.Column('rate_intervals', sa.Integer(), nullable=True),
+    )
+    # Итоги по сырым снимкам и дневным агрегатам, как в
+    # report_queries.get_show_sales_totals; окно скорости — сырые
+    # снимки за последние сутки
+    op.execute(
+        'INSERT INTO show_stats (show_id, gross, returned, snapshots, '
+        'first_seen, last_timestamp, last_seats, rate_window, '
+        'rate_intervals) '
+        'SELECT event_id, '
+        'sum(gross) + sum(CASE WHEN diff > 0 THEN diff ELSE 0 END), '
+        'sum(returned) + sum(CASE WHEN diff < 0 THEN -diff ELSE 0 END), '
+        'sum(snapshots), min(ts), max(last_ts), '
+        '(array_agg(last_seats ORDER BY ts DESC, seq DESC))[1], '
+        'coalesce(json_agg(json_build_array(ts, last_seats) '
+        'ORDER BY ts, seq) FILTER (WHERE is_raw AND ts >= max_ts - '
+        f"{RATE_LOOKBACK_HOURS * 3600}), '[]')::text, 0 "
+        'FROM ('
+        'SELECT *, '
+        'lag(last_seats) OVER (PARTITION BY event_id ORDER BY ts, seq) '
+        '- first_seats AS diff, '
+        'max(last_ts) OVER (PARTITION BY event_id) AS max_ts '
+        'FROM ('
+        'SELECT show_id AS event_id, "timestamp" AS ts, id AS seq, '
+        '"timestamp" AS last_ts, seats AS first_seats, '
+        'seats AS last_seats, 0 AS gross, 0 AS returned, '
+        '1 AS snapshots, true AS is_raw '
+        'FROM show_seat_history '
+        'UNION ALL '
+        'SELECT show_id, first_timestamp, 0, last_timestamp, '
+        'first_seats, last_seats, gross, returned, snapshots, false '
+        'FROM show_seat_history_daily'
+        ') AS points'
+        ') AS diffs '
+        'GROUP BY event_id'
+    )
+
+    # Скорость по окну — копией расчёта снапшотера (window_rate выше)
+    bind = op.get_bind()
+    windows = bind.execute(
+        sa.text('SELECT show_id, rate_window FROM show_stats')
+    ).all()
+    update = sa.text(
+        'UPDATE show_stats SET current_rate = :rate, '
+        'rate_intervals = :intervals WHERE show_id = :show_id'
+    )
+    params = []
+    for show_id, rate_window in windows:
+        rate, intervals = window_rate(json.loads(rate_window))
+        params.append(
+            {'show_id': show_id, 'rate': rate, 'intervals': intervals}
+        )
+    if params:
+        bind.execute(update, params)
+
+
+def downgrade() -> None:
+    op.drop_table('show_stats')
@@ -0,0 +1,70 @@
+"""add first-seen index for show groups and artists
+
+Revision ID: e5a9c3f17b42
+Revises: d2b7e4c91f05
+Create Date: 2026-10-17 10:41:05.218734
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c3f17b42'
+down_revision: Union[str, None] = 'd2b7e4c91f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Копия analytics.TITLES_TO_SKIP на момент ревизии: звания из списков
+# актёров, которые не попадают в индекс артистов
+TITLES_TO_SKIP = (
+    'народный артист россии',
+    'народная артистка россии',
+    'заслуженный артист россии',
+    'заслуженная артистка россии',
+    'лауреат государственных премий',
+    'заслуженный деятель искусств',
+    'лауреат премии',
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'show_group_first_seen',
+        sa.Column('group_key', sa.String(), primary_key=True),
+        sa.Column('first_seen', sa.Integer(), nullable=True),
+    )
+    op.create_table(
+        'artist_first_seen',
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('first_seen', sa.Integer(), nullable=True),
+    )
+    # Группа — show_id, а без него id события, как в report_queries
+    op.execute(
+        'INSERT INTO show_group_first_seen (group_key, first_seen) '
+        'SELECT coalesce(nullif(shows.show_id, 0)::text, shows.id), '
+        'min(show_stats.first_seen) '
+        'FROM show_stats JOIN shows ON shows.id = show_stats.show_id '
+        'GROUP BY 1'
+    )
+    titles = ' AND '.join(
+        f"lower(show_actors.name) NOT LIKE '%{title}%'"
+        for title in TITLES_TO_SKIP
+    )
+    op.execute(
+        'INSERT INTO artist_first_seen (name, first_seen) '
+        'SELECT show_actors.name, min(groups.first_seen) '
+        'FROM show_actors '
+        'JOIN shows ON shows.id = show_actors.show_id '
+        'JOIN show_group_first_seen AS groups ON groups.group_key = '
+        'coalesce(nullif(shows.show_id, 0)::text, shows.id) '
+        f'WHERE {titles} '
+        'GROUP BY show_actors.name'
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('artist_first_seen')
+    op.drop_table('show_group_first_seen')
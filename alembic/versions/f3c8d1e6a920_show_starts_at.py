@@ -0,0 +1,100 @@
+"""add shows.starts_at parsed from the display date
+
+Revision ID: f3c8d1e6a920
+Revises: e5a9c3f17b42
+Create Date: 2026-10-17 12:06:51.734120
+
+"""
+import re
+from datetime import datetime
+from typing import Sequence, Union
+from zoneinfo import ZoneInfo
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8d1e6a920'
+down_revision: Union[str, None] = 'e5a9c3f17b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Разбор даты — копия analytics.localize_show_date на момент ревизии,
+# без кода приложения; пояс театра — значение DEFAULT_TIMEZONE по
+# умолчанию
+THEATER_TIMEZONE = ZoneInfo('Europe/Moscow')
+MONTHS_RU = {
+    'января': 1,
+    'февраля': 2,
+    'марта': 3,
+    'апреля': 4,
+    'мая': 5,
+    'июня': 6,
+    'июля': 7,
+    'августа': 8,
+    'сентября': 9,
+    'октября': 10,
+    'ноября': 11,
+    'декабря': 12,
+}
+RU_DATE = re.compile(r'(\d{1,2}) (\w+) (\d{4}), [^,]+, (\d{2}):(\d{2})')
+
+
+def localize_show_date(date_str: str) -> datetime | None:
+    """ISO, 'YYYY-MM-DD HH:MM' или '20 мая 2025, вт, 20:00'"""
+    try:
+        show_dt = datetime.fromisoformat(date_str)
+    except ValueError:
+        try:
+            show_dt = datetime.strptime(date_str, '%Y-%m-%d %H:%M')
+        except ValueError:
+            match = RU_DATE.match(date_str)
+            month = match and MONTHS_RU.get(match.group(2).lower())
+            if not month:
+                return None
+            day, _, year, hour, minute = match.groups()
+            try:
+                show_dt = datetime(
+                    int(year), month, int(day), int(hour), int(minute)
+                )
+            except ValueError:
+                return None
+    if show_dt.tzinfo is None:
+        show_dt = show_dt.replace(tzinfo=THEATER_TIMEZONE)
+    return show_dt
+
+
+def upgrade() -> None:
+    op.add_column(
+        'shows',
+        sa.Column('starts_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        'ix_shows_active_year_month_starts_at',
+        'shows',
+        ['year', 'month', 'starts_at', 'id'],
+        unique=False,
+        postgresql_where=sa.text('NOT is_deleted'),
+    )
+
+    # Дату разбирает копия кода снапшотера (localize_show_date выше)
+    bind = op.get_bind()
+    shows = bind.execute(
+        sa.text('SELECT id, date FROM shows WHERE date IS NOT NULL')
+    ).all()
+    params = [
+        {'id': show_id, 'starts_at': starts_at}
+        for show_id, date in shows
+        if (starts_at := localize_show_date(date)) is not None
+    ]
+    if params:
+        bind.execute(
+            sa.text('UPDATE shows SET starts_at = :starts_at WHERE id = :id'),
+            params,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_shows_active_year_month_starts_at', table_name='shows')
+    op.drop_column('shows', 'starts_at')
@@ -29,11 +29,39 @@ class Settings(BaseSettings):
     STOP_AFTER_ATTEMPT: int = 5
     WAIT_FIXED: int = 3
     PROXY_URL: str
+    # Кэш деталей спектаклей (актёры): размер и время жизни записей
+    SHOW_CACHE_SIZE: int = 2000
+    SHOW_CACHE_TTL: int = 21600  # 6 часов свежая запись
+    SHOW_CACHE_STALE_TTL: int = 86400  # ещё сутки отдаётся, пока обновляется
+    SHOW_CACHE_ERROR_TTL: int = 600  # ошибку не повторяем 10 минут
+    SHOW_CACHE_PATH: str = ''  # файл SQLite для кэша между перезапусками
+    # Темп запросов к Profticket и предел адаптивной параллельности
+    REQUEST_RATE: float = 5.0  # запросов в секунду в среднем
+    REQUEST_BURST: int = 5
+    REQUEST_MAX_CONCURRENCY: int = 10
+    # HTTP/2 к виджету (нужен пакет h2: pip install 'httpx[http2]')
+    HTTP2: bool = False
+    HTTP_MAX_CONNECTIONS: int = 10
+    HTTP_MAX_KEEPALIVE: int = 5
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0  # секунд простоя соединения
     # Show Update Service
     UPDATE_INTERVAL: int = 1800  # 30 минут
     ERROR_RETRY_INTERVAL: int = 60
     MAX_DATA_AGE: int = 1800
     MAX_CONSECUTIVE_ERRORS: int = 3
+    # Seat history: писать строку только при изменении мест
+    SEAT_HISTORY_CHANGES_ONLY: bool = False
+    SEAT_HISTORY_HEARTBEAT: int = 21600  # 6 часов, 0 — без heartbeat
+    # Сколько месяцев сырой истории хранить, старше — дневные агрегаты
+    SEAT_HISTORY_RETENTION_MONTHS: int = 6  # 0 — хранить всё
+    SEAT_HISTORY_MAINTENANCE_INTERVAL: int = 86400
+    # Сколько готовых отчётов аналитики держать в памяти (LRU)
+    REPORT_CACHE_SIZE: int = 128
+    # Расчёт отчётов вне цикла событий: 'process' или 'thread'
+    ANALYTICS_EXECUTOR: str = 'process'
+    ANALYTICS_WORKERS: int = 2
+    ANALYTICS_TIMEOUT: int = 120  # секунд на один отчёт
+    ANALYTICS_MAX_CONCURRENT: int = 2  # остальные отчёты ждут очереди
     # Time settings
     DEFAULT_TIMEZONE: str = 'Europe/Moscow'
 
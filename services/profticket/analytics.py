@@ -44,15 +44,33 @@ Analytics module for ProfTicket data
 import json
 import logging
 import re
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
-from collections.abc import Sequence
+from collections.abc import Iterable, Sequence
 from datetime import datetime
+from typing import NamedTuple
 
 import numpy as np
 import pytz
 
 from config import settings
-from telegram.db.models import Show, ShowSeatHistory
+from services.profticket.batch_fits import (
+    batch_predict_sold_out,
+    batch_sales_rates,
+    clipped_slope,
+    sold_out_from_fit,
+)
+from services.profticket.history_store import (
+    HistoryStore,
+    as_history_store,
+    series_from_rows,
+)
+from telegram.db.models import (
+    Show,
+    ShowSeatHistory,
+    ShowSeatHistoryDaily,
+    SnapshotRun,
+)
 
 # Common list of titles and awards to ignore when processing actors
 TITLES_TO_SKIP = [
@@ -65,6 +83,10 @@ TITLES_TO_SKIP = [
     'лауреат премии',
 ]
 
+# Минимум gross-продаж события для отчёта по проценту возвратов:
+# у шоу с малым количеством продаж процент не показателен
+RETURN_RATE_MIN_SOLD = 10
+
 MONTHS_RU = {
     'января': 1,
     'февраля': 2,
@@ -81,6 +103,109 @@ MONTHS_RU = {
 }
 
 
+def expand_seat_history(
+    shows: Sequence[Show],
+    histories: Sequence[ShowSeatHistory],
+    runs: Sequence[SnapshotRun],
+) -> list[ShowSeatHistory]:
+    """
+    Восстанавливает плотный ряд снимков из ряда «только изменения».
+
+    При SEAT_HISTORY_CHANGES_ONLY строки пишутся лишь при изменении мест,
+    а каждое обновление месяца отмечается в snapshot_runs. Спектакль
+    наблюдался в каждом обновлении своего месяца от первой записи до
+    updated_at, поэтому пропущенные снимки восстанавливаются точно:
+    места в момент обновления равны последнему записанному значению.
+    Для плотного ряда функция ничего не меняет.
+    """
+    if not runs:
+        return list(histories)
+
+    run_times: dict[tuple[int, int], list[int]] = defaultdict(list)
+    for run in runs:
+        run_times[(run.month, run.year)].append(run.timestamp)
+    for times in run_times.values():
+        times.sort()
+
+    buckets = defaultdict(list)
+    for h in histories:
+        buckets[h.show_id].append(h)
+
+    expanded: list[ShowSeatHistory] = []
+    for show in shows:
+        rows = buckets.pop(show.id, None)
+        if not rows:
+            continue
+        rows.sort(key=lambda r: r.timestamp)
+        times = run_times.get((show.month, show.year), [])
+        last_seen = max(
+            getattr(show, 'updated_at', None) or 0, rows[-1].timestamp
+        )
+        lo = bisect_left(times, rows[0].timestamp)
+        hi = bisect_right(times, last_seen)
+        recorded = {r.timestamp for r in rows}
+        missing = [ts for ts in times[lo:hi] if ts not in recorded]
+
+        expanded.extend(rows)
+        i = 0
+        for ts in missing:
+            while i + 1 < len(rows) and rows[i + 1].timestamp <= ts:
+                i += 1
+            expanded.append(
+                ShowSeatHistory(
+                    show_id=show.id, timestamp=ts, seats=rows[i].seats
+                )
+            )
+
+    for rows in buckets.values():
+        expanded.extend(rows)
+    return expanded
+
+
+def rollup_points(
+    daily: Iterable[ShowSeatHistoryDaily],
+) -> list[ShowSeatHistory]:
+    """
+    Превращает дневные агрегаты в снимки для функций анализа.
+
+    Каждые сутки дают первый и последний снимок дня. Изменения между
+    сутками сохраняются точно, продажи и возвраты внутри суток — только
+    в сумме (их учитывают итоги из БД, см. report_queries).
+    """
+    points: list[ShowSeatHistory] = []
+    for row in daily:
+        points.append(
+            ShowSeatHistory(
+                show_id=row.show_id,
+                timestamp=row.first_timestamp,
+                seats=row.first_seats,
+            )
+        )
+        if row.last_timestamp != row.first_timestamp:
+            points.append(
+                ShowSeatHistory(
+                    show_id=row.show_id,
+                    timestamp=row.last_timestamp,
+                    seats=row.last_seats,
+                )
+            )
+    return points
+
+
+def _filter_shows(
+    shows: Sequence[Show],
+    month: int | None,
+    year: int | None,
+    include_past_shows: bool = False,
+) -> list[Show]:
+    """Спектакли периода; прошедшие (is_deleted) — по include_past_shows"""
+    if month is not None and year is not None:
+        shows = [s for s in shows if s.month == month and s.year == year]
+    if include_past_shows:
+        return list(shows)
+    return [s for s in shows if not getattr(s, 'is_deleted', False)]
+
+
 def filter_data_by_period(
     shows: Sequence[Show],
     histories: Sequence[ShowSeatHistory],
@@ -96,197 +221,309 @@ def filter_data_by_period(
         (is_deleted=True) спектакли.
         Полезно для анализа скорости продаж и исторических данных.
     """
-    if month is not None and year is not None:
-        if include_past_shows:
-            # Включаем все спектакли, даже прошедшие
-            filtered_shows = [
-                s for s in shows if s.month == month and s.year == year
-            ]
-        else:
-            # Стандартная логика - исключаем прошедшие
-            filtered_shows = [
-                s
-                for s in shows
-                if s.month == month
-                and s.year == year
-                and not getattr(s, 'is_deleted', False)
-            ]
-        filtered_ids = {s.id for s in filtered_shows}
-        filtered_histories = [
-            h for h in histories if h.show_id in filtered_ids
-        ]
-    else:
-        if include_past_shows:
-            # За все время - включаем все спектакли
-            filtered_shows = list(shows)
-        else:
-            # За все время - исключаем прошедшие
-            filtered_shows = [
-                s for s in shows if not getattr(s, 'is_deleted', False)
-            ]
-        filtered_ids = {s.id for s in filtered_shows}
-        filtered_histories = [
-            h for h in histories if h.show_id in filtered_ids
-        ]
+    filtered_shows = _filter_shows(shows, month, year, include_past_shows)
+    filtered_ids = {s.id for s in filtered_shows}
 
     buckets = defaultdict(list)
-    for h in filtered_histories:
-        buckets[h.show_id].append(h)
+    for h in histories:
+        if h.show_id in filtered_ids:
+            buckets[h.show_id].append(h)
 
     return filtered_shows, buckets
 
 
+def series_sales_and_returns(seats: np.ndarray) -> tuple[int, int]:
+    """Продажи и возвраты по упорядоченному по времени ряду мест"""
+    if len(seats) < 2:
+        return 0, 0
+    diff = -np.diff(seats.astype(np.int64))
+    sold = int(np.clip(diff, 0, None).sum())
+    returned = int(np.clip(-diff, 0, None).sum())
+    return sold, returned
+
+
 def get_net_sales_and_returns(
     hist: Sequence[ShowSeatHistory],
 ) -> tuple[int, int]:
     """Подсчёт продаж и возвратов из истории"""
     if len(hist) < 2:
         return 0, 0
+    _, seats = series_from_rows(hist)
+    return series_sales_and_returns(seats)
 
-    sorted_hist = sorted(hist, key=lambda r: r.timestamp)
-    sold = returned = 0
 
-    for prev, curr in zip(sorted_hist, sorted_hist[1:], strict=False):
-        diff = prev.seats - curr.seats
-        if diff > 0:
-            sold += diff
-        elif diff < 0:
-            returned += -diff
+class ShowSalesTotals(NamedTuple):
+    """Итоги продаж по одному событию (gross/returned за всю историю)"""
 
-    return sold, returned
+    id: str
+    show_id: int | None
+    show_name: str
+    gross: int
+    returned: int
+    first_seen: int | None = None
 
 
-def top_shows_by_sales(
+def collect_store_sales_totals(
+    shows: Sequence[Show], store: HistoryStore
+) -> list[ShowSalesTotals]:
+    """
+    Итоги gross/returned по каждому событию из колоночной истории.
+
+    Продажи считаются одним проходом по всем событиям хранилища,
+    в итог попадают события с двумя и более снимками.
+    """
+    gross, returned = store.sales_and_returns()
+    counts = store.counts()
+    first_seen = store.first_timestamps()
+    totals = []
+    for show in shows:
+        i = store.positions.get(show.id)
+        if i is None or counts[i] < 2:
+            continue
+        totals.append(
+            ShowSalesTotals(
+                id=show.id,
+                show_id=getattr(show, 'show_id', None),
+                show_name=show.show_name,
+                gross=int(gross[i]),
+                returned=int(returned[i]),
+                first_seen=int(first_seen[i]),
+            )
+        )
+    return totals
+
+
+def collect_show_sales_totals(
     shows: Sequence[Show],
-    histories: Sequence[ShowSeatHistory],
-    month: int | None = None,
-    year: int | None = None,
-    n: int = 5,
-) -> list[tuple[str, int, str]]:
-    """Топ шоу по gross продажам (обратная совместимость)"""
-    filtered_shows, history_buckets = filter_data_by_period(
-        shows, histories, month, year
+    history_buckets: dict[str, list[ShowSeatHistory]],
+) -> list[ShowSalesTotals]:
+    """
+    Итоги gross/returned по каждому событию из истории в памяти.
+
+    Те же итоги снапшотер накапливает в show_stats, их читает
+    telegram.db.report_queries.get_show_sales_totals.
+    """
+    return collect_store_sales_totals(
+        shows, HistoryStore.from_buckets(history_buckets)
     )
 
+
+def top_shows_by_sales_from_totals(
+    totals: Iterable[ShowSalesTotals], n: int = 5
+) -> list[tuple[str, int, int, str]]:
+    """
+    Топ шоу по продажам по готовым итогам gross/returned
+    Возвращает: (name, gross_sales, net_sales, id)
+    """
     sales_data = {}
-    for show in filtered_shows:
-        h_rows = history_buckets.get(show.id, [])
-        if len(h_rows) < 2:
+    for row in totals:
+        if row.gross <= 0:
             continue
-
-        sold, _ = get_net_sales_and_returns(h_rows)
-        if sold > 0:
-            group_key = getattr(show, 'show_id', None) or show.id
-            if group_key not in sales_data:
-                sales_data[group_key] = {
-                    'name': show.show_name,
-                    'total_sold': 0,
-                    'id': group_key,
-                }
-            sales_data[group_key]['total_sold'] += sold
+        group_key = row.show_id or row.id
+        if group_key not in sales_data:
+            sales_data[group_key] = {
+                'name': row.show_name,
+                'total_sold': 0,
+                'total_returned': 0,
+                'id': group_key,
+            }
+        sales_data[group_key]['total_sold'] += row.gross
+        sales_data[group_key]['total_returned'] += row.returned
 
     # Сортируем по gross продажам
     ordered = sorted(sales_data.values(), key=lambda x: -x['total_sold'])
 
+    return [
+        (
+            item['name'],
+            item['total_sold'],  # gross
+            item['total_sold'] - item['total_returned'],  # net
+            item['id'],
+        )
+        for item in ordered[:n]
+    ]
+
+
+def top_shows_by_returns_from_totals(
+    totals: Iterable[ShowSalesTotals], n: int = 5
+) -> list[tuple[str, int, str]]:
+    """Топ шоу по количеству возвратов по готовым итогам"""
+    returns_data = {}
+    for row in totals:
+        if row.returned <= 0:
+            continue
+        group_key = row.show_id or row.id
+        if group_key not in returns_data:
+            returns_data[group_key] = {
+                'name': row.show_name,
+                'total_returns': 0,
+                'id': group_key,
+            }
+        returns_data[group_key]['total_returns'] += row.returned
+
+    ordered = sorted(returns_data.values(), key=lambda x: -x['total_returns'])
+    return [
+        (item['name'], item['total_returns'], item['id'])
+        for item in ordered[:n]
+    ]
+
+
+def top_shows_by_return_rate_from_totals(
+    totals: Iterable[ShowSalesTotals], n: int = 5
+) -> list[tuple[str, float, str]]:
+    """Топ шоу по проценту возвратов по готовым итогам"""
+    # Используем базу по продажам: return-rate = returned / sold
+    show_stats = {}
+    for row in totals:
+        sold, returned = row.gross, row.returned
+        if sold < RETURN_RATE_MIN_SOLD:
+            continue
+
+        return_rate = returned / sold if sold > 0 else 0.0
+
+        group_key = row.show_id or row.id
+        if group_key not in show_stats:
+            show_stats[group_key] = {
+                'name': row.show_name,
+                'return_rate': return_rate,
+                'total_sold': sold,
+                'id': group_key,
+            }
+        else:
+            # Если уже есть, пересчитываем средневзвешенный процент
+            existing = show_stats[group_key]
+            new_total = existing['total_sold'] + sold
+            new_rate = (
+                existing['return_rate'] * existing['total_sold']
+                + return_rate * sold
+            ) / new_total
+            existing['return_rate'] = new_rate
+            existing['total_sold'] = new_total
+
+    # Сортируем по проценту возвратов
+    result = [
+        (stats['name'], stats['return_rate'], stats['id'])
+        for stats in show_stats.values()
+    ]
+    result.sort(key=lambda x: -x[1])
+    return result[:n]
+
+
+def top_shows_by_sales(
+    shows: Sequence[Show],
+    histories: Sequence[ShowSeatHistory] | HistoryStore,
+    month: int | None = None,
+    year: int | None = None,
+    n: int = 5,
+) -> list[tuple[str, int, str]]:
+    """Топ шоу по gross продажам (обратная совместимость)"""
+    totals = collect_store_sales_totals(
+        _filter_shows(shows, month, year), as_history_store(histories)
+    )
     # Возвращаем только gross продажи для обратной совместимости
     return [
-        (item['name'], item['total_sold'], item['id']) for item in ordered[:n]
+        (name, gross, group_key)
+        for name, gross, _, group_key in top_shows_by_sales_from_totals(
+            totals, n=n
+        )
     ]
 
 
-def calculate_current_sales_rate(
-    history: Sequence[ShowSeatHistory], lookback_hours: int = 24
-) -> float | None:
+def _thin_series(timestamps: np.ndarray, min_dt: int) -> np.ndarray:
     """
-    Устойчивый расчёт текущей скорости продаж:
-    - Окно lookback_hours (по умолчанию 24 часа)
-    - Игнорируем интервалы короче MIN_DT (15 мин)
-    - Для достаточного числа точек (>= 7) используем линейную регрессию
-    seats(t)
-      с одноразовым клиппингом выбросов по остаткам;
-      иначе — EWMA по интервалам.
+    Индексы точек ряда с шагом не меньше min_dt.
 
-    Возвращает билетов/секунду (умножить на 3600 для билетов/час,
-    на 86400 для билетов/день).
+    Жадно, как и раньше: первая точка остаётся, следующей берётся первая
+    точка не раньше предыдущей выбранной плюс min_dt.
     """
-    if len(history) < 2:
+    keep = [0]
+    size = len(timestamps)
+    while True:
+        nxt = int(
+            np.searchsorted(timestamps, timestamps[keep[-1]] + min_dt, 'left')
+        )
+        if nxt >= size:
+            break
+        keep.append(nxt)
+    return np.asarray(keep, dtype=np.int64)
+
+
+def _recent_window(timestamps: np.ndarray, lookback_hours: int) -> int:
+    """Индекс первой точки окна lookback_hours до последнего снимка"""
+    cutoff_ts = timestamps[-1] - lookback_hours * 3600
+    return int(np.searchsorted(timestamps, cutoff_ts, 'left'))
+
+
+def series_sales_rate(
+    timestamps: np.ndarray, seats: np.ndarray, lookback_hours: int = 24
+) -> float | None:
+    """Скорость продаж (билетов/секунду) по упорядоченному ряду"""
+    if len(timestamps) < 2:
         return None
 
     MIN_DT = 900  # 15 минут — минимальный шаг между соседними точками
 
-    records = sorted(history, key=lambda r: r.timestamp)
-    current_ts = records[-1].timestamp
-    lookback_seconds = lookback_hours * 3600
-    cutoff_ts = current_ts - lookback_seconds
-
+    current_ts = int(timestamps[-1])
     # Фильтруем записи за последние lookback_hours
-    recent_records = [r for r in records if r.timestamp >= cutoff_ts]
-    if len(recent_records) < 2:
+    start = _recent_window(timestamps, lookback_hours)
+    if len(timestamps) - start < 2:
         return None
 
     # Оставляем только точки с шагом >= MIN_DT
-    filtered: list[ShowSeatHistory] = []
-    for rec in recent_records:
-        if not filtered:
-            filtered.append(rec)
-            continue
-        if rec.timestamp - filtered[-1].timestamp >= MIN_DT:
-            filtered.append(rec)
-
-    if len(filtered) < 2:
+    keep = start + _thin_series(timestamps[start:], MIN_DT)
+    if len(keep) < 2:
         return None
+    ts = timestamps[keep]
+    y_seats = seats[keep].astype(float)
 
     # Если точек >= 7 (интервалов >= 6): линейная регрессия ( seats = a*t + b )
     # Примечание: t в часах для численной стабильности; rate_sec = -a/3600
-    if len(filtered) >= 7:
-        t0 = filtered[0].timestamp
-        t_hours = np.array(
-            [(r.timestamp - t0) / 3600 for r in filtered], dtype=float
-        )
-        y_seats = np.array([r.seats for r in filtered], dtype=float)
-
-        # Первичная оценка
-        a1, b1 = np.polyfit(t_hours, y_seats, 1)
-        resid = y_seats - (a1 * t_hours + b1)
-        med = np.median(resid)
-        mad = np.median(np.abs(resid - med)) if np.any(resid) else 0.0
-
-        # Порог клиппинга: 3*MAD (или 2*STD при MAD==0)
-        if mad > 0:
-            thr = 3.0 * mad
-        else:
-            std = np.std(resid)
-            thr = 2.0 * std
-
-        if thr > 0:
-            mask = np.abs(resid - med) <= thr
-            if mask.sum() >= 2:
-                a2, b2 = np.polyfit(t_hours[mask], y_seats[mask], 1)
-                slope = a2
-            else:
-                slope = a1
-        else:
-            slope = a1
+    if len(keep) >= 7:
+        t_hours = (ts - ts[0]) / 3600
 
+        # Прямая с одноразовым клиппингом выбросов по 3*MAD (2*STD)
+        slope = clipped_slope(t_hours, y_seats)
         rate_sec = max(0.0, -slope / 3600.0)
         return rate_sec if rate_sec > 0 else None
 
-    # Иначе — EWMA по интервалам (как раньше), но с MIN_DT=15 мин
-    rates: list[float] = []
-    weights: list[float] = []
-    for prev, curr in zip(filtered, filtered[1:], strict=False):
-        dt = curr.timestamp - prev.timestamp
-        if dt < MIN_DT:
-            continue
-        rate = (prev.seats - curr.seats) / dt
-        age_hours = (current_ts - curr.timestamp) / 3600
-        weight = np.exp(-age_hours / (lookback_hours / 2))
-        rates.append(rate)
-        weights.append(weight)
+    # Иначе — EWMA по интервалам (как раньше), но с MIN_DT=15 мин;
+    # после прореживания все интервалы не короче MIN_DT
+    rates = -np.diff(y_seats) / np.diff(ts)
+    age_hours = (current_ts - ts[1:]) / 3600
+    weights = np.exp(-age_hours / (lookback_hours / 2))
+    return float(np.average(rates, weights=weights))
+
 
-    if not rates:
+def calculate_current_sales_rate(
+    history: Sequence[ShowSeatHistory], lookback_hours: int = 24
+) -> float | None:
+    """
+    Устойчивый расчёт текущей скорости продаж:
+    - Окно lookback_hours (по умолчанию 24 часа)
+    - Игнорируем интервалы короче MIN_DT (15 мин)
+    - Для достаточного числа точек (>= 7) используем линейную регрессию
+    seats(t)
+      с одноразовым клиппингом выбросов по остаткам;
+      иначе — EWMA по интервалам.
+
+    Возвращает билетов/секунду (умножить на 3600 для билетов/час,
+    на 86400 для билетов/день).
+    """
+    if len(history) < 2:
         return None
-    return float(np.average(rates, weights=weights))
+    return series_sales_rate(*series_from_rows(history), lookback_hours)
+
+
+def series_valid_intervals(
+    timestamps: np.ndarray, lookback_hours: int = 24, min_dt: int = 900
+) -> int:
+    """Число интервалов не короче min_dt в окне lookback_hours"""
+    if len(timestamps) < 2:
+        return 0
+    start = _recent_window(timestamps, lookback_hours)
+    if len(timestamps) - start < 2:
+        return 0
+    return len(_thin_series(timestamps[start:], min_dt)) - 1
 
 
 def _count_valid_intervals(
@@ -296,25 +533,13 @@ def _count_valid_intervals(
 ) -> int:
     if len(history) < 2:
         return 0
-    records = sorted(history, key=lambda r: r.timestamp)
-    current_ts = records[-1].timestamp
-    cutoff_ts = current_ts - lookback_hours * 3600
-    recent = [r for r in records if r.timestamp >= cutoff_ts]
-    if len(recent) < 2:
-        return 0
-    count = 0
-    last = recent[0]
-    for rec in recent[1:]:
-        dt = rec.timestamp - last.timestamp
-        if dt >= min_dt:
-            count += 1
-            last = rec
-    return count
+    timestamps, _ = series_from_rows(history)
+    return series_valid_intervals(timestamps, lookback_hours, min_dt)
 
 
 def top_shows_by_current_sales_speed(
     shows: Sequence[Show],
-    histories: Sequence[ShowSeatHistory],
+    histories: Sequence[ShowSeatHistory] | HistoryStore,
     month: int | None = None,
     year: int | None = None,
     n: int = 5,
@@ -336,26 +561,28 @@ def top_shows_by_current_sales_speed(
         :param n:
         :param year:
     """
-    filtered_shows, history_buckets = filter_data_by_period(
-        shows, histories, month, year, include_past_shows=include_past_shows
-    )
+    filtered_shows = _filter_shows(shows, month, year, include_past_shows)
+    store = as_history_store(histories)
 
     # Агрегируем по group_key (show_id или id):
     # считаем средневзвешенную скорость с весом по числу валидных интервалов
     agg_by_group: dict[str, dict[str, float | str]] = {}
 
-    for show in filtered_shows:
-        h_rows = history_buckets.get(show.id, [])
-        if len(h_rows) < 3:  # Нужно минимум 3 записи для адекватной оценки
-            continue
+    # Нужно минимум 3 записи для адекватной оценки
+    candidates = [
+        show for show in filtered_shows if len(store.series(show.id)[0]) >= 3
+    ]
+    # Используем последние 24 часа для оценки текущей скорости;
+    # регрессии по всем спектаклям считаются одним пакетом
+    rates, intervals = batch_sales_rates(
+        store, [show.id for show in candidates], lookback_hours=24, min_dt=900
+    )
 
-        # Используем последние 24 часа для оценки текущей скорости
-        current_rate = calculate_current_sales_rate(h_rows, lookback_hours=24)
-        if current_rate is not None and current_rate > 0:
+    for show, current_rate, weight in zip(
+        candidates, rates.tolist(), intervals.tolist(), strict=True
+    ):
+        if current_rate > 0:
             group_key = getattr(show, 'show_id', None) or show.id
-            weight = _count_valid_intervals(
-                h_rows, lookback_hours=24, min_dt=900
-            )
             if weight <= 0:
                 weight = 1
             rec = agg_by_group.get(group_key)
@@ -381,6 +608,56 @@ def top_shows_by_current_sales_speed(
     return speed_data[:n]
 
 
+def series_predict_sold_out(
+    timestamps: np.ndarray,
+    seats: np.ndarray,
+    show_dt: datetime | None,
+    now_ts: int,
+) -> int | None:
+    """Прогноз sold-out (unix time) по упорядоченному ряду мест"""
+    # Требуем минимум 4 точки (>= 3 интервалов)
+    if len(timestamps) < 4:
+        return None
+
+    # Анализируем последние 7 дней или всю историю, если она короче
+    lookback_seconds = 7 * 24 * 3600
+    cutoff_ts = max(int(timestamps[0]), now_ts - lookback_seconds)
+    start = int(np.searchsorted(timestamps, cutoff_ts, 'left'))
+
+    # Отфильтровываем слишком короткие интервалы (<5 минут) — шум
+    MIN_DT = 300  # 5 минут
+    keep = np.zeros(0, dtype=np.int64)
+    if start < len(timestamps):
+        keep = start + _thin_series(timestamps[start:], MIN_DT)
+
+    # Если после фильтрации точек меньше 4, попробуем взять хвост истории
+    # с требованием соблюдения минимального шага
+    if len(keep) < 4:
+        # ограничим хвост десятью записями
+        tail = max(0, len(timestamps) - 10)
+        keep = tail + _thin_series(timestamps[tail:], MIN_DT)
+
+    # Требуем минимум 4 точки (>=3 интервала) после фильтрации
+    if len(keep) < 4:
+        return None
+
+    # Полиномиальная регрессия 2-й степени для учёта тренда;
+    # время нормализуем в часах для численной стабильности
+    ts = timestamps[keep]
+    t_normalized = (ts - ts[0]) / 3600
+    coeffs = np.polyfit(t_normalized, seats[keep].astype(float), 2)
+    return sold_out_from_fit(
+        tuple(coeffs.tolist()),
+        int(ts[0]),
+        float(t_normalized[-1]),
+        int(seats[keep[0]]),
+        int(ts[-1]),
+        int(seats[keep[-1]]),
+        show_dt.timestamp() if show_dt else None,
+        now_ts,
+    )
+
+
 def predict_sold_out_advanced(
     history: Sequence[ShowSeatHistory],
     show_dt: datetime | None = None,
@@ -394,117 +671,25 @@ def predict_sold_out_advanced(
     if len(history) < 4:
         return None
 
-    records = sorted(history, key=lambda r: r.timestamp)
-
     if now_ts is None:
         tz = pytz.timezone(
             getattr(settings, 'DEFAULT_TIMEZONE', 'Europe/Moscow')
         )
         now_ts = int(datetime.now(tz).timestamp())
 
-    # Анализируем последние 7 дней или всю историю, если она короче
-    lookback_seconds = 7 * 24 * 3600
-    cutoff_ts = max(records[0].timestamp, now_ts - lookback_seconds)
-    recent_records = [r for r in records if r.timestamp >= cutoff_ts]
-
-    # Отфильтровываем слишком короткие интервалы (<5 минут) — шум
-    MIN_DT = 300  # 5 минут
-    filtered: list[ShowSeatHistory] = []
-    for rec in recent_records:
-        if not filtered:
-            filtered.append(rec)
-            continue
-        if rec.timestamp - filtered[-1].timestamp >= MIN_DT:
-            filtered.append(rec)
-
-    # Если после фильтрации точек меньше 4, попробуем взять хвост истории
-    # с требованием соблюдения минимального шага
-    if len(filtered) < 4:
-        tail_filtered: list[ShowSeatHistory] = []
-        for rec in records[-10:]:  # ограничим хвост десятью записями
-            if not tail_filtered:
-                tail_filtered.append(rec)
-                continue
-            if rec.timestamp - tail_filtered[-1].timestamp >= MIN_DT:
-                tail_filtered.append(rec)
-        filtered = tail_filtered
-
-    # Требуем минимум 4 точки (>=3 интервала) после фильтрации
-    if len(filtered) < 4:
-        return None
-
-    # Собираем временные ряды
-    timestamps = []
-    seats = []
-
-    for rec in filtered:
-        timestamps.append(rec.timestamp)
-        seats.append(rec.seats)
-
-    # Полиномиальная регрессия для учёта тренда
-    if len(timestamps) >= 4:
-        # Нормализуем время для численной стабильности
-        t_min = min(timestamps)
-        t_normalized = [(t - t_min) / 3600 for t in timestamps]  # в часах
-
-        # Используем полином 2-й степени
-        coeffs = np.polyfit(t_normalized, seats, 2)
-
-        # Предсказываем, когда seats = 0
-        # Решаем квадратное уравнение ax² + bx + c = 0
-        a, b, c = coeffs
-        discriminant = b**2 - 4 * a * c
-
-        if discriminant >= 0 and a != 0:
-            # Берём положительный корень
-            t_sold_out = (-b - np.sqrt(discriminant)) / (2 * a)
-            if t_sold_out > t_normalized[-1]:  # Прогноз в будущее
-                sold_out_ts = t_min + int(t_sold_out * 3600)
-
-                # Проверки на адекватность
-                if show_dt and sold_out_ts > show_dt.timestamp():
-                    return None
-                if sold_out_ts <= now_ts:
-                    return None
-                if sold_out_ts > now_ts + 365 * 24 * 3600:  # Более года
-                    return None
-
-                return sold_out_ts
-
-    # Fallback: линейная экстраполяция по последним точкам
-    if len(filtered) >= 4:
-        last_rec = filtered[-1]
-        # Средняя скорость по чистому изменению за период
-        total_time = filtered[-1].timestamp - filtered[0].timestamp
-        total_sold = filtered[0].seats - filtered[-1].seats
-
-        if total_time > 0 and total_sold > 0:
-            avg_rate = total_sold / total_time
-            seconds_left = last_rec.seats / avg_rate
-
-            if 0 < seconds_left < 365 * 24 * 3600:
-                prediction = last_rec.timestamp + int(seconds_left)
-                if (
-                    show_dt
-                    and prediction <= show_dt.timestamp()
-                    and prediction > now_ts
-                ):
-                    return prediction
-
-    return None
+    return series_predict_sold_out(*series_from_rows(history), show_dt, now_ts)
 
 
 def shows_predicted_to_sell_out_soonest(
     shows: Sequence[Show],
-    histories: Sequence[ShowSeatHistory],
+    histories: Sequence[ShowSeatHistory] | HistoryStore,
     month: int | None = None,
     year: int | None = None,
     n: int = 5,
 ) -> list[tuple[str, int, str, str]]:
     """Шоу, которые прогнозируются к sold-out в ближайшее время"""
-    filtered_shows, history_buckets = filter_data_by_period(
-        shows, histories, month, year
-    )
+    filtered_shows = _filter_shows(shows, month, year)
+    store = as_history_store(histories)
 
     DEFAULT_TZ_STR = getattr(settings, 'DEFAULT_TIMEZONE', 'Europe/Moscow')
     try:
@@ -515,28 +700,38 @@ def shows_predicted_to_sell_out_soonest(
         now = datetime.now(timezone)
 
     now_ts = int(now.timestamp())
-    predictions = []
+    candidates = []
+    show_timestamps = []
 
     for show in filtered_shows:
-        show_dt = parse_show_date(show.date)
+        show_dt = show_starts_at(show)
         if show_dt is None:
             continue
 
-        if show_dt.tzinfo is None:
-            show_dt = timezone.localize(show_dt)
-
         if show_dt < now:
             continue
 
-        h_rows = history_buckets.get(show.id, [])
-        if len(h_rows) < 3:
+        if len(store.series(show.id)[0]) < 3:
             continue
 
-        prediction_ts = predict_sold_out_advanced(h_rows, show_dt, now_ts)
-        if prediction_ts:
-            predictions.append(
-                (show.show_name, prediction_ts, show.id, show.date)
-            )
+        candidates.append(show)
+        show_timestamps.append(show_dt.timestamp())
+
+    # Параболы по всем спектаклям считаются одним пакетом
+    predictions = [
+        (show.show_name, prediction_ts, show.id, show.date)
+        for show, prediction_ts in zip(
+            candidates,
+            batch_predict_sold_out(
+                store,
+                [show.id for show in candidates],
+                show_timestamps,
+                now_ts,
+            ),
+            strict=True,
+        )
+        if prediction_ts
+    ]
 
     # Сортируем по времени предсказания
     predictions.sort(key=lambda x: x[1])
@@ -574,165 +769,137 @@ def parse_show_date(date_str: str) -> datetime | None:
             return None
 
 
+def localize_show_date(date_str: str | None) -> datetime | None:
+    """Дата показа с часовым поясом театра; пишется в Show.starts_at"""
+    show_dt = parse_show_date(date_str) if date_str else None
+    if show_dt is not None and show_dt.tzinfo is None:
+        show_dt = pytz.timezone(settings.DEFAULT_TIMEZONE).localize(show_dt)
+    return show_dt
+
+
+def show_starts_at(show: Show) -> datetime | None:
+    """
+    Начало показа из starts_at; строку date разбираем, только если
+    столбец не заполнен (объекты, созданные вне снапшотера)
+    """
+    starts_at = getattr(show, 'starts_at', None)
+    if starts_at is None:
+        return localize_show_date(show.date)
+    if starts_at.tzinfo is None:
+        # SQLite не хранит пояс: там лежит местное время театра
+        starts_at = pytz.timezone(settings.DEFAULT_TIMEZONE).localize(
+            starts_at
+        )
+    return starts_at
+
+
 def top_shows_by_returns(
     shows: Sequence[Show],
-    histories: Sequence[ShowSeatHistory],
+    histories: Sequence[ShowSeatHistory] | HistoryStore,
     month: int | None = None,
     year: int | None = None,
     n: int = 5,
     include_past_shows: bool = False,
 ) -> list[tuple[str, int, str]]:
     """Топ шоу по количеству возвратов"""
-    filtered_shows, history_buckets = filter_data_by_period(
-        shows, histories, month, year, include_past_shows=include_past_shows
+    totals = collect_store_sales_totals(
+        _filter_shows(shows, month, year, include_past_shows),
+        as_history_store(histories),
     )
-
-    returns_data = {}
-    for show in filtered_shows:
-        h_rows = history_buckets.get(show.id, [])
-        if len(h_rows) < 2:
-            continue
-
-        _, returned = get_net_sales_and_returns(h_rows)
-        if returned > 0:
-            group_key = getattr(show, 'show_id', None) or show.id
-            if group_key not in returns_data:
-                returns_data[group_key] = {
-                    'name': show.show_name,
-                    'total_returns': 0,
-                    'id': group_key,
-                }
-            returns_data[group_key]['total_returns'] += returned
-
-    ordered = sorted(returns_data.values(), key=lambda x: -x['total_returns'])
-    return [
-        (item['name'], item['total_returns'], item['id'])
-        for item in ordered[:n]
-    ]
+    return top_shows_by_returns_from_totals(totals, n=n)
 
 
 def top_shows_by_return_rate(
     shows: Sequence[Show],
-    histories: Sequence[ShowSeatHistory],
+    histories: Sequence[ShowSeatHistory] | HistoryStore,
     month: int | None = None,
     year: int | None = None,
     n: int = 5,
     include_past_shows: bool = False,
 ) -> list[tuple[str, float, str]]:
     """Топ шоу по проценту возвратов"""
-    filtered_shows, history_buckets = filter_data_by_period(
-        shows, histories, month, year, include_past_shows=include_past_shows
+    totals = collect_store_sales_totals(
+        _filter_shows(shows, month, year, include_past_shows),
+        as_history_store(histories),
     )
+    return top_shows_by_return_rate_from_totals(totals, n=n)
 
-    show_stats = {}
-    for show in filtered_shows:
-        h_rows = history_buckets.get(show.id, [])
-        if len(h_rows) < 2:
-            continue
 
-        sold, returned = get_net_sales_and_returns(h_rows)
+def show_actor_names(shows: Iterable[Show]) -> list[tuple[str, str]]:
+    """
+    Пары (id события, имя актёра) из JSON-поля shows.actors.
 
-        # Используем базу по продажам: return-rate = returned / sold
-        # Фильтруем шоу с малым количеством продаж
-        MIN_SOLD = 10
-        if sold < MIN_SOLD:
-            continue
+    Та же нормализация, что и у таблицы show_actors: только непустые
+    строки без пробелов по краям.
+    """
+    pairs = []
+    for show in shows:
+        try:
+            actors_list = json.loads(show.actors) if show.actors else []
+            if not isinstance(actors_list, list):
+                actors_list = []
+        except json.JSONDecodeError:
+            actors_list = []
+        for actor in actors_list:
+            if isinstance(actor, str) and actor.strip():
+                pairs.append((show.id, actor.strip()))
+    return pairs
 
-        return_rate = returned / sold if sold > 0 else 0.0
 
-        group_key = getattr(show, 'show_id', None) or show.id
-        if group_key not in show_stats:
-            show_stats[group_key] = {
-                'name': show.show_name,
-                'return_rate': return_rate,
-                'total_sold': sold,
-                'id': group_key,
-            }
-        else:
-            # Если уже есть, пересчитываем средневзвешенный процент
-            existing = show_stats[group_key]
-            new_total = existing['total_sold'] + sold
-            new_rate = (
-                existing['return_rate'] * existing['total_sold']
-                + return_rate * sold
-            ) / new_total
-            existing['return_rate'] = new_rate
-            existing['total_sold'] = new_total
+def top_artists_by_sales_from_totals(
+    totals: Iterable[ShowSalesTotals],
+    actors: Iterable[tuple[str, str]],
+    n: int = 5,
+) -> list[tuple[str, int]]:
+    """
+    Топ артистов по net продажам из итогов по событиям.
 
-    # Сортируем по проценту возвратов
-    result = [
-        (stats['name'], stats['return_rate'], stats['id'])
-        for stats in show_stats.values()
-    ]
-    result.sort(key=lambda x: -x[1])
-    return result[:n]
+    actors — пары (id события, имя актёра), например строки show_actors.
+    """
+    show_net_sales = {}
+    for row in totals:
+        net_sales = row.gross - row.returned
+        if net_sales > 0:  # Учитываем только положительные net продажи
+            show_net_sales[row.id] = net_sales
+
+    artist_aggregated_sales = defaultdict(int)
+    for event_id, actor_name in actors:
+        net_sales_for_this_show = show_net_sales.get(event_id)
+        if not net_sales_for_this_show:
+            continue
+        # Отфильтровываем титулы, оставляя только реальных актеров
+        actor_lower = actor_name.lower()
+        if any(title in actor_lower for title in TITLES_TO_SKIP):
+            continue
+        artist_aggregated_sales[actor_name] += net_sales_for_this_show
+
+    return sorted(
+        artist_aggregated_sales.items(), key=lambda x: (-x[1], x[0])
+    )[:n]
 
 
 def top_artists_by_sales(
     shows: Sequence[Show],
-    histories: Sequence[ShowSeatHistory],
+    histories: Sequence[ShowSeatHistory] | HistoryStore,
     month: int | None = None,
     year: int | None = None,
     n: int = 5,
     include_past_shows: bool = False,
 ) -> list[tuple[str, int]]:
     """Топ артистов по net продажам (продажи минус возвраты)"""
-    filtered_shows, history_buckets = filter_data_by_period(
-        shows, histories, month, year, include_past_shows=include_past_shows
+    filtered_shows = _filter_shows(shows, month, year, include_past_shows)
+    return top_artists_by_sales_from_totals(
+        collect_store_sales_totals(
+            filtered_shows, as_history_store(histories)
+        ),
+        show_actor_names(filtered_shows),
+        n,
     )
 
-    show_net_sales = {}
-    for show in filtered_shows:
-        h_rows = history_buckets.get(show.id, [])
-        if len(h_rows) < 2:
-            continue
-
-        sold, returned = get_net_sales_and_returns(h_rows)
-        net_sales = sold - returned
-        if net_sales > 0:  # Учитываем только положительные net продажи
-            show_net_sales[show.id] = net_sales
-
-    artist_aggregated_sales = defaultdict(int)
-
-    for show in filtered_shows:
-        net_sales_for_this_show = show_net_sales.get(show.id, 0)
-        if net_sales_for_this_show > 0:
-            try:
-                actors_list = json.loads(show.actors) if show.actors else []
-                if not isinstance(actors_list, list):
-                    actors_list = []
-            except json.JSONDecodeError:
-                actors_list = []
-
-            # Отфильтровываем только реальных актеров, исключая титулы
-            real_actors = []
-            for actor in actors_list:
-                if not isinstance(actor, str) or not actor.strip():
-                    continue
-
-                actor_name = actor.strip()
-                actor_lower = actor_name.lower()
-
-                # Проверяем, не является ли строка титулом
-                is_title = any(
-                    title in actor_lower for title in TITLES_TO_SKIP
-                )
-
-                if not is_title:
-                    real_actors.append(actor_name)
-
-            # Добавляем net продажи только для реальных актеров
-            for actor_name in real_actors:
-                artist_aggregated_sales[actor_name] += net_sales_for_this_show
-
-    return sorted(
-        artist_aggregated_sales.items(), key=lambda x: (-x[1], x[0])
-    )[:n]
-
 
 def calendar_pace_dashboard(
     shows: Sequence[Show],
-    histories: Sequence[ShowSeatHistory],
+    histories: Sequence[ShowSeatHistory] | HistoryStore,
     month: int | None = None,
     year: int | None = None,
     n: int = 10,  # Добавляем для совместимости API (не используется)
@@ -746,43 +913,41 @@ def calendar_pace_dashboard(
         n: параметр для совместимости API
         (не используется, т.к. возвращаем данные по дням)
     """
-    filtered_shows, history_buckets = filter_data_by_period(
-        shows, histories, month, year, include_past_shows=include_past_shows
+    filtered_shows = _filter_shows(shows, month, year, include_past_shows)
+    dates = {s.id: s.date for s in filtered_shows}
+    starts = {s.id: show_starts_at(s) for s in filtered_shows}
+    totals = collect_store_sales_totals(
+        filtered_shows, as_history_store(histories)
     )
 
     # Группируем по датам шоу
+    date_starts: dict[str, datetime | None] = {}
     date_groups = defaultdict(
         lambda: {
             'shows': [],
             'total_gross': 0,
             'total_net': 0,
             'total_refunds': 0,
-            'histories': [],
         }
     )
 
-    for show in filtered_shows:
-        h_rows = history_buckets.get(show.id, [])
-        if len(h_rows) < 2:
-            continue
-
-        sold, returned = get_net_sales_and_returns(h_rows)
+    for row in totals:
+        sold, returned = row.gross, row.returned
         net_sales_amount = sold - returned  # Чистая сумма продаж без возвратов
 
-        show_date = show.date
-        date_groups[show_date]['shows'].append(show.show_name)
+        show_date = dates[row.id]
+        date_starts.setdefault(show_date, starts[row.id])
+        date_groups[show_date]['shows'].append(row.show_name)
         date_groups[show_date]['total_gross'] += sold  # Gross = все продажи
         date_groups[show_date]['total_net'] += (
             net_sales_amount  # Net = продажи - возвраты
         )
         date_groups[show_date]['total_refunds'] += returned
-        date_groups[show_date]['histories'].extend(h_rows)
 
-    # Сортируем по дате (распарсиваем строковые даты в datetime)
-    # Для неподдающихся парсингу — сортируем по строковому значению после дат
+    # Сортируем по началу показа; даты без starts_at — по строке после них
     sortable: list[tuple[int, object, str, dict]] = []
     for date_str, data in date_groups.items():
-        dt = parse_show_date(date_str)
+        dt = date_starts[date_str]
         if dt is not None:
             sortable.append((0, dt, date_str, data))
         else:
@@ -823,7 +988,7 @@ def calendar_pace_dashboard(
 def show_financial_summary(
     show_id: str,
     shows: Sequence[Show],
-    histories: Sequence[ShowSeatHistory],
+    histories: Sequence[ShowSeatHistory] | HistoryStore,
     n: int = 10,  # Добавляем для совместимости API (не используется)
 ) -> dict | None:
     """
@@ -845,7 +1010,9 @@ def show_financial_summary(
         return None
 
     # Собираем всю историю для этого шоу
-    all_histories = []
+    store = as_history_store(histories)
+    all_timestamps = []
+    all_seats = []
     total_gross = 0
     total_net = 0
     total_refunds = 0
@@ -853,11 +1020,11 @@ def show_financial_summary(
     show_names = set()
 
     for show in target_shows:
-        h_rows = [h for h in histories if h.show_id == show.id]
-        if len(h_rows) < 2:
+        timestamps, seats = store.series(show.id)
+        if len(timestamps) < 2:
             continue
 
-        sold, returned = get_net_sales_and_returns(h_rows)
+        sold, returned = series_sales_and_returns(seats)
         net_sales = sold - returned
 
         total_gross += sold
@@ -865,7 +1032,8 @@ def show_financial_summary(
         total_net += net_sales
         show_dates.append(show.date)
         show_names.add(show.show_name)
-        all_histories.extend(h_rows)
+        all_timestamps.append(timestamps)
+        all_seats.append(seats)
 
     if total_gross == 0:
         return None
@@ -875,9 +1043,15 @@ def show_financial_summary(
 
     # Текущая скорость продаж
     current_sales_rate = None
-    if all_histories:
-        current_sales_rate = calculate_current_sales_rate(
-            all_histories, lookback_hours=24
+    if all_timestamps:
+        # Общий ряд всех показов; устойчивая сортировка сохраняет
+        # порядок показов при совпадающих timestamp
+        timestamps = np.concatenate(all_timestamps)
+        order = np.argsort(timestamps, kind='stable')
+        current_sales_rate = series_sales_rate(
+            timestamps[order],
+            np.concatenate(all_seats)[order],
+            lookback_hours=24,
         )
 
     return {
@@ -897,7 +1071,7 @@ def show_financial_summary(
 
 def top_shows_by_sales_detailed(
     shows: Sequence[Show],
-    histories: Sequence[ShowSeatHistory],
+    histories: Sequence[ShowSeatHistory] | HistoryStore,
     month: int | None = None,
     year: int | None = None,
     n: int = 5,
@@ -907,38 +1081,8 @@ def top_shows_by_sales_detailed(
     Топ шоу по продажам с детализацией gross/net
     Возвращает: (name, gross_sales, net_sales, id)
     """
-    filtered_shows, history_buckets = filter_data_by_period(
-        shows, histories, month, year, include_past_shows=include_past_shows
+    totals = collect_store_sales_totals(
+        _filter_shows(shows, month, year, include_past_shows),
+        as_history_store(histories),
     )
-
-    sales_data = {}
-    for show in filtered_shows:
-        h_rows = history_buckets.get(show.id, [])
-        if len(h_rows) < 2:
-            continue
-
-        sold, returned = get_net_sales_and_returns(h_rows)
-        if sold > 0:
-            group_key = getattr(show, 'show_id', None) or show.id
-            if group_key not in sales_data:
-                sales_data[group_key] = {
-                    'name': show.show_name,
-                    'total_sold': 0,
-                    'total_returned': 0,
-                    'id': group_key,
-                }
-            sales_data[group_key]['total_sold'] += sold
-            sales_data[group_key]['total_returned'] += returned
-
-    # Сортируем по gross продажам
-    ordered = sorted(sales_data.values(), key=lambda x: -x['total_sold'])
-
-    return [
-        (
-            item['name'],
-            item['total_sold'],  # gross
-            item['total_sold'] - item['total_returned'],  # net
-            item['id'],
-        )
-        for item in ordered[:n]
-    ]
+    return top_shows_by_sales_from_totals(totals, n=n)
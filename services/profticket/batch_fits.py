@@ -0,0 +1,434 @@
+"""
+Пакетные регрессии по истории мест сразу для всех событий.
+
+Скорость продаж и прогноз sold-out по одному ряду считаются в
+analytics (series_sales_rate, series_predict_sold_out) через
+np.polyfit, то есть по два-три вызова NumPy на спектакль. Здесь те же
+расчёты выполняются для всех событий HistoryStore разом: точки всех
+рядов лежат в одном массиве, суммы по рядам считаются через
+np.bincount, а МНК решается в замкнутой форме — линейная регрессия по
+центрированным суммам, квадратичная через пакетное решение 3x3
+нормальных уравнений в центрированном и нормированном базисе.
+"""
+
+import math
+from collections.abc import Sequence
+
+import numpy as np
+
+from services.profticket.history_store import HistoryStore
+
+HOUR = 3600
+# Остатки ближе к порогу клиппинга (относительно порога) пакетный МНК
+# и np.polyfit могут округлить по разные стороны от него; такие ряды
+# пересчитываются поштучно через clipped_slope
+CLIP_AMBIGUITY = 1e-9
+# Прогноз sold-out: окно истории и предел горизонта
+SOLD_OUT_LOOKBACK = 7 * 24 * HOUR
+SOLD_OUT_HORIZON = 365 * 24 * HOUR
+
+
+def _segments(
+    store: HistoryStore, event_ids: Sequence[str]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Позиции событий в хранилище и границы их рядов (пусто, если нет)"""
+    positions = np.fromiter(
+        (store.positions.get(event_id, -1) for event_id in event_ids),
+        dtype=np.int64,
+        count=len(event_ids),
+    )
+    found = positions >= 0
+    starts = np.where(found, store.offsets[positions], 0)
+    ends = np.where(found, store.offsets[positions + 1], 0)
+    return np.where(found, positions, 0), starts, ends
+
+
+def thin_segments(
+    store: HistoryStore,
+    positions: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    min_dt: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Прореживание рядов с минимальным шагом min_dt.
+
+    Повторяет жадный отбор из analytics._thin_series для каждого ряда
+    ``[starts[k], ends[k])``: за один шаг цикла выбирается очередная
+    точка сразу во всех рядах, так что число итераций равно длине
+    самой длинной цепочки, а не числу событий.
+
+    :return: Глобальные индексы выбранных точек и номера их рядов,
+        упорядоченные по ряду и времени
+    """
+    owner = np.flatnonzero(starts < ends)
+    index = starts[owner]
+    picked_index = []
+    picked_owner = []
+    while len(index):
+        picked_index.append(index)
+        picked_owner.append(owner)
+        nxt = store.search(positions[owner], store.timestamps[index] + min_dt)
+        alive = nxt < ends[owner]
+        index, owner = nxt[alive], owner[alive]
+    if not picked_index:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    index = np.concatenate(picked_index)
+    owner = np.concatenate(picked_owner)
+    order = np.lexsort((index, owner))
+    return index[order], owner[order]
+
+
+def _group_starts(counts: np.ndarray) -> np.ndarray:
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    return starts
+
+
+def segment_median(
+    owner: np.ndarray, values: np.ndarray, size: int
+) -> np.ndarray:
+    """Медиана values по группам owner (как np.median внутри группы)"""
+    counts = np.bincount(owner, minlength=size)
+    ordered = values[np.lexsort((values, owner))]
+    if not len(ordered):
+        return np.zeros(size)
+    mid = np.minimum(_group_starts(counts) + counts // 2, len(ordered) - 1)
+    lower = np.maximum(mid - 1, 0)
+    return np.where(
+        counts % 2 == 1,
+        ordered[mid],
+        (ordered[lower] + ordered[mid]) / 2,
+    )
+
+
+def _linear_fit(
+    owner: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray,
+    size: int,
+    weights: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """МНК-прямая y = a*x + b по группам owner (точки с весом 0 или 1)"""
+    w = np.ones(len(x)) if weights is None else weights.astype(float)
+    n = np.bincount(owner, w, minlength=size)
+    x_mean = np.bincount(owner, w * x, minlength=size) / n
+    y_mean = np.bincount(owner, w * y, minlength=size) / n
+    dx = x - x_mean[owner]
+    dy = y - y_mean[owner]
+    sxx = np.bincount(owner, w * dx * dx, minlength=size)
+    sxy = np.bincount(owner, w * dx * dy, minlength=size)
+    slope = sxy / sxx
+    return slope, y_mean - slope * x_mean
+
+
+def clipped_slope(t_hours: np.ndarray, y_seats: np.ndarray) -> float:
+    """
+    Наклон прямой seats(t) с одноразовым клиппингом выбросов по остаткам.
+
+    Общая часть analytics.series_sales_rate и batch_sales_rates для
+    рядов с остатком на границе клиппинга: первичная прямая через
+    np.polyfit, отсечение по 3*MAD (2*STD при MAD == 0) и повторная
+    прямая по оставшимся точкам.
+
+    :param t_hours: Время в часах от первой точки
+    :param y_seats: Места в эти моменты
+    :return: Наклон в местах/час
+    """
+    a1, b1 = np.polyfit(t_hours, y_seats, 1)
+    resid = y_seats - (a1 * t_hours + b1)
+    med = np.median(resid)
+    mad = np.median(np.abs(resid - med)) if np.any(resid) else 0.0
+
+    # Порог клиппинга: 3*MAD (или 2*STD при MAD==0)
+    if mad > 0:
+        thr = 3.0 * mad
+    else:
+        std = np.std(resid)
+        thr = 2.0 * std
+
+    if thr > 0:
+        mask = np.abs(resid - med) <= thr
+        if mask.sum() >= 2:
+            a2, b2 = np.polyfit(t_hours[mask], y_seats[mask], 1)
+            return a2
+    return a1
+
+
+def batch_sales_rates(
+    store: HistoryStore,
+    event_ids: Sequence[str],
+    lookback_hours: int = 24,
+    min_dt: int = 900,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Текущая скорость продаж для всех событий разом.
+
+    Пакетный аналог analytics.series_sales_rate и
+    analytics.series_valid_intervals: окно lookback_hours, прореживание
+    с шагом min_dt, при 7+ точках — прямая с отсечением выбросов по
+    3*MAD (2*STD), иначе — EWMA по интервалам.
+
+    :param store: История мест
+    :param event_ids: События, для которых нужна скорость
+    :param lookback_hours: Окно оценки в часах
+    :param min_dt: Минимальный шаг между точками в секундах
+    :return: Скорость в билетах/секунду (nan, если её нет) и число
+        валидных интервалов для каждого события
+    """
+    size = len(event_ids)
+    rates = np.full(size, np.nan)
+    if not len(store.timestamps):
+        return rates, np.zeros(size, dtype=np.int64)
+    positions, starts, ends = _segments(store, event_ids)
+    eligible = ends - starts >= 2
+    last_ts = store.timestamps[np.maximum(ends - 1, 0)]
+
+    window = store.search(positions, last_ts - lookback_hours * HOUR)
+    eligible &= ends - window >= 2
+    window = np.where(eligible, window, ends)
+    index, owner = thin_segments(store, positions, window, ends, min_dt)
+    kept = np.bincount(owner, minlength=size)
+    intervals = np.maximum(kept - 1, 0)
+    if not len(index):
+        return rates, intervals
+
+    timestamps = store.timestamps[index]
+    seats = store.seats[index].astype(float)
+    first_ts = timestamps[_group_starts(kept)[owner]]
+    x = (timestamps - first_ts) / HOUR
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Линейная регрессия с одноразовым клиппингом остатков
+        fit = kept[owner] >= 7
+        o, xf, yf = owner[fit], x[fit], seats[fit]
+        if len(o):
+            a1, b1 = _linear_fit(o, xf, yf, size)
+            resid = yf - (a1[o] * xf + b1[o])
+            med = segment_median(o, resid, size)
+            nonzero = np.bincount(o, resid != 0, minlength=size) > 0
+            mad = np.where(
+                nonzero,
+                segment_median(o, np.abs(resid - med[o]), size),
+                0.0,
+            )
+            n = np.bincount(o, minlength=size)
+            resid_mean = np.bincount(o, resid, minlength=size) / n
+            std = np.sqrt(
+                np.bincount(o, (resid - resid_mean[o]) ** 2, minlength=size)
+                / n
+            )
+            thr = np.where(mad > 0, 3.0 * mad, 2.0 * std)
+            spread = np.abs(resid - med[o])
+            mask = spread <= thr[o]
+            a2, _ = _linear_fit(o, xf, yf, size, weights=mask)
+            refit = (thr > 0) & (np.bincount(o, mask, minlength=size) >= 2)
+            slope = np.where(refit, a2, a1)
+            # Остаток на самом пороге: отбор точек решает округление,
+            # поэтому такие ряды считаются так же, как поштучно
+            boundary = np.abs(spread - thr[o]) <= thr[o] * CLIP_AMBIGUITY
+            ambiguous = (thr > 0) & (
+                np.bincount(o, boundary, minlength=size) > 0
+            )
+            for k in np.flatnonzero(ambiguous):
+                lo, hi = np.searchsorted(o, [k, k + 1])
+                slope[k] = clipped_slope(xf[lo:hi], yf[lo:hi])
+            rate = np.maximum(0.0, -slope / 3600.0)
+            fitted = (kept >= 7) & (rate > 0)
+            rates[fitted] = rate[fitted]
+
+        # EWMA по интервалам для коротких рядов
+        pair = owner[1:] == owner[:-1]
+        pair &= (kept[owner[1:]] >= 2) & (kept[owner[1:]] < 7)
+        o = owner[1:][pair]
+        if len(o):
+            step_rate = -np.diff(seats)[pair] / np.diff(timestamps)[pair]
+            age_hours = (last_ts[o] - timestamps[1:][pair]) / 3600
+            weight = np.exp(-age_hours / (lookback_hours / 2))
+            ewma = np.bincount(o, weight * step_rate, minlength=size) / (
+                np.bincount(o, weight, minlength=size)
+            )
+            short = (kept >= 2) & (kept < 7)
+            rates[short] = ewma[short]
+    return rates, intervals
+
+
+def sold_out_from_fit(
+    coeffs: tuple[float, float, float],
+    first_ts: int,
+    last_x: float,
+    first_seats: int,
+    last_ts: int,
+    last_seats: int,
+    show_ts: float | None,
+    now_ts: int,
+) -> int | None:
+    """
+    Момент sold-out по квадратичной аппроксимации ряда.
+
+    Общая часть прогноза для одного ряда и для пакета: корень
+    a*x² + b*x + c = 0 (x — часы от first_ts) с проверками на
+    адекватность, иначе линейная экстраполяция по крайним точкам.
+    """
+    a, b, c = coeffs
+    discriminant = b**2 - 4 * a * c
+    # Корень (-b - sqrt(D)) / 2a в виде 2c / (-b + sqrt(D)): при почти
+    # линейном ряде (a ~ 0) прямая формула теряет все знаки на
+    # вычитании близких чисел, эта даёт корень прямой -c/b
+    denominator = -b + math.sqrt(discriminant) if discriminant >= 0 else 0
+
+    if denominator != 0:
+        t_sold_out = 2 * c / denominator
+        if t_sold_out > last_x:  # Прогноз в будущее
+            sold_out_ts = first_ts + int(t_sold_out * 3600)
+
+            # Проверки на адекватность
+            if show_ts is not None and sold_out_ts > show_ts:
+                return None
+            if sold_out_ts <= now_ts:
+                return None
+            if sold_out_ts > now_ts + SOLD_OUT_HORIZON:  # Более года
+                return None
+
+            return sold_out_ts
+
+    # Fallback: линейная экстраполяция по последним точкам
+    # Средняя скорость по чистому изменению за период
+    total_time = last_ts - first_ts
+    total_sold = first_seats - last_seats
+
+    if total_time > 0 and total_sold > 0:
+        avg_rate = total_sold / total_time
+        seconds_left = last_seats / avg_rate
+
+        if 0 < seconds_left < SOLD_OUT_HORIZON:
+            prediction = last_ts + int(seconds_left)
+            if (
+                show_ts is not None
+                and prediction <= show_ts
+                and prediction > now_ts
+            ):
+                return prediction
+
+    return None
+
+
+def _quadratic_fit(
+    owner: np.ndarray, x: np.ndarray, y: np.ndarray, size: int
+) -> np.ndarray:
+    """
+    МНК-парабола по группам owner: коэффициенты (a, b, c) при x², x, 1.
+
+    Нормальные уравнения решаются в базисе u = (x - mean) / std, где
+    они хорошо обусловлены, затем коэффициенты переводятся обратно.
+    """
+    n = np.bincount(owner, minlength=size)
+    mean = np.bincount(owner, x, minlength=size) / n
+    dx = x - mean[owner]
+    scale = np.sqrt(np.bincount(owner, dx * dx, minlength=size) / n)
+    u = dx / scale[owner]
+
+    u_powers = [np.ones_like(u), u]
+    for _ in range(3):
+        u_powers.append(u_powers[-1] * u)
+    sums = [np.bincount(owner, p, minlength=size) for p in u_powers]
+    lhs = np.empty((size, 3, 3))
+    for i in range(3):
+        for j in range(3):
+            lhs[:, i, j] = sums[i + j]
+    rhs = np.stack(
+        [
+            np.bincount(owner, u_powers[k] * y, minlength=size)
+            for k in range(3)
+        ],
+        axis=1,
+    )
+    # Группам без точек — единичная система, их результат не используется
+    empty = n < 3
+    lhs[empty] = np.eye(3)
+    rhs[empty] = 0.0
+    p0, p1, p2 = np.linalg.solve(lhs, rhs[..., None])[..., 0].T
+
+    a = p2 / scale**2
+    b = p1 / scale - 2 * a * mean
+    c = p0 - p1 * mean / scale + a * mean**2
+    return np.stack([a, b, c], axis=1)
+
+
+def batch_predict_sold_out(
+    store: HistoryStore,
+    event_ids: Sequence[str],
+    show_timestamps: Sequence[float | None],
+    now_ts: int,
+) -> list[int | None]:
+    """
+    Прогноз sold-out для всех событий разом.
+
+    Пакетный аналог analytics.series_predict_sold_out: последние 7 дней
+    (или хвост из 10 снимков) с шагом не меньше 5 минут, парабола по
+    МНК и те же проверки, что в sold_out_from_fit.
+
+    :param store: История мест
+    :param event_ids: События для прогноза
+    :param show_timestamps: Время начала каждого показа (или None)
+    :param now_ts: Текущее время, unix timestamp
+    :return: Unix timestamp sold-out или None для каждого события
+    """
+    MIN_DT = 300  # 5 минут
+    TAIL = 10
+
+    size = len(event_ids)
+    predictions: list[int | None] = [None] * size
+    positions, starts, ends = _segments(store, event_ids)
+    eligible = ends - starts >= 4
+    if not eligible.any():
+        return predictions
+
+    first_ts = store.timestamps[np.minimum(starts, len(store.timestamps) - 1)]
+    cutoff = np.maximum(first_ts, now_ts - SOLD_OUT_LOOKBACK)
+    window = np.where(eligible, store.search(positions, cutoff), ends)
+    index, owner = thin_segments(store, positions, window, ends, MIN_DT)
+
+    # Мало точек в окне — берём хвост истории с тем же шагом
+    kept = np.bincount(owner, minlength=size)
+    retry = eligible & (kept < 4)
+    tail = np.where(retry, np.maximum(starts, ends - TAIL), ends)
+    tail_index, tail_owner = thin_segments(
+        store, positions, tail, ends, MIN_DT
+    )
+    use = ~retry[owner]
+    index = np.concatenate([index[use], tail_index])
+    owner = np.concatenate([owner[use], tail_owner])
+    order = np.lexsort((index, owner))
+    index, owner = index[order], owner[order]
+
+    kept = np.bincount(owner, minlength=size)
+    fit = kept[owner] >= 4
+    index, owner = index[fit], owner[fit]
+    if not len(index):
+        return predictions
+    kept = np.bincount(owner, minlength=size)
+
+    timestamps = store.timestamps[index]
+    seats = store.seats[index]
+    group_first = _group_starts(kept)
+    group_last = group_first + kept - 1
+    t_min = timestamps[group_first[owner]]
+    x = (timestamps - t_min) / HOUR
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coeffs = _quadratic_fit(owner, x, seats.astype(float), size)
+
+    for k in np.flatnonzero(kept >= 4).tolist():
+        first, last = group_first[k], group_last[k]
+        predictions[k] = sold_out_from_fit(
+            tuple(coeffs[k].tolist()),
+            int(timestamps[first]),
+            float(x[last]),
+            int(seats[first]),
+            int(timestamps[last]),
+            int(seats[last]),
+            show_timestamps[k],
+            now_ts,
+        )
+    return predictions
@@ -0,0 +1,239 @@
+import logging
+from datetime import UTC, datetime
+
+from sqlalchemy import case, delete, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from telegram.db.models import (
+    ShowSeatHistory,
+    ShowSeatHistoryDaily,
+    SnapshotRun,
+)
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+# Сколько месячных секций держать созданными наперёд
+PARTITIONS_AHEAD = 2
+DEFAULT_PARTITION = 'show_seat_history_default'
+
+
+def month_start(moment: datetime, months: int = 0) -> datetime:
+    """First second (UTC) of the month `months` away from `moment`"""
+    moment = moment.astimezone(UTC)
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=UTC)
+
+
+def partition_name(start: datetime) -> str:
+    """Name of the monthly show_seat_history partition starting at `start`"""
+    return f'show_seat_history_p{start.year:04d}{start.month:02d}'
+
+
+async def _is_partitioned(session: AsyncSession) -> bool:
+    """Check whether show_seat_history is a partitioned Postgres table"""
+    if session.get_bind().dialect.name != 'postgresql':
+        return False
+    result = await session.execute(
+        text(
+            'SELECT 1 FROM pg_partitioned_table '
+            "WHERE partrelid = 'show_seat_history'::regclass"
+        )
+    )
+    return result.scalar() is not None
+
+
+async def _partition_bounds(session: AsyncSession) -> dict[str, int]:
+    """Monthly partitions of show_seat_history with their upper bounds"""
+    result = await session.execute(
+        text(
+            'SELECT child.relname, '
+            'pg_get_expr(child.relpartbound, child.oid) '
+            'FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            "WHERE pg_inherits.inhparent = 'show_seat_history'::regclass"
+        )
+    )
+    bounds = {}
+    for name, bound in result.all():
+        # FOR VALUES FROM (1704067200) TO (1706745600); DEFAULT пропускаем
+        if 'TO (' not in bound:
+            continue
+        bounds[name] = int(bound.rsplit('TO (', 1)[1].split(')', 1)[0])
+    return bounds
+
+
+async def create_partition(
+    session: AsyncSession, start: datetime, end: datetime
+) -> None:
+    """
+    Create the show_seat_history partition for [start, end).
+
+    Postgres refuses to create a partition while the DEFAULT partition
+    holds rows of its range, e.g. after downtime longer than
+    PARTITIONS_AHEAD months. Such rows are moved: DEFAULT is detached,
+    the partition created, the rows re-inserted through the parent and
+    DEFAULT attached back, all in the caller's transaction.
+    """
+    name = partition_name(start)
+    bounds = f'FROM ({int(start.timestamp())}) TO ({int(end.timestamp())})'
+    in_range = (
+        f'"timestamp" >= {int(start.timestamp())} '
+        f'AND "timestamp" < {int(end.timestamp())}'
+    )
+    stranded = await session.execute(
+        text(f'SELECT count(*) FROM {DEFAULT_PARTITION} WHERE {in_range}')
+    )
+    count = stranded.scalar()
+    if not count:
+        await session.execute(
+            text(
+                f'CREATE TABLE IF NOT EXISTS {name} '
+                f'PARTITION OF show_seat_history FOR VALUES {bounds}'
+            )
+        )
+        return
+
+    columns = 'id, show_id, "timestamp", seats'
+    for statement in (
+        f'ALTER TABLE show_seat_history DETACH PARTITION {DEFAULT_PARTITION}',
+        f'CREATE TABLE {name} PARTITION OF show_seat_history '
+        f'FOR VALUES {bounds}',
+        f'INSERT INTO show_seat_history ({columns}) '
+        f'SELECT {columns} FROM {DEFAULT_PARTITION} WHERE {in_range}',
+        f'DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}',
+        f'ALTER TABLE show_seat_history ATTACH PARTITION '
+        f'{DEFAULT_PARTITION} DEFAULT',
+    ):
+        await session.execute(text(statement))
+    logger.warning(
+        f'Moved {count} seat history rows from {DEFAULT_PARTITION} '
+        f'into the new partition {name}'
+    )
+
+
+async def ensure_partitions(session: AsyncSession, now: datetime) -> None:
+    """Create monthly partitions up to PARTITIONS_AHEAD months ahead"""
+    if not await _is_partitioned(session):
+        return
+    existing = await _partition_bounds(session)
+    for offset in range(PARTITIONS_AHEAD + 1):
+        start = month_start(now, offset)
+        if partition_name(start) not in existing:
+            await create_partition(
+                session, start, month_start(now, offset + 1)
+            )
+
+
+async def rollup_seat_history(session: AsyncSession, cutoff: int) -> int:
+    """
+    Fold seat history older than `cutoff` into daily aggregates.
+
+    For every show and UTC day the first/last seat counts and the seats
+    sold and returned inside the day are stored in
+    show_seat_history_daily; the raw rows are then removed (whole
+    partitions are dropped where possible). Differences between days are
+    restored from first/last seats, so sales totals stay exact.
+
+    :param session: Database session
+    :param cutoff: Unix timestamp, rows strictly older are rolled up
+    :return: Number of daily rows written
+    """
+    day = ShowSeatHistory.timestamp - ShowSeatHistory.timestamp % DAY
+    order = (ShowSeatHistory.timestamp, ShowSeatHistory.id)
+    order_desc = (
+        ShowSeatHistory.timestamp.desc(),
+        ShowSeatHistory.id.desc(),
+    )
+    window = (ShowSeatHistory.show_id, day)
+    snapshots = (
+        select(
+            ShowSeatHistory.show_id,
+            day.label('day'),
+            ShowSeatHistory.timestamp,
+            (
+                func.lag(ShowSeatHistory.seats).over(
+                    partition_by=window, order_by=order
+                )
+                - ShowSeatHistory.seats
+            ).label('diff'),
+            func.first_value(ShowSeatHistory.seats)
+            .over(partition_by=window, order_by=order)
+            .label('first_seats'),
+            func.first_value(ShowSeatHistory.seats)
+            .over(partition_by=window, order_by=order_desc)
+            .label('last_seats'),
+        )
+        .where(ShowSeatHistory.timestamp < cutoff)
+        .subquery()
+    )
+    daily = select(
+        snapshots.c.show_id,
+        snapshots.c.day,
+        func.min(snapshots.c.timestamp),
+        func.max(snapshots.c.timestamp),
+        func.min(snapshots.c.first_seats),
+        func.min(snapshots.c.last_seats),
+        func.coalesce(
+            func.sum(case((snapshots.c.diff > 0, snapshots.c.diff), else_=0)),
+            0,
+        ),
+        func.coalesce(
+            func.sum(case((snapshots.c.diff < 0, -snapshots.c.diff), else_=0)),
+            0,
+        ),
+        func.count(),
+    ).group_by(snapshots.c.show_id, snapshots.c.day)
+
+    result = await session.execute(
+        insert(ShowSeatHistoryDaily).from_select(
+            [
+                'show_id',
+                'day',
+                'first_timestamp',
+                'last_timestamp',
+                'first_seats',
+                'last_seats',
+                'gross',
+                'returned',
+                'snapshots',
+            ],
+            daily,
+        )
+    )
+
+    if await _is_partitioned(session):
+        for name, upper in (await _partition_bounds(session)).items():
+            if upper <= cutoff:
+                await session.execute(text(f'DROP TABLE {name}'))
+                logger.info(f'Dropped seat history partition {name}')
+    # Остаток (секция DEFAULT или несекционированная таблица)
+    await session.execute(
+        delete(ShowSeatHistory).where(ShowSeatHistory.timestamp < cutoff)
+    )
+    await session.execute(
+        delete(SnapshotRun).where(SnapshotRun.timestamp < cutoff)
+    )
+    return result.rowcount
+
+
+async def maintain_seat_history(
+    session: AsyncSession, now: datetime | None = None
+) -> None:
+    """
+    Create upcoming partitions and roll up history past retention.
+
+    :param session: Database session
+    :param now: Current time, defaults to datetime.now(UTC)
+    """
+    now = now or datetime.now(UTC)
+    await ensure_partitions(session, now)
+    if settings.SEAT_HISTORY_RETENTION_MONTHS > 0:
+        cutoff = month_start(now, -settings.SEAT_HISTORY_RETENTION_MONTHS)
+        rows = await rollup_seat_history(session, int(cutoff.timestamp()))
+        logger.info(
+            f'Rolled up seat history before {cutoff:%Y-%m} '
+            f'into {rows} daily rows'
+        )
+    await session.commit()
@@ -0,0 +1,168 @@
+"""
+Колоночное хранилище истории мест для аналитики.
+
+Вместо списков ORM-объектов ShowSeatHistory история хранится в трёх
+массивах NumPy в CSR-раскладке: снимки события ``event_ids[i]`` лежат
+непрерывным, отсортированным по времени срезом
+``timestamps[offsets[i]:offsets[i + 1]]`` (и так же в ``seats``).
+Хранилище строится один раз из результата запроса, после чего продажи,
+возвраты и первые снимки считаются векторно сразу по всем событиям.
+"""
+
+from collections.abc import Iterable, Mapping
+
+import numpy as np
+
+
+class HistoryStore:
+    """История мест в CSR-раскладке: event_ids, offsets, timestamps, seats"""
+
+    __slots__ = (
+        '_search_keys',
+        'event_ids',
+        'offsets',
+        'positions',
+        'seats',
+        'timestamps',
+    )
+
+    def __init__(
+        self,
+        event_ids: list[str],
+        offsets: np.ndarray,
+        timestamps: np.ndarray,
+        seats: np.ndarray,
+    ):
+        self.event_ids = event_ids
+        self.offsets = offsets
+        self.timestamps = timestamps
+        self.seats = seats
+        self.positions = {event_id: i for i, event_id in enumerate(event_ids)}
+        self._search_keys = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable) -> 'HistoryStore':
+        """
+        Строит хранилище из строк с атрибутами show_id, timestamp, seats.
+
+        Подходят и ORM-объекты ShowSeatHistory, и строки
+        ``select(ShowSeatHistory.show_id, ...)``. Снимки одного события
+        с одинаковым timestamp сохраняют исходный порядок, как при
+        ``sorted(..., key=lambda r: r.timestamp)``.
+        """
+        codes_by_id: dict[str, int] = {}
+        codes: list[int] = []
+        timestamps: list[int] = []
+        seats: list[int] = []
+        for row in rows:
+            codes.append(codes_by_id.setdefault(row.show_id, len(codes_by_id)))
+            timestamps.append(row.timestamp)
+            seats.append(row.seats)
+
+        codes_arr = np.asarray(codes, dtype=np.int64)
+        ts_arr = np.asarray(timestamps, dtype=np.int64)
+        seats_arr = np.asarray(seats, dtype=np.int32)
+
+        # lexsort устойчив: сортировка по событию, затем по времени
+        order = np.lexsort((ts_arr, codes_arr))
+        counts = np.bincount(codes_arr, minlength=len(codes_by_id))
+        offsets = np.zeros(len(codes_by_id) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(list(codes_by_id), offsets, ts_arr[order], seats_arr[order])
+
+    @classmethod
+    def from_buckets(cls, buckets: Mapping[str, Iterable]) -> 'HistoryStore':
+        """Строит хранилище из словаря {id события: список снимков}"""
+        return cls.from_rows(row for rows in buckets.values() for row in rows)
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    def __contains__(self, event_id: str) -> bool:
+        return event_id in self.positions
+
+    def series(self, event_id: str) -> tuple[np.ndarray, np.ndarray]:
+        """Временной ряд (timestamps, seats) события; пустой, если нет"""
+        i = self.positions.get(event_id)
+        if i is None:
+            return self.timestamps[:0], self.seats[:0]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.timestamps[start:end], self.seats[start:end]
+
+    def counts(self) -> np.ndarray:
+        """Число снимков каждого события"""
+        return np.diff(self.offsets)
+
+    def first_timestamps(self) -> np.ndarray:
+        """Время первого снимка каждого события"""
+        return self.timestamps[self.offsets[:-1]]
+
+    def search(self, positions: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Поиск по рядам сразу нескольких событий.
+
+        Для каждой пары (positions[k], values[k]) возвращает глобальный
+        индекс первого снимка события не раньше values[k] (конец ряда,
+        если таких нет) — как ``np.searchsorted(ts, value, 'left')``
+        внутри ряда, но одним вызовом для всех событий.
+        """
+        if self._search_keys is None:
+            # Составной ключ (событие, время): ряды идут подряд и
+            # отсортированы, поэтому ключ монотонен по всему массиву
+            base = int(self.timestamps.min()) if len(self.timestamps) else 0
+            span = (
+                int(self.timestamps.max()) - base + 2
+                if len(self.timestamps)
+                else 2
+            )
+            codes = np.repeat(
+                np.arange(len(self), dtype=np.int64), self.counts()
+            )
+            self._search_keys = (
+                codes * span + (self.timestamps - base),
+                base,
+                span,
+            )
+        keys, base, span = self._search_keys
+        relative = np.clip(
+            np.asarray(values, dtype=np.int64) - base, 0, span - 1
+        )
+        return np.searchsorted(keys, positions * span + relative, 'left')
+
+    def sales_and_returns(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Gross-продажи и возвраты каждого события.
+
+        Падение мест между соседними снимками — продажа, рост — возврат;
+        шаг на границе двух событий обнуляется.
+        """
+        if not len(self):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        step = np.zeros(len(self.seats), dtype=np.int64)
+        step[1:] = -np.diff(self.seats.astype(np.int64))
+        starts = self.offsets[:-1]
+        step[starts] = 0
+        gross = np.add.reduceat(np.clip(step, 0, None), starts)
+        returned = np.add.reduceat(np.clip(-step, 0, None), starts)
+        return gross, returned
+
+
+def as_history_store(histories) -> HistoryStore:
+    """Принимает HistoryStore или последовательность снимков"""
+    if isinstance(histories, HistoryStore):
+        return histories
+    return HistoryStore.from_rows(histories)
+
+
+def series_from_rows(rows: Iterable) -> tuple[np.ndarray, np.ndarray]:
+    """Один ряд (timestamps, seats) из снимков, устойчиво по времени"""
+    rows = list(rows)
+    timestamps = np.fromiter(
+        (r.timestamp for r in rows), dtype=np.int64, count=len(rows)
+    )
+    seats = np.fromiter(
+        (r.seats for r in rows), dtype=np.int32, count=len(rows)
+    )
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], seats[order]
@@ -0,0 +1,193 @@
+"""
+Локальная замена API виджета Profticket для бенчмарков.
+
+MockProfticketUpstream отвечает на запросы к BASE_URL, EVENT_DATA_URL и
+SHOW_URL из ProfticketsInfo синтетическими данными: афиша месяца
+постранично, свободные места и составы спектаклей. Задержка, разброс
+задержки и доля ответов 429 настраиваются; тело каждого ответа
+снабжается ETag, а совпавший If-None-Match получает 304, как у
+настоящего сервера с поддержкой условных запросов.
+
+    upstream = MockProfticketUpstream(events=300, latency=0.05)
+    api = ProfticketsInfo('1', transport=upstream.transport())
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+from collections import Counter
+from datetime import date
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from services.profticket.analytics import MONTHS_RU
+
+MONTH_NAMES = {number: name for name, number in MONTHS_RU.items()}
+WEEKDAYS = ('пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс')
+
+
+class MockResponse(NamedTuple):
+    status_code: int
+    headers: dict[str, str]
+    body: bytes
+
+
+class MockProfticketUpstream:
+    """
+    Синтетический Profticket с настраиваемой задержкой и ошибками 429.
+
+    Данные детерминированы при одном seed: `events` событий афиши по
+    `shows` спектаклям, по `per_page` событий на странице афиши. `sell`
+    меняет места части событий, как продажи между обновлениями.
+    Счётчики запросов по видам лежат в `requests`.
+    """
+
+    def __init__(
+        self,
+        events: int = 300,
+        shows: int = 40,
+        per_page: int = 20,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1,
+        etags: bool = True,
+        seed: int = 1,
+    ):
+        """
+        :param events: Событий в афише; она одна для любого месяца
+        :param shows: Разных спектаклей, по ним распределяются события
+        :param per_page: Событий на странице афиши
+        :param latency: Задержка ответа, секунд
+        :param jitter: Случайная добавка к задержке, от 0 до jitter секунд
+        :param throttle_rate: Доля запросов, получающих 429
+        :param retry_after: Значение Retry-After у ответов 429
+        :param etags: Отдавать ETag и отвечать 304 на совпавший
+            If-None-Match
+        :param seed: Зерно генератора задержек, ошибок и продаж
+        """
+        self.events = events
+        self.shows = shows
+        self.per_page = per_page
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.etags = etags
+        self.rng = random.Random(seed)
+        self.seats = {f'e{i}': 200 - i % 50 for i in range(events)}
+        self.requests: Counter[str] = Counter()
+
+    def transport(self) -> httpx.MockTransport:
+        """Транспорт для httpx.AsyncClient, отвечающий вместо сервера"""
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        delay = self.latency + self.rng.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = self.respond(str(request.url), dict(request.headers))
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            content=response.body,
+            request=request,
+        )
+
+    def sell(self, count: int) -> None:
+        """Меняет места `count` случайных событий (продажи и возвраты)"""
+        for event_id in self.rng.sample(sorted(self.seats), count):
+            change = self.rng.choice((-3, -2, -1, 1))
+            self.seats[event_id] = max(0, self.seats[event_id] + change)
+
+    def respond(self, url: str, headers: dict[str, str]) -> MockResponse:
+        """
+        Ответ на GET-запрос без задержки.
+
+        :param url: Полный URL запроса
+        :param headers: Заголовки запроса (имена в нижнем регистре)
+        :return: Код, заголовки и тело ответа
+        """
+        parts = urlsplit(url)
+        query = {
+            key: values[0] for key, values in parse_qs(parts.query).items()
+        }
+        if self.throttle_rate and self.rng.random() < self.throttle_rate:
+            self.requests['throttled'] += 1
+            return MockResponse(
+                429, {'Retry-After': str(self.retry_after)}, b''
+            )
+
+        if parts.path.startswith('/api/event/list/'):
+            self.requests['listing'] += 1
+            year, month = (int(x) for x in query['date'].split('.'))
+            payload = self._listing(int(query['page']), month, year)
+        elif parts.path.startswith('/widget-api/events-data/'):
+            self.requests['places'] += 1
+            payload = {
+                'events': {
+                    event_id: {'seats': seats}
+                    for event_id, seats in self.seats.items()
+                }
+            }
+        elif parts.path.startswith('/api/event/show/'):
+            self.requests['details'] += 1
+            payload = self._show(int(query['show_id']))
+        else:
+            self.requests['unknown'] += 1
+            return MockResponse(404, {}, b'')
+
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        if not self.etags:
+            return MockResponse(200, {}, body)
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if headers.get('if-none-match') == etag:
+            self.requests['not_modified'] += 1
+            return MockResponse(304, {'ETag': etag}, b'')
+        return MockResponse(200, {'ETag': etag}, body)
+
+    def _listing(self, page: int, month: int, year: int) -> dict:
+        start = (page - 1) * self.per_page
+        items = []
+        for i in range(start, min(start + self.per_page, self.events)):
+            show_id = i % self.shows + 1
+            day = i % 28 + 1
+            weekday = WEEKDAYS[date(year, month, day).weekday()]
+            items.append(
+                {
+                    'events': [
+                        {
+                            'id': f'e{i}',
+                            'show_name': f'Спектакль {show_id}',
+                            'location_name': 'Театр',
+                            'location_scene': 'Основная сцена',
+                            'date_formatted': (
+                                f'{day} {MONTH_NAMES[month]} {year}, '
+                                f'{weekday}, 19:00'
+                            ),
+                            'annotation': 'Аннотация',
+                            'min_price': 500,
+                            'max_price': 5000,
+                            'pushkin_card': {'can_buy': i % 2 == 0},
+                            'show': {
+                                'show_id': show_id,
+                                'duration': '2h',
+                                'age': '16+',
+                                'image_url': 'https://example.invalid/i.png',
+                            },
+                        }
+                    ]
+                }
+            )
+        return {'response': {'items': items}}
+
+    def _show(self, show_id: int) -> dict:
+        actors = ['Иван Иванов', 'Анна Петрова', f'Актёр {show_id % 60}']
+        return {
+            'response': {'show_detail': {'show_id': show_id, 'actors': actors}}
+        }
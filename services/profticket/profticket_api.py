@@ -1,6 +1,13 @@
 import asyncio
+import hashlib
+import importlib.util
+import json
 import logging
-from typing import Any
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, NamedTuple
 
 import httpx
 from fake_useragent import UserAgent
@@ -12,6 +19,15 @@ from tenacity import (
 )
 
 from config import settings
+from services.profticket.rate_limiter import AdaptiveLimiter, LimiterStats
+from services.profticket.show_cache import (
+    ShowCacheStats,
+    ShowCacheStore,
+    ShowDetailsCache,
+)
+
+if TYPE_CHECKING:
+    from tenacity import RetryCallState
 
 logger = logging.getLogger(__name__)
 
@@ -91,6 +107,67 @@ class ConnectionTimeoutError(ProfticketAPIError):
     pass
 
 
+class _CachedBody(NamedTuple):
+    """Parsed body of a listing or places response and its validators"""
+
+    digest: str  # sha256 of the raw body
+    payload: Any
+    etag: str | None
+    last_modified: str | None
+
+
+_backoff = wait_exponential(multiplier=1, min=4, max=10)
+
+
+def _retry_wait(retry_state: 'RetryCallState') -> float:
+    """Delay before a retry; rate limits are waited out in the limiter"""
+    if isinstance(retry_state.outcome.exception(), RateLimitError):
+        return 0
+    return _backoff(retry_state)
+
+
+def _parse_retry_after(value: str | None, default: float = 5) -> float:
+    """
+    Parses a Retry-After header given in seconds or as an HTTP date.
+
+    :param value: Header value, if any.
+    :type value: Optional[str]
+    :param default: Delay used when the header is missing or invalid.
+    :type default: float
+    :return: Seconds to wait.
+    :rtype: float
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=UTC)
+    return max(0.0, (retry_at - datetime.now(UTC)).total_seconds())
+
+
+class ShowDetailsSummary(NamedTuple):
+    """Outcome of getting show details during one collection"""
+
+    total: int  # shows whose details were needed
+    failed: dict[str, str]  # show ID -> why its last fetch failed
+    fallback: int  # failed shows served their last known details
+
+
+class ConnectionStats(NamedTuple):
+    requests: int  # responses received
+    connections: int  # TCP connections opened
+    tls_handshakes: int
+    reused: int  # requests that did not open a connection
+    http2_requests: int
+
+
 class UserAgentProvider:
     """
     Provides random user-agent strings.
@@ -126,12 +203,35 @@ class ProfticketsInfo:
     :type year: Optional[int]
     :ivar user_agent_provider: Provides random user agents for requests.
     :type user_agent_provider: UserAgentProvider
+    :ivar user_agent: User-Agent chosen once and sent for the whole
+    session.
+    :type user_agent: str
+    :ivar http2: Whether the client negotiates HTTP/2, see `HTTP2`.
+    :type http2: bool
     :ivar client: The HTTP client for making asynchronous requests.
     :type client: httpx.AsyncClient
-    :ivar _request_semaphore: Semaphore to limit concurrent requests.
-    :type _request_semaphore: asyncio.Semaphore
-    :ivar _show_cache: Cache storing information about shows.
-    :type _show_cache: Dict[str, Dict[str, Any]]
+    :ivar _limiter: Rate limiter and adaptive concurrency limit shared
+    by all requests.
+    :type _limiter: AdaptiveLimiter
+    :ivar page_window: Number of listing pages kept in flight at once.
+    :type page_window: int
+    :ivar _show_cache: Bounded TTL cache of show details.
+    :type _show_cache: ShowDetailsCache
+    :ivar _show_fetches: Show detail requests in flight, by show ID.
+    :type _show_fetches: Dict[str, asyncio.Task]
+    :ivar _show_cache_store: Optional file keeping the show details cache
+    across restarts, see `SHOW_CACHE_PATH`.
+    :type _show_cache_store: Optional[ShowCacheStore]
+    :ivar _bodies: Last body of each listing page and of the places
+    document, by URL, used for conditional requests and to skip parsing
+    unchanged bodies.
+    :type _bodies: OrderedDict[str, _CachedBody]
+    :ivar detail_summaries: Show details failures of the last
+    collection, by (month, year).
+    :type detail_summaries: Dict[Tuple[int, int], ShowDetailsSummary]
+    :ivar fingerprints: Fingerprint of the upstream data behind the last
+    complete `collect_full_info` result, by (month, year).
+    :type fingerprints: Dict[Tuple[int, int], str]
     :ivar free_places: Dictionary mapping event IDs to the number of
     free places.
     :type free_places: Dict[str, int]
@@ -142,10 +242,18 @@ class ProfticketsInfo:
     CUSTOMER_BUY_URL = 'https://spa.profticket.ru/customer/'
     SHOW_URL = 'https://widget.profticket.ru/api/event/show/'
 
+    # Страницы афиши трёх месяцев с запасом окна и документ мест
+    BODY_CACHE_SIZE = 64
+
     PROXY_URL = settings.PROXY_URL
 
     def __init__(
-        self, com_id: str, timeout: float = 30.0, concurrent_requests: int = 3
+        self,
+        com_id: str,
+        timeout: float = 30.0,
+        concurrent_requests: int = 3,
+        page_window: int | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
     ):
         """
         Initializes the instance with company ID, timeout,
@@ -156,9 +264,16 @@ class ProfticketsInfo:
         :param timeout: The timeout value for HTTP requests in seconds.
         Default is 30.0.
         :type timeout: float, optional
-        :param concurrent_requests: The number of concurrent requests allowed.
+        :param concurrent_requests: The initial number of concurrent
+        requests; the limit then adapts up to `REQUEST_MAX_CONCURRENCY`.
         Default is 3.
         :type concurrent_requests: int, optional
+        :param page_window: The number of listing pages requested ahead
+        while paginating. Defaults to `concurrent_requests`.
+        :type page_window: int, optional
+        :param transport: Transport for the HTTP client, e.g. a mock
+        upstream in benchmarks. Defaults to the network.
+        :type transport: httpx.AsyncBaseTransport, optional
 
         :raises ValueError: If `com_id` is not provided.
         """
@@ -172,22 +287,57 @@ class ProfticketsInfo:
         # proxies = {'http://': self.PROXY_URL, 'https://': self.PROXY_URL}
 
         self.user_agent_provider = UserAgentProvider()
+        # Один User-Agent на сессию: новый на каждый запрос выглядит как
+        # толпа разных браузеров с одного адреса
+        self.user_agent = self.user_agent_provider.get_random_user_agent()
+
+        self.http2 = settings.HTTP2
+        if self.http2 and importlib.util.find_spec('h2') is None:
+            logger.warning(
+                "HTTP2 is enabled but the 'h2' package is missing, "
+                'falling back to HTTP/1.1'
+            )
+            self.http2 = False
 
         self.client = httpx.AsyncClient(
             timeout=timeout,
             limits=httpx.Limits(
-                max_keepalive_connections=5, max_connections=10
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
             ),
-            headers={
-                'Accept': 'application/json',
-                'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-                'Connection': 'keep-alive',
-            },
+            headers=self._get_headers(),
+            http2=self.http2,
             # proxies=proxies,
             verify=False,
+            transport=transport,
+        )
+        self._requests = 0
+        self._connections = 0
+        self._tls_handshakes = 0
+        self._http2_requests = 0
+        self._limiter = AdaptiveLimiter(
+            rate=settings.REQUEST_RATE,
+            burst=settings.REQUEST_BURST,
+            initial_limit=concurrent_requests,
+            max_limit=settings.REQUEST_MAX_CONCURRENCY,
         )
-        self._request_semaphore = asyncio.Semaphore(concurrent_requests)
-        self._show_cache: dict[str, dict[str, Any]] = {}
+        self.page_window = max(1, page_window or concurrent_requests)
+        self._show_cache = ShowDetailsCache(
+            maxsize=settings.SHOW_CACHE_SIZE,
+            ttl=settings.SHOW_CACHE_TTL,
+            stale_ttl=settings.SHOW_CACHE_STALE_TTL,
+            error_ttl=settings.SHOW_CACHE_ERROR_TTL,
+        )
+        self._show_fetches: dict[str, asyncio.Task] = {}
+        self._show_cache_store: ShowCacheStore | None = None
+        self._show_cache_restored = False
+        self._show_cache_restoring = asyncio.Lock()
+        if settings.SHOW_CACHE_PATH:
+            self._show_cache_store = ShowCacheStore(settings.SHOW_CACHE_PATH)
+        self._bodies: OrderedDict[str, _CachedBody] = OrderedDict()
+        self.fingerprints: dict[tuple[int, int], str] = {}
+        self.detail_summaries: dict[tuple[int, int], ShowDetailsSummary] = {}
         self.free_places: dict[str, int] = {}
 
     def set_date(self, month: int, year: int) -> None:
@@ -209,20 +359,29 @@ class ProfticketsInfo:
         self.year = year
         logger.info(f'Set target date to: {month}/{year}')
 
-    def _create_url(self, page_num: int) -> str:
+    def _create_url(
+        self, page_num: int, month: int | None = None, year: int | None = None
+    ) -> str:
         """
         Generates a URL for retrieving event data for a specific page number,
         month,
-        and year. Ensures that both month and year are set; otherwise, raises a
-        ValueError.
+        and year. Month and year fall back to the values stored by
+        `set_date` when not passed explicitly; if neither is available,
+        raises a ValueError.
 
         :param page_num: The page number for paginated event data.
         :type page_num: int
+        :param month: The target month. Defaults to `self.month`.
+        :type month: Optional[int]
+        :param year: The target year. Defaults to `self.year`.
+        :type year: Optional[int]
         :return: A formatted URL string.
         :rtype: str
         :raises ValueError: If month or year is not set.
         """
-        if not all([self.month, self.year]):
+        month = month or self.month
+        year = year or self.year
+        if not all([month, year]):
             raise ValueError(
                 'Month and year must be set before making requests'
             )
@@ -230,7 +389,7 @@ class ProfticketsInfo:
         url = (
             f'{self.BASE_URL}{self.com_id}'
             f'&type=events&page={page_num}&period_id=4&hall_id=&date='
-            f'{self.year}.{self.month}'
+            f'{year}.{month}'
             f'&name=&language=ru-RU'
         )
         logger.debug(f'Created URL for page {page_num}: {url}')
@@ -238,46 +397,75 @@ class ProfticketsInfo:
 
     def _get_headers(self) -> dict[str, str]:
         """
-        Generate HTTP headers for a request with dynamic User-Agent,
-        and static Accept,
-        Accept-Language, and Connection headers.
+        Generate the HTTP headers sent with every request of the session:
+        the session User-Agent and static Accept and Accept-Language
+        headers.
 
-        This method calls the `get_random_user_agent`
-        from `user_agent_provider` to
-        dynamically obtain a User-Agent string.
-        The headers returned are suitable for making
-        HTTP requests that require these specific headers to be set.
+        The User-Agent is chosen once in `__init__` through
+        `user_agent_provider`. Connection management headers are left to
+        httpx: HTTP/1.1 keeps connections alive by default and HTTP/2
+        forbids them.
 
         :return: A dictionary containing HTTP headers for a request.
         :rtype: Dict[str, str]
         """
         headers = {
-            'User-Agent': self.user_agent_provider.get_random_user_agent(),
+            'User-Agent': self.user_agent,
             'Accept': 'application/json',
             'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Connection': 'keep-alive',
         }
         return headers
 
+    async def _trace(self, event_name: str, info: dict[str, Any]) -> None:
+        """Counts connection events reported by the httpx transport."""
+        if event_name == 'connection.connect_tcp.complete':
+            self._connections += 1
+        elif event_name == 'connection.start_tls.complete':
+            self._tls_handshakes += 1
+
+    def connection_stats(self) -> ConnectionStats:
+        """
+        Connection reuse and handshake counters of the HTTP client.
+
+        :return: Snapshot of the connection counters.
+        :rtype: ConnectionStats
+        """
+        return ConnectionStats(
+            requests=self._requests,
+            connections=self._connections,
+            tls_handshakes=self._tls_handshakes,
+            reused=max(0, self._requests - self._connections),
+            http2_requests=self._http2_requests,
+        )
+
     @retry(
         retry=retry_if_exception_type(
-            (httpx.HTTPStatusError, httpx.ProxyError)
+            (httpx.HTTPStatusError, httpx.ProxyError, RateLimitError)
         ),
         stop=stop_after_attempt(settings.STOP_AFTER_ATTEMPT),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
+        wait=_retry_wait,
     )
-    async def _make_request(self, url: str) -> httpx.Response:
+    async def _make_request(
+        self, url: str, headers: dict[str, str] | None = None
+    ) -> httpx.Response:
         """
         Makes an asynchronous HTTP GET request to the specified URL, handling
         rate limits and specific exceptions.
 
-        Retries are handled for HTTP status errors and Proxy errors through
-        decorators. If a rate limit is hit, it waits for the specified time
-        before retrying. Logs and raises errors for timeout, proxy, and other
+        Every request goes through `_limiter`, which paces requests and
+        adapts the concurrency to the responses: successful responses
+        raise the limit, 429, 5xx and timeouts cut it. A 429 pauses the
+        whole client for the Retry-After delay; the retry then waits in
+        the limiter instead of sleeping on its own. Retries are handled
+        for rate limits, HTTP status errors and Proxy errors through
+        decorators. Logs and raises errors for timeout, proxy, and other
         HTTP status errors accordingly.
 
         :param url: The URL to make the request to.
         :type url: str
+        :param headers: Extra request headers, e.g. conditional request
+        validators. A 304 Not Modified response is returned as is.
+        :type headers: Optional[Dict[str, str]]
         :return: The HTTP response object.
         :rtype: httpx.Response
         :raises RateLimitError: If the rate limit is exceeded.
@@ -287,129 +475,253 @@ class ProfticketsInfo:
         :raises ProfticketAPIError: For any other raised exceptions
         during the request.
         """
-        async with self._request_semaphore:
-            try:
-                headers = self._get_headers()
-                response = await self.client.get(url, headers=headers)
+        ticket = await self._limiter.acquire()
+        outcome = AdaptiveLimiter.NEUTRAL
+        try:
+            response = await self.client.get(
+                url, headers=headers, extensions={'trace': self._trace}
+            )
+            self._requests += 1
+            if response.http_version == 'HTTP/2':
+                self._http2_requests += 1
+
+            if response.status_code == 429:
+                outcome = AdaptiveLimiter.OVERLOAD
+                retry_after = _parse_retry_after(
+                    response.headers.get('Retry-After')
+                )
+                logger.warning(
+                    f'Rate limit hit, pausing requests for {retry_after}s'
+                )
+                await self._limiter.pause(retry_after)
+                raise RateLimitError('Rate limit exceeded')
+
+            if response.status_code >= 500:
+                outcome = AdaptiveLimiter.OVERLOAD
+            elif response.status_code < 400:
+                outcome = AdaptiveLimiter.SUCCESS
+            if response.status_code == 304:
+                return response
+            response.raise_for_status()
+            return response
 
-                if response.status_code == 429:
-                    retry_after = int(response.headers.get('Retry-After', 5))
-                    logger.warning(f'Rate limit hit, waiting {retry_after}s')
-                    await asyncio.sleep(retry_after)
-                    raise RateLimitError('Rate limit exceeded')
+        except RateLimitError:
+            raise
 
-                response.raise_for_status()
-                return response
+        except httpx.TimeoutException as e:
+            outcome = AdaptiveLimiter.OVERLOAD
+            logger.error(f'Timeout error: {str(e)}')
+            raise ConnectionTimeoutError(
+                f'Connection timeout: {str(e)}'
+            ) from e
 
-            except httpx.TimeoutException as e:
-                logger.error(f'Timeout error: {str(e)}')
-                raise ConnectionTimeoutError(
-                    f'Connection timeout: {str(e)}'
-                ) from e
+        except httpx.ProxyError as e:
+            logger.error(f'Proxy error: {str(e)}')
+            raise
 
-            except httpx.ProxyError as e:
-                logger.error(f'Proxy error: {str(e)}')
-                raise
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f'HTTP error: {e.response.status_code} - {e.response.text}'
+            )
+            raise
 
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f'HTTP error: {e.response.status_code} - {e.response.text}'
-                )
-                raise
+        except Exception as e:
+            logger.error(f'Request error: {str(e)}')
+            raise ProfticketAPIError(f'Request error: {str(e)}') from e
 
-            except Exception as e:
-                logger.error(f'Request error: {str(e)}')
-                raise ProfticketAPIError(f'Request error: {str(e)}') from e
+        finally:
+            await self._limiter.release(ticket, outcome)
 
-    async def _load_data(self) -> list[dict]:
+    async def _get_json(self, url: str) -> tuple[Any, str]:
         """
-        Loads data asynchronously from a paginated API endpoint.
+        Requests a JSON document, reusing the last body when it is unchanged.
+
+        The request carries If-None-Match / If-Modified-Since when the
+        previous response for the URL had an ETag or Last-Modified
+        header. On a 304 response, or when the new body hashes to the
+        same digest as the previous one, the previously parsed payload
+        is returned without parsing the body again.
+
+        :param url: The URL to request.
+        :type url: str
+        :return: The parsed payload and the sha256 digest of the body.
+        :rtype: Tuple[Any, str]
+        :raises ProfticketAPIError: If a 304 arrives for a URL without a
+        cached body.
+        """
+        cached = self._bodies.get(url)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        response = await self._make_request(url, headers=headers)
+        if response.status_code == 304:
+            if cached is None:
+                raise ProfticketAPIError(f'304 without a cached body: {url}')
+            self._bodies.move_to_end(url)
+            logger.debug(f'Not modified: {url}')
+            return cached.payload, cached.digest
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        if cached is not None and cached.digest == digest:
+            payload = cached.payload
+            logger.debug(f'Unchanged body: {url}')
+        else:
+            payload = response.json()
+        self._bodies[url] = _CachedBody(
+            digest,
+            payload,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+        )
+        self._bodies.move_to_end(url)
+        while len(self._bodies) > self.BODY_CACHE_SIZE:
+            self._bodies.popitem(last=False)
+        return payload, digest
+
+    async def _fetch_page(
+        self, page_num: int, month: int | None = None, year: int | None = None
+    ) -> tuple[list[dict], str]:
+        """
+        Fetches a single page of the events listing.
+
+        :param page_num: The page number for paginated event data.
+        :type page_num: int
+        :param month: The target month. Defaults to `self.month`.
+        :type month: Optional[int]
+        :param year: The target year. Defaults to `self.year`.
+        :type year: Optional[int]
+        :return: List of items on the page, empty when past the last page,
+        and the digest of the page body.
+        :rtype: Tuple[List[dict], str]
+        :raises InvalidResponseFormat: If the API response format is invalid.
+        """
+        url = self._create_url(page_num, month, year)
+        response_json, digest = await self._get_json(url)
+
+        if 'response' not in response_json:
+            raise InvalidResponseFormat(
+                f'Invalid response format on page {page_num}'
+            )
+
+        return response_json['response'].get('items', []), digest
 
-        This method iterates through paginated responses from an API,
-        makes requests,
-        handles errors, and collects items into a list until no more
-        items are available
-        or a maximum number of consecutive errors is reached. Upon encountering
-        errors, it logs them and decides whether to continue or stop
-        based on the
-        number of consecutive errors and the availability of partial data.
+    async def _load_data(
+        self, month: int | None = None, year: int | None = None
+    ) -> list[dict]:
+        """
+        Loads the events listing, see `_load_listing`.
 
+        :param month: The target month. Defaults to `self.month`.
+        :type month: Optional[int]
+        :param year: The target year. Defaults to `self.year`.
+        :type year: Optional[int]
         :return: List of dictionaries containing the loaded items.
         :rtype: List[dict]
+        """
+        items, _ = await self._load_listing(month, year)
+        return items
+
+    async def _load_listing(
+        self,
+        month: int | None = None,
+        year: int | None = None,
+        on_page: Callable[[list[dict]], None] | None = None,
+    ) -> tuple[list[dict], str | None]:
+        """
+        Loads data asynchronously from a paginated API endpoint.
+
+        Pages are fetched through a sliding window: up to `page_window`
+        page requests are kept in flight (each still bounded by
+        `_limiter`), while results are consumed strictly in page
+        order. Loading stops at the first empty page and any speculative
+        requests for pages past it are cancelled. If a page fails after
+        some items were already loaded, the partial data is returned.
+
+        :param month: The target month. Defaults to `self.month`.
+        :type month: Optional[int]
+        :param year: The target year. Defaults to `self.year`.
+        :type year: Optional[int]
+        :param on_page: Called with the items of each non-empty page, in
+        page order, as soon as the page is loaded.
+        :type on_page: Optional[Callable[[List[dict]], None]]
+        :return: List of dictionaries containing the loaded items and the
+        digest of all page bodies; the digest is None for partial data.
+        :rtype: Tuple[List[dict], Optional[str]]
         :raises InvalidResponseFormat: If the API response format is invalid.
         :raises ProfticketAPIError: If an API error occurs and no partial
         data is available.
         """
         items = []
+        listing_hash = hashlib.sha256()
         page_num = 1
-        consecutive_errors = 0
-        max_consecutive_errors = 3
+        next_page = 1
+        pending: dict[int, asyncio.Task] = {}
         stop_reason = None
 
-        while True:
-            try:
-                url = self._create_url(page_num)
-                response = await self._make_request(url)
-                response_json = response.json()
-
-                if 'response' not in response_json:
-                    stop_reason = 'Invalid response format'
-                    raise InvalidResponseFormat(
-                        f'Invalid response format on page {page_num}'
+        try:
+            while True:
+                while next_page < page_num + self.page_window:
+                    pending[next_page] = asyncio.create_task(
+                        self._fetch_page(next_page, month, year)
                     )
+                    next_page += 1
+
+                try:
+                    new_items, digest = await pending.pop(page_num)
+                except ProfticketAPIError as e:
+                    stop_reason = f'API Error: {str(e)}'
+                    logger.error(f'Error loading page {page_num}: {str(e)}')
+                    if items:
+                        logger.info(
+                            f'Returning partial data: {len(items)} items. '
+                            f'Reason: {stop_reason}'
+                        )
+                        return items, None
+                    raise
 
-                new_items = response_json['response'].get('items', [])
+                except Exception as e:
+                    stop_reason = f'Unexpected error: {str(e)}'
+                    logger.error(
+                        f'Unexpected error on page {page_num}: {str(e)}'
+                    )
+                    if items:
+                        logger.info(
+                            f'Returning partial data: {len(items)} items. '
+                            f'Reason: {stop_reason}'
+                        )
+                        return items, None
+                    raise ProfticketAPIError(
+                        f'Failed to load data: {str(e)}'
+                    ) from e
+
+                listing_hash.update(digest.encode())
                 if not new_items:
                     stop_reason = 'No more items'
                     logger.info('No more items to load')
                     break
 
                 items.extend(new_items)
+                if on_page is not None:
+                    on_page(new_items)
                 logger.info(
                     f'Loaded {len(new_items)} items from page {page_num}. '
                     f'Total: {len(items)}'
                 )
                 page_num += 1
-                consecutive_errors = 0
-                await asyncio.sleep(0.5)
-
-            except ProfticketAPIError as e:
-                consecutive_errors += 1
-                stop_reason = f'API Error: {str(e)}'
-                logger.error(f'Error loading page {page_num}: {str(e)}')
-
-                if consecutive_errors >= max_consecutive_errors:
-                    logger.warning(
-                        f'Stopping after {consecutive_errors} '
-                        f'consecutive errors'
-                    )
-                    break
-
-                if items:
-                    logger.info(
-                        f'Returning partial data: {len(items)} items. '
-                        f'Reason: {stop_reason}'
-                    )
-                    return items
-                raise
-
-            except Exception as e:
-                stop_reason = f'Unexpected error: {str(e)}'
-                logger.error(f'Unexpected error on page {page_num}: {str(e)}')
-                if items:
-                    logger.info(
-                        f'Returning partial data: {len(items)} items. '
-                        f'Reason: {stop_reason}'
-                    )
-                    return items
-                raise ProfticketAPIError(
-                    f'Failed to load data: {str(e)}'
-                ) from e
+        finally:
+            for task in pending.values():
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending.values(), return_exceptions=True)
 
         logger.info(
             f'Completed loading {len(items)} items. Stop reason: {stop_reason}'
         )
-        return items
+        return items, listing_hash.hexdigest()
 
     def clear_cache(self):
         """
@@ -424,35 +736,113 @@ class ProfticketsInfo:
         self._show_cache.clear()
         logger.info(f'Cleared cache containing {cache_size} shows')
 
-    async def _places(self):
+    def cache_stats(self) -> ShowCacheStats:
+        """
+        Hit, miss and eviction counters of the show details cache.
+
+        :return: Snapshot of the cache counters.
+        :rtype: ShowCacheStats
+        """
+        return self._show_cache.stats()
+
+    def limiter_stats(self) -> LimiterStats:
+        """
+        Concurrency limit and pacing counters of the request limiter.
+
+        :return: Snapshot of the limiter counters.
+        :rtype: LimiterStats
+        """
+        return self._limiter.stats()
+
+    async def _restore_show_cache(self) -> None:
+        """
+        Warm the show details cache from the persistent store once.
+
+        Restored entries keep their age and validators, so a cold start
+        serves recent details without requests and revalidates the rest
+        with conditional requests. Store errors are logged and ignored.
+        Concurrent callers, e.g. the months of one update cycle, wait for
+        the load instead of starting with an empty cache.
+
+        :return: None
+        """
+        if self._show_cache_store is None or self._show_cache_restored:
+            return
+        async with self._show_cache_restoring:
+            if self._show_cache_restored:
+                return
+            try:
+                rows = await asyncio.to_thread(
+                    self._show_cache_store.load, self._show_cache.maxsize
+                )
+            except Exception as e:
+                logger.error(f'Error loading show cache from disk: {str(e)}')
+                return
+            finally:
+                self._show_cache_restored = True
+            count = self._show_cache.restore(rows)
+            logger.info(f'Restored {count} shows from the show cache file')
+
+    async def _save_show_cache(self) -> None:
+        """
+        Write entries fetched or revalidated since the last save.
+
+        :return: None
+        """
+        if self._show_cache_store is None:
+            return
+        rows = self._show_cache.take_dirty()
+        if not rows:
+            return
+        try:
+            await asyncio.to_thread(
+                self._show_cache_store.save, rows, self._show_cache.maxsize
+            )
+        except Exception as e:
+            logger.error(f'Error saving show cache to disk: {str(e)}')
+            # Не записанные строки уйдут со следующим сохранением
+            self._show_cache.mark_dirty(row.show_id for row in rows)
+
+    async def _places(self) -> dict[str, int]:
+        """
+        Fetches the number of free places for events, see `_load_places`.
+
+        :return: Mapping of event IDs to the number of free places.
+        :rtype: Dict[str, int]
+        """
+        places, _ = await self._load_places()
+        return places
+
+    async def _load_places(self) -> tuple[dict[str, int], str]:
         """
         Fetches the number of free places for events asynchronously.
 
         This method constructs a URL using the class's `EVENT_DATA_URL` and
         `com_id` attributes, then makes an asynchronous request to that URL
         to retrieve event data. The response is parsed to extract the number
-        of free seats for each event, and this information is saved in the
-        `free_places` attribute. If an error occurs during this process,
-        an error is logged, the `free_places` attribute is reset to an
-        empty dictionary, and a `ProfticketAPIError` is raised.
+        of free seats for each event, and this information is returned and
+        saved in the `free_places` attribute. If an error occurs during this
+        process, an error is logged, the `free_places` attribute is reset to
+        an empty dictionary, and a `ProfticketAPIError` is raised.
 
         :raises ProfticketAPIError: If there is an error while trying to
                                      load places data.
-        :rtype: None
+        :return: Mapping of event IDs to the number of free places and the
+        digest of the response body.
+        :rtype: Tuple[Dict[str, int], str]
         """
         places_url = f'{self.EVENT_DATA_URL}{self.com_id}/'
         try:
-            response = await self._make_request(places_url)
-            places_ben = response.json()
+            places_ben, digest = await self._get_json(places_url)
             places_events = places_ben.get('events', {})
-            self.free_places = {
+            places = {
                 event_id: free_places.get('seats', 0)
                 for event_id, free_places in places_events.items()
                 if isinstance(free_places, dict)
             }
-            logger.info(
-                f'Loaded free places info for {len(self.free_places)} events'
-            )
+            self.free_places = places
+            logger.info(f'Loaded free places info for {len(places)} events')
+            return places, digest
         except Exception as e:
             logger.error(f'Error loading places: {str(e)}')
             self.free_places = {}
@@ -481,14 +871,16 @@ class ProfticketsInfo:
 
     async def _get_show_details(self, show_id: str) -> dict[str, Any]:
         """
-        Fetches and returns the detailed information of a show, optionally
-        using cached data.
+        Returns the detailed information of a show, using cached data
+        where possible.
 
-        This asynchronous method attempts to fetch show details from a remote
-        service. If there is a cache hit, it returns the cached data to
-        save a network call. If the data is fetched successfully,
-        it updates the cache
-        with the new data.
+        A fresh cache entry is returned as is. A stale entry is returned
+        immediately while a background request refreshes it, so changed
+        actor lineups are picked up on a later cycle without delaying
+        this one. Without a usable entry the details are fetched inline;
+        concurrent callers for the same show share one request. Shows
+        whose last request failed are not requested again until the
+        error TTL passes.
 
         :param show_id: The unique identifier of the show to retrieve
         details for.
@@ -496,13 +888,49 @@ class ProfticketsInfo:
         :return: A dictionary containing the show details and list of actors.
         :rtype: Dict[str, Any]
         """
-        if show_id in self._show_cache:
+        state, cached = self._show_cache.lookup(show_id)
+        if state == ShowDetailsCache.FRESH:
             logger.debug(f'Using cached data for show_id: {show_id}')
-            return self._show_cache[show_id]
+            return cached or {'actors': [''], 'details': {}}
+
+        fetch = self._show_fetches.get(show_id)
+        if fetch is None:
+            fetch = asyncio.create_task(self._fetch_show_details(show_id))
+            self._show_fetches[show_id] = fetch
+            fetch.add_done_callback(
+                lambda _: self._show_fetches.pop(show_id, None)
+            )
+        if state == ShowDetailsCache.STALE:
+            logger.debug(f'Refreshing stale data for show_id: {show_id}')
+            return cached or {'actors': [''], 'details': {}}
+        return await asyncio.shield(fetch)
+
+    async def _fetch_show_details(self, show_id: str) -> dict[str, Any]:
+        """
+        Requests the details of a show and stores them in the cache.
+
+        When the cached details came with an ETag or Last-Modified
+        header, the request is conditional and a 304 response renews
+        them without a body. On failure the error is cached and the last
+        known details, if any, are returned instead.
 
+        :param show_id: The unique identifier of the show.
+        :type show_id: str
+        :return: A dictionary containing the show details and list of actors.
+        :rtype: Dict[str, Any]
+        """
         url = f'{self.SHOW_URL}?company_id={self.com_id}&show_id={show_id}'
         try:
-            response = await self._make_request(url)
+            response = await self._make_request(
+                url, headers=self._show_cache.conditional_headers(show_id)
+            )
+            if response.status_code == 304:
+                details = self._show_cache.revalidate(show_id)
+                if details is None:
+                    raise ProfticketAPIError('304 without cached details')
+                logger.debug(f'Show details not modified: {show_id}')
+                return details
+
             data = response.json()
             show_detail = data.get('response', {}).get('show_detail', {})
 
@@ -510,60 +938,205 @@ class ProfticketsInfo:
             if not isinstance(actors, list):
                 actors = ['']
 
-            self._show_cache[show_id] = {
-                'actors': actors,
-                'details': show_detail,
-            }
+            details = {'actors': actors, 'details': show_detail}
+            self._show_cache.store(
+                show_id,
+                details,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+            )
             logger.debug(f'Cached show details for show_id: {show_id}')
-            return self._show_cache[show_id]
+            return details
         except Exception as e:
             logger.error(
                 f'Error fetching show details for {show_id}: {str(e)}'
             )
-            return {'actors': [''], 'details': {}}
+            self._show_cache.store_error(show_id, str(e) or type(e).__name__)
+            return self._show_cache.peek(show_id) or {
+                'actors': [''],
+                'details': {},
+            }
 
-    async def collect_full_info(self) -> dict[str, Any]:
+    async def _collect_show_details(
+        self, show_ids: Iterable[str] | asyncio.Queue
+    ) -> tuple[dict[str, dict[str, Any]], ShowDetailsSummary]:
+        """
+        Gets the details of many shows through a pool of workers.
+
+        Each of up to `REQUEST_MAX_CONCURRENCY` workers takes the next
+        show as soon as its previous one is done, so a slow show holds
+        only its own worker while `_limiter` keeps the request rate.
+        Show IDs may also arrive through a queue while the listing is
+        still loading; the queue is closed by putting None into it.
+
+        :param show_ids: Show IDs to get details for, or a queue of them.
+        :type show_ids: Union[Iterable[str], asyncio.Queue]
+        :return: Details by show ID, and a summary of the shows whose
+        details could not be fetched.
+        :rtype: Tuple[Dict[str, Dict[str, Any]], ShowDetailsSummary]
+        """
+        if isinstance(show_ids, asyncio.Queue):
+            queue = show_ids
+        else:
+            queue = asyncio.Queue()
+            for show_id in show_ids:
+                queue.put_nowait(show_id)
+            queue.put_nowait(None)
+
+        # Детали берутся из результатов, а не из кэша: ограниченный
+        # кэш может вытеснить их до сборки событий
+        show_details: dict[str, dict[str, Any]] = {}
+
+        async def worker() -> None:
+            while (show_id := await queue.get()) is not None:
+                show_details[show_id] = await self._get_show_details(show_id)
+            # Признак конца остаётся в очереди для остальных обработчиков
+            queue.put_nowait(None)
+
+        await asyncio.gather(
+            *(worker() for _ in range(settings.REQUEST_MAX_CONCURRENCY))
+        )
+
+        failed = {}
+        fallback = 0
+        for show_id in show_details:
+            reason = self._show_cache.error(show_id)
+            if reason is None:
+                continue
+            failed[show_id] = reason
+            if self._show_cache.peek(show_id) is not None:
+                fallback += 1
+        return show_details, ShowDetailsSummary(
+            total=len(show_details), failed=failed, fallback=fallback
+        )
+
+    @staticmethod
+    def _fingerprint(
+        listing_digest: str,
+        places_digest: str,
+        show_details: dict[str, dict[str, Any]],
+    ) -> str:
+        """
+        Combines body digests and show actors into a month fingerprint.
+
+        Actors come from the show details cache rather than from this
+        month's responses, so they are hashed as well: a changed lineup
+        changes the fingerprint even when the listing did not change.
+
+        :param listing_digest: Digest of the listing pages.
+        :type listing_digest: str
+        :param places_digest: Digest of the places document.
+        :type places_digest: str
+        :param show_details: Show details by show ID.
+        :type show_details: Dict[str, Dict[str, Any]]
+        :return: Hex digest identifying the collected data.
+        :rtype: str
+        """
+        actors = [
+            [show_id, show_details[show_id].get('actors')]
+            for show_id in sorted(show_details, key=str)
+        ]
+        fingerprint = hashlib.sha256()
+        fingerprint.update(listing_digest.encode())
+        fingerprint.update(places_digest.encode())
+        fingerprint.update(
+            json.dumps(actors, ensure_ascii=False, default=str).encode()
+        )
+        return fingerprint.hexdigest()
+
+    async def collect_full_info(
+        self,
+        month: int | None = None,
+        year: int | None = None,
+        unchanged_since: str | None = None,
+    ) -> dict[str, Any] | None:
         """
         Collects detailed information about events and shows.
 
+        Month and year are passed through to every request instead of being
+        read from shared state, so several months can be collected
+        concurrently on one instance. When omitted, the values stored by
+        `set_date` are used.
+
         This method performs the following steps:
         1. Load basic data.
         2. Collect unique show IDs.
         3. Load information about places.
-        4. Process show details in batches.
+        4. Process show details through a worker pool.
         5. Compile the final result with relevant event details.
 
+        Steps 1 to 4 overlap: places are loaded while the listing is
+        paginated, and the details of a show are requested as soon as
+        its ID appears on a loaded page.
+
+        A complete result is fingerprinted by the digests of the listing
+        pages, the places document and the actors of every show, and the
+        fingerprint is kept in `fingerprints`. When it equals
+        `unchanged_since`, step 5 is skipped and None is returned.
+
+        :param month: The target month. Defaults to `self.month`.
+        :type month: Optional[int]
+        :param year: The target year. Defaults to `self.year`.
+        :type year: Optional[int]
+        :param unchanged_since: Fingerprint of the data the caller already
+        has for the month.
+        :type unchanged_since: Optional[str]
         :raises ProfticketAPIError: if any exception occurs during the process.
-        :return: A dictionary with event details keyed by event ID.
-        :rtype: Dict[str, Any]
+        :return: A dictionary with event details keyed by event ID, or None
+        if the data matches `unchanged_since`.
+        :rtype: Optional[Dict[str, Any]]
         """
+        key = (month or self.month, year or self.year)
+        self.fingerprints.pop(key, None)
+        await self._restore_show_cache()
+        places_task = asyncio.create_task(self._load_places())
+        show_queue: asyncio.Queue = asyncio.Queue()
+        details_task = asyncio.create_task(
+            self._collect_show_details(show_queue)
+        )
+        unique_shows = set()
+
+        def queue_shows(page_items: list[dict]) -> None:
+            for item in page_items:
+                for event in item.get('events', []):
+                    show_id = event.get('show', {}).get('show_id')
+                    if show_id is not None and show_id not in unique_shows:
+                        unique_shows.add(show_id)
+                        show_queue.put_nowait(show_id)
+
         try:
-            items = await self._load_data()
+            try:
+                items, listing_digest = await self._load_listing(
+                    month, year, on_page=queue_shows
+                )
+            finally:
+                show_queue.put_nowait(None)
             if not items:
                 logger.warning('No items found')
                 return {}
-
-            unique_shows = {
-                event.get('show', {}).get('show_id')
-                for item in items
-                for event in item.get('events', [])
-            }
-            unique_shows.discard(None)
             logger.info(f'Found {len(unique_shows)} unique shows to process')
 
-            await self._places()
-
-            show_tasks = [
-                self._get_show_details(show_id) for show_id in unique_shows
-            ]
-            logger.info(f'Processing {len(show_tasks)} shows')
+            free_places, places_digest = await places_task
+            show_details, summary = await details_task
+            self.detail_summaries[key] = summary
+            if summary.failed:
+                logger.warning(
+                    f'Show details failed for {len(summary.failed)} of '
+                    f'{summary.total} shows ({summary.fallback} served from '
+                    f'cache): {summary.failed}'
+                )
+            logger.info(f'Show details cache: {self.cache_stats()}')
+            logger.info(f'Request limiter: {self.limiter_stats()}')
+            logger.info(f'HTTP connections: {self.connection_stats()}')
 
-            batch_size = 5
-            for i in range(0, len(show_tasks), batch_size):
-                batch = show_tasks[i : i + batch_size]
-                if batch:
-                    await asyncio.gather(*batch)
-                    await asyncio.sleep(0.5)
+            if listing_digest is not None:
+                fingerprint = self._fingerprint(
+                    listing_digest, places_digest, show_details
+                )
+                self.fingerprints[key] = fingerprint
+                if fingerprint == unchanged_since:
+                    logger.info(f'Upstream data unchanged for {key}')
+                    return None
 
             result = {}
             for item in items:
@@ -575,7 +1148,7 @@ class ProfticketsInfo:
                         continue
 
                     try:
-                        show_data = self._show_cache.get(show_id, {})
+                        show_data = show_details.get(show_id, {})
                         result[event_id] = {
                             'id': event_id,
                             'show_id': show_id,
@@ -585,7 +1158,7 @@ class ProfticketsInfo:
                             'date': event.get('date_formatted'),
                             'duration': event.get('show', {}).get('duration'),
                             'age': event.get('show', {}).get('age'),
-                            'seats': self.free_places.get(event_id, 0) or 0,
+                            'seats': free_places.get(event_id, 0) or 0,
                             'image': event.get('show', {}).get('image_url'),
                             'annotation': event.get('annotation'),
                             'min_price': event.get('min_price', 0),
@@ -612,6 +1185,13 @@ class ProfticketsInfo:
             raise ProfticketAPIError(
                 f'Failed to collect information: {str(e)}'
             ) from e
+        finally:
+            for task in (places_task, details_task):
+                task.cancel()
+            await asyncio.gather(
+                places_task, details_task, return_exceptions=True
+            )
+            await self._save_show_cache()
 
 
 if __name__ == '__main__':
@@ -11,8 +11,7 @@ from telegram.tg_utils import get_result_message
 async def collect_shows_info(
     profticket: ProfticketsInfo, month: int, year: int, actor_filter=None
 ):
-    profticket.set_date(month, year)
-    result = await profticket.collect_full_info()
+    result = await profticket.collect_full_info(month, year)
     if not result:
         return LEXICON_RU['NONE_SHOWS_THIS_MONTH']
 
@@ -1,22 +1,43 @@
 import asyncio
 import json
 import logging
+import time
 from datetime import datetime
 
 import pytz
 from aiogram import Bot
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import select
+from sqlalchemy import case, delete, func, select
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
+from services.profticket.analytics import TITLES_TO_SKIP, localize_show_date
+from services.profticket.history_maintenance import maintain_seat_history
 from services.profticket.profticket_api import ProfticketsInfo
-from telegram.db.models import Show, ShowSeatHistory
+from services.profticket.show_stats import advance_show_stats
+from telegram.db.models import (
+    ArtistFirstSeen,
+    Show,
+    ShowActor,
+    ShowGroupFirstSeen,
+    ShowSeatHistory,
+    ShowStats,
+    SnapshotRun,
+)
+from telegram.db.user_operations import (
+    get_month_listing,
+    invalidate_show_caches,
+)
+from telegram.utils.report_cache import report_cache
 
 logger = logging.getLogger(__name__)
 timezone = pytz.timezone(settings.DEFAULT_TIMEZONE)
 
+# ~21 параметров на строку: 500 строк держат запрос далеко от лимита
+# Postgres в 32767 bind-параметров
+UPSERT_BATCH_SIZE = 500
+
 
 class ShowUpdateService:
     def __init__(self, session_maker, profticket: ProfticketsInfo, bot: Bot):
@@ -24,6 +45,9 @@ class ShowUpdateService:
         self.profticket = profticket
         self.bot = bot
         self.consecutive_errors = 0
+        self.history_maintained_at = 0.0
+        # Отпечаток данных, записанных в базу последним обновлением месяца
+        self.applied_fingerprints: dict[tuple[int, int], str | None] = {}
 
     async def _notify_admin(self, message: str):
         """Send a notification to the admin"""
@@ -49,91 +73,458 @@ class ShowUpdateService:
         current_time = int(datetime.now(timezone).timestamp())
         return (current_time - last_update) < settings.MAX_DATA_AGE
 
-    async def _update_month_data(
-        self, session: AsyncSession, month: int, year: int
-    ) -> bool:
-        try:
-            self.profticket.set_date(month, year)
-            shows = await self.profticket.collect_full_info()
-            if not shows:
-                logger.warning(f'No data available for {month}/{year}')
-                return False
+    @staticmethod
+    def _build_show_values(
+        event_id: str,
+        show_data: dict,
+        previous_seats: int | None,
+        month: int,
+        year: int,
+        current_time: int,
+    ) -> dict:
+        """Build a `shows` row from collected event data"""
+        return {
+            'id': event_id,
+            'show_id': int(show_data['show_id']),
+            'theater': show_data['theater'],
+            'scene': show_data['scene'],
+            'show_name': show_data['show_name'],
+            'date': show_data['date'],
+            'starts_at': localize_show_date(show_data['date']),
+            'duration': str(show_data['duration']),
+            'age': str(show_data['age']),
+            'seats': int(show_data['seats'] or 0),
+            'previous_seats': previous_seats,
+            'image': show_data['image'],
+            'annotation': show_data['annotation'],
+            'min_price': int(show_data['min_price'] or 0),
+            'max_price': int(show_data['max_price'] or 0),
+            'pushkin': bool(show_data['pushkin']),
+            'buy_link': show_data['buy_link'],
+            'actors': json.dumps(
+                [actor for actor in show_data['actors'] if actor],
+                ensure_ascii=False,
+            ),
+            'month': month,
+            'year': year,
+            'updated_at': current_time,
+            'is_deleted': False,
+        }
 
-            current_time = int(datetime.now(timezone).timestamp())
+    @staticmethod
+    async def _upsert_shows(session: AsyncSession, rows: list[dict]) -> None:
+        """
+        Upsert shows with multi-row INSERT ... ON CONFLICT statements.
 
-            # Получаем текущие данные о местах
-            current_shows = await session.execute(
-                select(Show).where(
-                    Show.month == month,
-                    Show.year == year,
-                    ~Show.is_deleted,
-                )
+        Rows are sent in chunks of UPSERT_BATCH_SIZE to stay well below the
+        Postgres limit on bind parameters per statement.
+        """
+        for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[i : i + UPSERT_BATCH_SIZE]
+            stmt = insert(Show).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['id'],
+                set_={
+                    name: stmt.excluded[name]
+                    for name in batch[0]
+                    if name != 'id'
+                },
             )
-            current_shows_dict = {
-                show.id: show.seats for show in current_shows.scalars()
+            await session.execute(stmt)
+
+    @staticmethod
+    async def _seat_history_rows(
+        session: AsyncSession, show_rows: list[dict], current_time: int
+    ) -> list[dict]:
+        """
+        Select the seat history snapshots to record for this refresh.
+
+        By default every event gets a row. With SEAT_HISTORY_CHANGES_ONLY a
+        row is written only for new events, changed seat counts and, when
+        SEAT_HISTORY_HEARTBEAT is set, events whose last recorded row is
+        older than the heartbeat. The skipped snapshots can be restored
+        from `snapshot_runs` (see `analytics.expand_seat_history`).
+        """
+        rows = [
+            {
+                'show_id': row['id'],
+                'timestamp': current_time,
+                'seats': row['seats'],
             }
+            for row in show_rows
+            if not settings.SEAT_HISTORY_CHANGES_ONLY
+            or row['previous_seats'] is None
+            or row['seats'] != row['previous_seats']
+        ]
+        heartbeat = settings.SEAT_HISTORY_HEARTBEAT
+        if not settings.SEAT_HISTORY_CHANGES_ONLY or heartbeat <= 0:
+            return rows
 
-            # Подготавливаем данные для обновления
-            for event_id, show_data in shows.items():
-                show_values = {
-                    'id': event_id,
-                    'show_id': int(show_data['show_id']),
-                    'theater': show_data['theater'],
-                    'scene': show_data['scene'],
-                    'show_name': show_data['show_name'],
-                    'date': show_data['date'],
-                    'duration': str(show_data['duration']),
-                    'age': str(show_data['age']),
-                    'seats': int(show_data['seats'] or 0),
-                    'previous_seats': current_shows_dict.get(event_id),
-                    'image': show_data['image'],
-                    'annotation': show_data['annotation'],
-                    'min_price': int(show_data['min_price'] or 0),
-                    'max_price': int(show_data['max_price'] or 0),
-                    'pushkin': bool(show_data['pushkin']),
-                    'buy_link': show_data['buy_link'],
-                    'actors': json.dumps(
-                        [actor for actor in show_data['actors'] if actor],
-                        ensure_ascii=False,
-                    ),
-                    'month': month,
-                    'year': year,
-                    'updated_at': current_time,
-                    'is_deleted': False,
-                }
-
-                # Используем insert().on_conflict_do_update()
-                stmt = insert(Show).values(show_values)
-                stmt = stmt.on_conflict_do_update(
-                    index_elements=['id'], set_=show_values
-                )
-                await session.execute(stmt)
+        written = {row['show_id'] for row in rows}
+        unchanged = [
+            row['id'] for row in show_rows if row['id'] not in written
+        ]
+        if not unchanged:
+            return rows
 
+        last_recorded = dict(
+            (
                 await session.execute(
-                    insert(ShowSeatHistory).values(
-                        show_id=event_id,
-                        timestamp=current_time,
-                        seats=show_values['seats'],
+                    select(
+                        ShowSeatHistory.show_id,
+                        func.max(ShowSeatHistory.timestamp),
+                    )
+                    .where(ShowSeatHistory.show_id.in_(unchanged))
+                    .group_by(ShowSeatHistory.show_id)
+                )
+            ).all()
+        )
+        seats_by_id = {row['id']: row['seats'] for row in show_rows}
+        for show_id in unchanged:
+            last_ts = last_recorded.get(show_id)
+            if last_ts is None or current_time - last_ts >= heartbeat:
+                rows.append(
+                    {
+                        'show_id': show_id,
+                        'timestamp': current_time,
+                        'seats': seats_by_id[show_id],
+                    }
+                )
+        return rows
+
+    @staticmethod
+    async def _insert_seat_history(
+        session: AsyncSession, rows: list[dict]
+    ) -> None:
+        """Insert seat history snapshots in a single executemany call"""
+        if rows:
+            await session.execute(insert(ShowSeatHistory), rows)
+
+    @staticmethod
+    def _actor_rows(event_id: str, actors_json: str) -> list[dict]:
+        """Build `show_actors` rows from the serialized actors list"""
+        names = [
+            actor.strip()
+            for actor in json.loads(actors_json)
+            if isinstance(actor, str) and actor.strip()
+        ]
+        return [
+            {
+                'show_id': event_id,
+                'position': position,
+                'name': name,
+            }
+            for position, name in enumerate(names)
+        ]
+
+    @classmethod
+    async def _sync_show_actors(
+        cls,
+        session: AsyncSession,
+        show_rows: list[dict],
+        stored_actors: dict[str, str],
+    ) -> list[dict]:
+        """
+        Rewrite `show_actors` for events whose cast list has changed.
+
+        Returns the inserted rows, i.e. the cast of new and recast events.
+        """
+        changed = [
+            row
+            for row in show_rows
+            if stored_actors.get(row['id']) != row['actors']
+        ]
+        for i in range(0, len(changed), UPSERT_BATCH_SIZE):
+            batch = changed[i : i + UPSERT_BATCH_SIZE]
+            await session.execute(
+                delete(ShowActor).where(
+                    ShowActor.show_id.in_([row['id'] for row in batch])
+                )
+            )
+        actor_rows = [
+            actor
+            for row in changed
+            for actor in cls._actor_rows(row['id'], row['actors'])
+        ]
+        if actor_rows:
+            await session.execute(insert(ShowActor), actor_rows)
+        return actor_rows
+
+    @staticmethod
+    async def _update_show_stats(
+        session: AsyncSession, show_rows: list[dict], current_time: int
+    ) -> list[dict]:
+        """
+        Advance `show_stats` by this refresh's snapshot of every event.
+
+        Every event is observed on every refresh (also in change-only
+        mode), so the summary matches the expanded seat history.
+        Returns the show rows of events seen for the first time.
+        """
+        event_ids = [row['id'] for row in show_rows]
+        columns = [
+            column
+            for column in ShowStats.__table__.columns
+            if column.name != 'show_id'
+        ]
+        stored = {}
+        for i in range(0, len(event_ids), UPSERT_BATCH_SIZE):
+            result = await session.execute(
+                select(ShowStats.show_id, *columns).where(
+                    ShowStats.show_id.in_(event_ids[i : i + UPSERT_BATCH_SIZE])
+                )
+            )
+            stored.update({row.show_id: row._asdict() for row in result})
+
+        stats_rows = [
+            advance_show_stats(
+                stored.get(row['id']), row['id'], current_time, row['seats']
+            )
+            for row in show_rows
+        ]
+        for i in range(0, len(stats_rows), UPSERT_BATCH_SIZE):
+            stmt = insert(ShowStats).values(
+                stats_rows[i : i + UPSERT_BATCH_SIZE]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['show_id'],
+                set_={
+                    column.name: stmt.excluded[column.name]
+                    for column in columns
+                },
+            )
+            await session.execute(stmt)
+        return [row for row in show_rows if row['id'] not in stored]
+
+    @staticmethod
+    async def _update_first_seen(
+        session: AsyncSession,
+        show_rows: list[dict],
+        new_rows: list[dict],
+        actor_rows: list[dict],
+        current_time: int,
+    ) -> None:
+        """
+        Record when show groups and artists were first seen.
+
+        A group is first seen with its first event. An artist takes the
+        earliest first-seen of the groups whose cast lists them, so casts
+        that changed are indexed too, not only those of new events.
+
+        Months are written concurrently and share groups and artists, so
+        rows are upserted in key order: every transaction then locks the
+        shared rows in the same order and the months cannot deadlock.
+        """
+        group_rows = {
+            str(row['show_id'] or row['id']): current_time for row in new_rows
+        }
+        if group_rows:
+            # Время только растёт: первая запись группы и есть самая ранняя
+            await session.execute(
+                insert(ShowGroupFirstSeen)
+                .values(
+                    [
+                        {'group_key': key, 'first_seen': ts}
+                        for key, ts in sorted(group_rows.items())
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=['group_key'])
+            )
+
+        event_groups = {
+            row['id']: str(row['show_id'] or row['id']) for row in show_rows
+        }
+        pairs = [
+            (event_groups[actor['show_id']], actor['name'])
+            for actor in actor_rows
+            if not any(
+                title in actor['name'].lower() for title in TITLES_TO_SKIP
+            )
+        ]
+        if not pairs:
+            return
+        group_keys = list({key for key, _ in pairs})
+        group_first_seen = {}
+        for i in range(0, len(group_keys), UPSERT_BATCH_SIZE):
+            result = await session.execute(
+                select(
+                    ShowGroupFirstSeen.group_key, ShowGroupFirstSeen.first_seen
+                ).where(
+                    ShowGroupFirstSeen.group_key.in_(
+                        group_keys[i : i + UPSERT_BATCH_SIZE]
                     )
                 )
+            )
+            group_first_seen.update(result.all())
+
+        artists: dict[str, int] = {}
+        for key, name in pairs:
+            ts = group_first_seen.get(key, current_time)
+            artists[name] = min(ts, artists.get(name, ts))
+        artist_rows = [
+            {'name': name, 'first_seen': ts}
+            for name, ts in sorted(artists.items())
+        ]
+        for i in range(0, len(artist_rows), UPSERT_BATCH_SIZE):
+            stmt = insert(ArtistFirstSeen).values(
+                artist_rows[i : i + UPSERT_BATCH_SIZE]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['name'],
+                set_={
+                    'first_seen': case(
+                        (
+                            stmt.excluded.first_seen
+                            < ArtistFirstSeen.first_seen,
+                            stmt.excluded.first_seen,
+                        ),
+                        else_=ArtistFirstSeen.first_seen,
+                    )
+                },
+            )
+            await session.execute(stmt)
 
-            # Мягко удаляем устаревшие записи
-            all_event_ids = list(shows.keys())
+    async def _write_month_data(
+        self,
+        session: AsyncSession,
+        shows: dict,
+        month: int,
+        year: int,
+        current_time: int,
+    ) -> None:
+        """Write collected shows of a month with their derived tables"""
+        # Получаем текущие данные о местах
+        current_shows = await session.execute(
+            select(Show.id, Show.seats, Show.actors).where(
+                Show.month == month,
+                Show.year == year,
+                ~Show.is_deleted,
+            )
+        )
+        current_shows_dict = {}
+        stored_actors = {}
+        for event_id, seats, actors in current_shows.all():
+            current_shows_dict[event_id] = seats
+            stored_actors[event_id] = actors
+
+        # Подготавливаем данные для обновления
+        show_rows = [
+            self._build_show_values(
+                event_id,
+                show_data,
+                current_shows_dict.get(event_id),
+                month,
+                year,
+                current_time,
+            )
+            for event_id, show_data in shows.items()
+        ]
+        await self._upsert_shows(session, show_rows)
+        actor_rows = await self._sync_show_actors(
+            session, show_rows, stored_actors
+        )
+        history_rows = await self._seat_history_rows(
+            session, show_rows, current_time
+        )
+        await self._insert_seat_history(session, history_rows)
+        new_rows = await self._update_show_stats(
+            session, show_rows, current_time
+        )
+        await self._update_first_seen(
+            session, show_rows, new_rows, actor_rows, current_time
+        )
+
+        # Мягко удаляем устаревшие записи
+        all_event_ids = list(shows.keys())
+        await session.execute(
+            Show.__table__.update()
+            .where(
+                Show.month == month,
+                Show.year == year,
+                Show.id.notin_(all_event_ids),
+                ~Show.is_deleted,
+            )
+            .values(is_deleted=True)
+        )
+
+    async def _record_unchanged_month(
+        self, session: AsyncSession, month: int, year: int, current_time: int
+    ) -> None:
+        """
+        Record a refresh of a month whose upstream data did not change.
+
+        Show content, actors and first-seen indexes already match the
+        upstream data and are not rewritten. The observation itself is
+        still stored: `updated_at`, the seat history rows the history
+        mode requires and the `show_stats` step, so data freshness,
+        history expansion and the sales summary stay exact. As on a full
+        write, `previous_seats` takes the current `seats`, so the month
+        listing stops showing the delta of an earlier refresh.
+        """
+        result = await session.execute(
+            select(Show.id, Show.seats).where(
+                Show.month == month,
+                Show.year == year,
+                ~Show.is_deleted,
+            )
+        )
+        show_rows = [
+            {'id': event_id, 'seats': seats, 'previous_seats': seats}
+            for event_id, seats in result.all()
+        ]
+        history_rows = await self._seat_history_rows(
+            session, show_rows, current_time
+        )
+        await self._insert_seat_history(session, history_rows)
+        await self._update_show_stats(session, show_rows, current_time)
+        await session.execute(
+            Show.__table__.update()
+            .where(
+                Show.month == month,
+                Show.year == year,
+                ~Show.is_deleted,
+            )
+            .values(updated_at=current_time, previous_seats=Show.seats)
+        )
+
+    async def _update_month_data(
+        self, session: AsyncSession, month: int, year: int
+    ) -> bool:
+        key = (month, year)
+        try:
+            shows = await self.profticket.collect_full_info(
+                month,
+                year,
+                unchanged_since=self.applied_fingerprints.get(key),
+            )
+            fingerprint = self.profticket.fingerprints.get(key)
+            if shows is not None and not shows:
+                logger.warning(f'No data available for {month}/{year}')
+                return False
+
+            current_time = int(datetime.now(timezone).timestamp())
+            if shows is None:
+                # Афиша, места и составы не менялись с прошлой записи
+                logger.info(f'Show data for {month}/{year} is unchanged')
+                await self._record_unchanged_month(
+                    session, month, year, current_time
+                )
+            else:
+                await self._write_month_data(
+                    session, shows, month, year, current_time
+                )
             await session.execute(
-                Show.__table__.update()
-                .where(
-                    Show.month == month,
-                    Show.year == year,
-                    Show.id.notin_(all_event_ids),
-                    ~Show.is_deleted,
+                insert(SnapshotRun).values(
+                    month=month, year=year, timestamp=current_time
                 )
-                .values(is_deleted=True)
             )
 
             await session.commit()
+            invalidate_show_caches(month, year)
+            report_cache.bump_version()
+            self.applied_fingerprints[key] = fingerprint
             self.consecutive_errors = 0
             logger.info(f'Show data for {month}/{year} has been updated')
-            return True
 
         except Exception as e:
             logger.error(f'Error updating data for {month}/{year}: {e}')
@@ -150,34 +541,80 @@ class ShowUpdateService:
 
             return False
 
+        await self._prerender_listing(session, month, year)
+        return True
+
+    @staticmethod
+    async def _prerender_listing(
+        session: AsyncSession, month: int, year: int
+    ) -> None:
+        """
+        Render the month listing once per update.
+
+        The data is already committed, so a rendering failure is only
+        logged: the listing is then rendered on the next user request.
+        """
+        try:
+            await get_month_listing(session, month, year)
+        except Exception as e:
+            logger.error(f'Error rendering listing for {month}/{year}: {e}')
+
+    async def _refresh_month(self, month: int, year: int) -> bool:
+        """Refresh one month in its own session if its data is stale"""
+        async with self.session_maker() as session:
+            logger.info(f'Checking data freshness for {month}/{year}')
+            if await self._check_data_freshness(session, month, year):
+                return False
+
+            logger.info(f'Updating data for {month}/{year}')
+            return await self._update_month_data(session, month, year)
+
+    async def _maintain_history(self) -> None:
+        """
+        Run seat history partition/retention maintenance when due.
+
+        Failures are logged and the attempt still counts, so a broken
+        maintenance step is retried after the full interval instead of
+        failing every update cycle.
+        """
+        now = time.monotonic()
+        interval = settings.SEAT_HISTORY_MAINTENANCE_INTERVAL
+        if self.history_maintained_at and (
+            now - self.history_maintained_at < interval
+        ):
+            return
+        try:
+            async with self.session_maker() as session:
+                await maintain_seat_history(session)
+        except Exception as e:
+            logger.error(f'Seat history maintenance failed: {e}')
+        self.history_maintained_at = now
+
     async def update_loop(self):
         logger.info('Starting update loop service')
         while True:
             try:
-                async with self.session_maker() as session:
-                    # Проверяем и обновляем 3 месяца
-                    for i in range(3):
-                        check_date = datetime.now(timezone) + relativedelta(
-                            months=i
-                        )
-                        month = check_date.month
-                        year = check_date.year
-
-                        logger.info(
-                            f'Checking data freshness for {month}/{year}'
-                        )
-                        is_fresh = await self._check_data_freshness(
-                            session, month, year
-                        )
-
-                        if not is_fresh:
-                            logger.info(f'Updating data for {month}/{year}')
-                            await self._update_month_data(session, month, year)
-
-                    wait_time = settings.UPDATE_INTERVAL
-                    logger.info(
-                        f'Waiting {wait_time} seconds before next check'
+                # Проверяем и обновляем 3 месяца параллельно
+                months = []
+                for i in range(3):
+                    check_date = datetime.now(timezone) + relativedelta(
+                        months=i
                     )
+                    months.append((check_date.month, check_date.year))
+
+                results = await asyncio.gather(
+                    *(
+                        self._refresh_month(month, year)
+                        for month, year in months
+                    ),
+                    return_exceptions=True,
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        raise result
+
+                wait_time = settings.UPDATE_INTERVAL
+                logger.info(f'Waiting {wait_time} seconds before next check')
 
             except Exception as e:
                 logger.error(f'Error in update loop: {e}')
@@ -185,6 +622,7 @@ class ShowUpdateService:
                 wait_time = settings.ERROR_RETRY_INTERVAL
                 logger.info(f'Will retry in {wait_time} seconds')
 
+            await self._maintain_history()
             await asyncio.sleep(wait_time)
 
     async def _has_shows(
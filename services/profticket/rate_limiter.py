@@ -0,0 +1,165 @@
+import asyncio
+import contextlib
+import time
+from collections.abc import Callable
+from typing import NamedTuple
+
+
+class LimiterStats(NamedTuple):
+    limit: float  # current concurrency limit
+    in_flight: int
+    rate: float  # tokens per second
+    requests: int  # slots granted
+    backoffs: int  # multiplicative decreases of the limit
+    pauses: int  # Retry-After pauses applied
+    waited: float  # seconds callers spent waiting for a slot
+
+
+class AdaptiveLimiter:
+    """
+    Token bucket rate limiter with AIMD adaptive concurrency.
+
+    Every request takes a token from a bucket refilled at `rate` tokens
+    per second (up to `burst`) and a slot under the concurrency limit.
+    The limit grows additively, by about one slot per limit's worth of
+    successful responses, and is multiplied by `decrease` when the
+    upstream signals overload (429, 5xx, timeouts). Only requests started
+    after the last decrease can trigger the next one, so a burst of
+    failures from one congested moment halves the limit once.
+
+    `pause` blocks every caller until the given time, so a Retry-After
+    from one response holds back the whole client rather than only the
+    coroutine that received it.
+    """
+
+    SUCCESS = 'success'
+    OVERLOAD = 'overload'
+    NEUTRAL = 'neutral'
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        initial_limit: float,
+        min_limit: float = 1,
+        max_limit: float = 10,
+        decrease: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param rate: Requests per second the bucket allows on average.
+        :type rate: float
+        :param burst: Bucket capacity, the number of requests that may
+        start back to back.
+        :type burst: int
+        :param initial_limit: Concurrency limit to start from.
+        :type initial_limit: float
+        :param min_limit: Lowest concurrency limit.
+        :type min_limit: float
+        :param max_limit: Highest concurrency limit.
+        :type max_limit: float
+        :param decrease: Factor applied to the limit on overload.
+        :type decrease: float
+        :param clock: Monotonic time source, replaceable in tests.
+        :type clock: Callable[[], float]
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = min(max(initial_limit, min_limit), max_limit)
+        self.decrease = decrease
+        self.clock = clock
+        self.in_flight = 0
+        self.requests = 0
+        self.backoffs = 0
+        self.pauses = 0
+        self.waited = 0.0
+        self._tokens = float(burst)
+        self._refilled_at = clock()
+        self._resume_at = 0.0
+        self._epoch = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> int:
+        """
+        Wait for a token and a concurrency slot.
+
+        :return: Ticket to pass to `release`.
+        :rtype: int
+        """
+        started = self.clock()
+        async with self._cond:
+            while True:
+                now = self.clock()
+                self._refill(now)
+                if now < self._resume_at:
+                    delay = self._resume_at - now
+                elif self.in_flight >= int(self.limit):
+                    delay = None
+                elif self._tokens < 1:
+                    delay = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    self.requests += 1
+                    self.waited += now - started
+                    return self._epoch
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._cond.wait(), delay)
+
+    async def release(self, ticket: int, outcome: str) -> None:
+        """
+        Free a slot and adjust the limit by the request outcome.
+
+        :param ticket: Value returned by `acquire`.
+        :type ticket: int
+        :param outcome: SUCCESS grows the limit, OVERLOAD shrinks it,
+        NEUTRAL (e.g. a 404) leaves it as is.
+        :type outcome: str
+        """
+        async with self._cond:
+            self.in_flight -= 1
+            if outcome == self.SUCCESS:
+                self.limit = min(
+                    self.max_limit, self.limit + 1 / max(self.limit, 1)
+                )
+            elif outcome == self.OVERLOAD and ticket == self._epoch:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                # Накопленный запас токенов сгорает вместе с лимитом
+                self._tokens = min(self._tokens, 1.0)
+                self._epoch += 1
+                self.backoffs += 1
+            self._cond.notify_all()
+
+    async def pause(self, seconds: float) -> None:
+        """
+        Hold back all new requests for `seconds`, e.g. from Retry-After.
+
+        :param seconds: Delay from now; a longer pending pause is kept.
+        :type seconds: float
+        """
+        async with self._cond:
+            resume_at = self.clock() + seconds
+            if resume_at > self._resume_at:
+                self._resume_at = resume_at
+                self.pauses += 1
+            self._cond.notify_all()
+
+    def stats(self) -> LimiterStats:
+        return LimiterStats(
+            limit=round(self.limit, 2),
+            in_flight=self.in_flight,
+            rate=self.rate,
+            requests=self.requests,
+            backoffs=self.backoffs,
+            pauses=self.pauses,
+            waited=round(self.waited, 3),
+        )
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._refilled_at)
+        self._tokens = min(
+            float(self.burst), self._tokens + elapsed * self.rate
+        )
+        self._refilled_at = now
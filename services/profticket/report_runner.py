@@ -0,0 +1,237 @@
+"""
+Расчёт отчётов аналитики вне цикла событий бота.
+
+Функции отчётов в analytics синхронные и на истории за всё время
+работают секунды; вызванные прямо в обработчике, они останавливают
+polling и ответы всем остальным пользователям. ReportRunner выполняет
+их в пуле процессов (или потоков) с таймаутом и ограничением числа
+одновременных отчётов.
+
+В пул уходят только кортежи и массивы NumPy: ORM-объекты привязаны
+к сессии и дорого сериализуются, а pickle большого списка держит GIL
+и сам останавливает цикл событий. Обработчик выбирает из БД нужные
+столбцы и упаковывает сырые снимки в HistoryStore; дневные агрегаты
+и пропуски ряда «только изменения» разворачиваются уже в воркере.
+"""
+
+import asyncio
+import contextlib
+import logging
+from collections.abc import Callable
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from datetime import datetime
+from functools import partial
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from config import settings
+from services.profticket.analytics import expand_seat_history, rollup_points
+from services.profticket.history_store import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+
+class ShowRow(NamedTuple):
+    """Поля Show, которые читают функции отчётов"""
+
+    id: str
+    show_id: int | None
+    show_name: str | None
+    date: str | None
+    month: int | None
+    year: int | None
+    actors: str | None
+    updated_at: int | None
+    is_deleted: bool | None
+    starts_at: datetime | None = None
+
+
+class SeatPoint(NamedTuple):
+    show_id: str
+    timestamp: int
+    seats: int
+
+
+class DailyPoint(NamedTuple):
+    show_id: str
+    first_timestamp: int
+    last_timestamp: int
+    first_seats: int
+    last_seats: int
+
+
+class RunPoint(NamedTuple):
+    month: int
+    year: int
+    timestamp: int
+
+
+class ReportInput(NamedTuple):
+    """Данные отчёта в виде, пригодном для передачи в другой процесс"""
+
+    shows: list[ShowRow]
+    points: HistoryStore  # сырые снимки: массивы сериализуются быстро
+    daily: list[tuple]  # поля DailyPoint
+    runs: list[tuple]  # (month, year, timestamp)
+
+
+def show_rows(shows) -> list[ShowRow]:
+    """ORM-объекты Show -> ShowRow"""
+    return [
+        ShowRow(
+            id=show.id,
+            show_id=show.show_id,
+            show_name=show.show_name,
+            date=show.date,
+            month=show.month,
+            year=show.year,
+            actors=show.actors,
+            updated_at=show.updated_at,
+            is_deleted=show.is_deleted,
+            starts_at=show.starts_at,
+        )
+        for show in shows
+    ]
+
+
+def history_store_from_input(report_input: ReportInput) -> HistoryStore:
+    """
+    Колоночная история из входных данных отчёта.
+
+    Дневные агрегаты превращаются в снимки, пропуски ряда «только
+    изменения» восстанавливаются по snapshot_runs.
+    """
+    store = report_input.points
+    if not report_input.daily and not report_input.runs:
+        return store
+    histories = rollup_points(
+        DailyPoint._make(row) for row in report_input.daily
+    )
+    event_ids = np.repeat(
+        np.asarray(store.event_ids, dtype=object), store.counts()
+    )
+    histories.extend(
+        map(
+            SeatPoint,
+            event_ids.tolist(),
+            store.timestamps.tolist(),
+            store.seats.tolist(),
+        )
+    )
+    runs = [RunPoint._make(row) for row in report_input.runs]
+    return HistoryStore.from_rows(
+        expand_seat_history(report_input.shows, histories, runs)
+    )
+
+
+def compute_report(
+    report: Callable, report_input: ReportInput, kwargs: dict
+) -> Any:
+    """
+    Точка входа воркера: строит историю и вызывает функцию отчёта.
+
+    :param report: Функция отчёта из analytics (shows, histories, ...)
+    :param report_input: Спектакли и история
+    :param kwargs: Остальные аргументы функции отчёта
+    :return: Результат отчёта или None, если данных нет
+    """
+    store = history_store_from_input(report_input)
+    if not report_input.shows or not len(store):
+        return None
+    return report(shows=report_input.shows, histories=store, **kwargs)
+
+
+class ReportRunner:
+    """Пул для отчётов с таймаутом и ограничением параллельности"""
+
+    def __init__(
+        self,
+        executor: str = 'process',
+        workers: int = 2,
+        timeout: float = 120,
+        max_concurrent: int = 2,
+    ):
+        """
+        :param executor: 'process' — пул процессов, 'thread' — потоков
+        :param workers: Размер пула
+        :param timeout: Сколько секунд ждать один отчёт
+        :param max_concurrent: Сколько отчётов считается одновременно,
+            остальные ждут очереди
+        """
+        if executor not in ('process', 'thread'):
+            raise ValueError(f'Unknown analytics executor: {executor}')
+        self.executor_type = executor
+        self.workers = workers
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self._executor: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            pool = (
+                ProcessPoolExecutor
+                if self.executor_type == 'process'
+                else ThreadPoolExecutor
+            )
+            self._executor = pool(max_workers=self.workers)
+        return self._executor
+
+    async def run(self, func: Callable, *args) -> Any:
+        """
+        Выполняет func(*args) в пуле, не блокируя цикл событий.
+
+        :param func: Функция уровня модуля (для пула процессов она
+            и аргументы должны сериализоваться pickle)
+        :return: Результат func
+        :raises TimeoutError: Отчёт не уложился в timeout; воркер
+            досчитает его, не отдавая слот, но результат будет отброшен
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        await self._slots.acquire()
+        try:
+            job = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Слот освобождается, когда воркер действительно закончил:
+        # отчёт, брошенный по таймауту, занимает его до конца расчёта
+        job.add_done_callback(
+            partial(self._release_slot, asyncio.get_running_loop())
+        )
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(job), self.timeout
+            )
+        except TimeoutError:
+            logger.warning(
+                f'Report {getattr(func, "__name__", func)} '
+                f'timed out after {self.timeout} s'
+            )
+            raise
+
+    def _release_slot(self, loop: asyncio.AbstractEventLoop, _job) -> None:
+        """Колбэк завершения задачи пула: возвращает слот в цикл событий"""
+        # Цикл мог закрыться, пока отчёт досчитывался
+        with contextlib.suppress(RuntimeError):
+            loop.call_soon_threadsafe(self._slots.release)
+
+    def shutdown(self) -> None:
+        """Останавливает пул, не дожидаясь отчётов в очереди"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+report_runner = ReportRunner(
+    executor=settings.ANALYTICS_EXECUTOR,
+    workers=settings.ANALYTICS_WORKERS,
+    timeout=settings.ANALYTICS_TIMEOUT,
+    max_concurrent=settings.ANALYTICS_MAX_CONCURRENT,
+)
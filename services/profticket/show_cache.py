@@ -0,0 +1,404 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from contextlib import closing
+from typing import Any, NamedTuple
+
+
+class ShowCacheStats(NamedTuple):
+    hits: int  # fresh entries served
+    stale_hits: int  # stale entries served while refreshing
+    negative_hits: int  # recent errors served without a request
+    misses: int  # no usable entry, fetched inline
+    evictions: int  # dropped by the size bound
+    expirations: int  # misses on entries past the stale window
+    errors: int  # failed fetches cached negatively
+    revalidated: int  # entries renewed by a 304 response
+    restored: int  # entries loaded from the persistent store
+    size: int
+    maxsize: int
+
+
+class PersistedShow(NamedTuple):
+    """A show details entry as kept in the persistent store"""
+
+    show_id: Hashable
+    value: Any
+    fetched_at: float  # wall-clock time of the last fetch or revalidation
+    etag: str | None
+    last_modified: str | None
+
+
+class _Entry(NamedTuple):
+    value: Any  # None marks a negative (error) entry
+    fresh_until: float
+    stale_until: float
+    fetched_at: float = 0.0
+    etag: str | None = None
+    last_modified: str | None = None
+    error: str | None = None  # why the last fetch failed, if it did
+
+
+class ShowDetailsCache:
+    """
+    Size-bounded LRU cache of show details with per-entry TTL.
+
+    An entry is fresh for `ttl` seconds and may then be served stale for
+    `stale_ttl` more seconds while the caller refreshes it. Failed
+    fetches are cached for `error_ttl` seconds, so a broken show is not
+    requested again on every update cycle; a stale value that failed to
+    refresh is kept and retried after the same delay.
+
+    Expired entries stay in the LRU until evicted: their ETag and
+    Last-Modified validators let the next request be conditional, and
+    their value is the fallback when that request fails.
+    """
+
+    FRESH = 'fresh'
+    STALE = 'stale'
+    MISS = 'miss'
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        stale_ttl: float = 0,
+        error_ttl: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param maxsize: Maximum number of cached shows.
+        :type maxsize: int
+        :param ttl: Seconds an entry is served without refreshing.
+        :type ttl: float
+        :param stale_ttl: Seconds after `ttl` an entry is still served
+        while it is refreshed in the background.
+        :type stale_ttl: float
+        :param error_ttl: Seconds a failed fetch is not retried.
+        :type error_ttl: float
+        :param clock: Monotonic time source, replaceable in tests.
+        :type clock: Callable[[], float]
+        :param wall_clock: Wall-clock time source used to age entries
+        persisted across restarts.
+        :type wall_clock: Callable[[], float]
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.error_ttl = error_ttl
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+        self.revalidated = 0
+        self.restored = 0
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._dirty: set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, key: Hashable) -> tuple[str, Any]:
+        """
+        Look up a show and classify the entry.
+
+        :param key: Show ID.
+        :return: (state, value) where state is FRESH, STALE or MISS;
+        the value is None for a miss and for a fresh negative entry.
+        :rtype: tuple[str, Any]
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return self.MISS, None
+        now = self.clock()
+        self._entries.move_to_end(key)
+        if now >= entry.stale_until:
+            self.expirations += 1
+            self.misses += 1
+            return self.MISS, None
+        if now >= entry.fresh_until:
+            self.stale_hits += 1
+            return self.STALE, entry.value
+        if entry.value is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return self.FRESH, entry.value
+
+    def peek(self, key: Hashable) -> Any:
+        """Cached value regardless of its age, without touching stats."""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def conditional_headers(self, key: Hashable) -> dict[str, str]:
+        """
+        Request headers that revalidate the cached value of a show.
+
+        :param key: Show ID.
+        :return: If-None-Match / If-Modified-Since for the validators
+        the upstream sent with the cached value, empty without them.
+        :rtype: dict[str, str]
+        """
+        entry = self._entries.get(key)
+        headers = {}
+        if entry is None or entry.value is None:
+            return headers
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(
+        self,
+        key: Hashable,
+        value: Any,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        """Store a successfully fetched value as fresh."""
+        self._put(
+            key,
+            self._fresh_entry(value, self.wall_clock(), etag, last_modified),
+        )
+        self._dirty.add(key)
+
+    def revalidate(self, key: Hashable) -> Any:
+        """
+        Renew a cached value the upstream reported as not modified.
+
+        :param key: Show ID.
+        :return: The renewed value, or None if nothing is cached.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.value is None:
+            return None
+        self.revalidated += 1
+        self._put(
+            key,
+            self._fresh_entry(
+                entry.value,
+                self.wall_clock(),
+                entry.etag,
+                entry.last_modified,
+            ),
+        )
+        self._dirty.add(key)
+        return entry.value
+
+    def store_error(self, key: Hashable, reason: str = 'fetch failed') -> None:
+        """
+        Record a failed fetch so it is not retried for `error_ttl`.
+
+        :param key: Show ID.
+        :param reason: Error description reported by `error`.
+        """
+        self.errors += 1
+        retry_at = self.clock() + self.error_ttl
+        entry = self._entries.get(key)
+        if entry is not None and entry.value is not None:
+            # Устаревшее значение лучше пустого: отдаём его до повтора
+            self._put(
+                key,
+                entry._replace(
+                    fresh_until=retry_at,
+                    stale_until=max(entry.stale_until, retry_at),
+                    error=reason,
+                ),
+            )
+        else:
+            self._put(key, _Entry(None, retry_at, retry_at, error=reason))
+
+    def error(self, key: Hashable) -> str | None:
+        """Why the last fetch of a show failed, None if it succeeded."""
+        entry = self._entries.get(key)
+        return entry.error if entry is not None else None
+
+    def restore(self, rows: Iterable[PersistedShow]) -> int:
+        """
+        Load entries from the persistent store, aged by their fetch time.
+
+        Entries already in memory are kept. Restored entries are not
+        marked for saving.
+
+        :param rows: Persisted entries, most recently fetched last.
+        :return: Number of restored entries.
+        :rtype: int
+        """
+        count = 0
+        for row in rows:
+            if row.show_id in self._entries:
+                continue
+            self._put(
+                row.show_id,
+                self._fresh_entry(
+                    row.value, row.fetched_at, row.etag, row.last_modified
+                ),
+            )
+            count += 1
+        self.restored += count
+        return count
+
+    def take_dirty(self) -> list[PersistedShow]:
+        """
+        Entries stored or revalidated since the last call.
+
+        :return: Rows for the persistent store; negative entries and
+        entries evicted meanwhile are skipped.
+        :rtype: list[PersistedShow]
+        """
+        rows = []
+        for key in self._dirty:
+            entry = self._entries.get(key)
+            if entry is not None and entry.value is not None:
+                rows.append(
+                    PersistedShow(
+                        key,
+                        entry.value,
+                        entry.fetched_at,
+                        entry.etag,
+                        entry.last_modified,
+                    )
+                )
+        self._dirty.clear()
+        return rows
+
+    def mark_dirty(self, keys: Iterable[Hashable]) -> None:
+        """
+        Return keys to the dirty set, e.g. after a failed save.
+
+        :param keys: Keys taken by `take_dirty`; evicted ones are skipped.
+        :type keys: Iterable[Hashable]
+        """
+        self._dirty.update(key for key in keys if key in self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._dirty.clear()
+
+    def stats(self) -> ShowCacheStats:
+        return ShowCacheStats(
+            hits=self.hits,
+            stale_hits=self.stale_hits,
+            negative_hits=self.negative_hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            expirations=self.expirations,
+            errors=self.errors,
+            revalidated=self.revalidated,
+            restored=self.restored,
+            size=len(self._entries),
+            maxsize=self.maxsize,
+        )
+
+    def _fresh_entry(
+        self,
+        value: Any,
+        fetched_at: float,
+        etag: str | None,
+        last_modified: str | None,
+    ) -> _Entry:
+        # Возраст считаем по настенным часам: они переживают перезапуск
+        age = max(0.0, self.wall_clock() - fetched_at)
+        fresh_until = self.clock() + self.ttl - age
+        return _Entry(
+            value,
+            fresh_until,
+            fresh_until + self.stale_ttl,
+            fetched_at,
+            etag,
+            last_modified,
+        )
+
+    def _put(self, key: Hashable, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            self._dirty.discard(evicted)
+            self.evictions += 1
+
+
+class ShowCacheStore:
+    """
+    SQLite file keeping show details and their validators across restarts.
+
+    The methods are blocking; ProfticketsInfo runs them in a thread.
+    Each call opens its own connection, so calls from different threads
+    are safe.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the SQLite database file.
+        :type path: str
+        """
+        self.path = path
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS show_details ('
+                'show_id TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'fetched_at REAL NOT NULL, etag TEXT, last_modified TEXT)'
+            )
+
+    def load(self, limit: int) -> list[PersistedShow]:
+        """
+        Read the most recently fetched entries.
+
+        :param limit: Maximum number of entries, usually the cache size.
+        :return: Entries ordered from oldest to newest fetch.
+        :rtype: list[PersistedShow]
+        """
+        with closing(sqlite3.connect(self.path)) as conn:
+            rows = conn.execute(
+                'SELECT show_id, value, fetched_at, etag, last_modified '
+                'FROM show_details ORDER BY fetched_at DESC LIMIT ?',
+                (limit,),
+            ).fetchall()
+        return [
+            PersistedShow(json.loads(show_id), json.loads(value), *rest)
+            for show_id, value, *rest in reversed(rows)
+        ]
+
+    def save(self, rows: list[PersistedShow], keep: int) -> None:
+        """
+        Upsert entries and drop all but the `keep` most recent ones.
+
+        :param rows: Entries to write.
+        :param keep: Number of entries the file keeps.
+        """
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.executemany(
+                'INSERT INTO show_details '
+                '(show_id, value, fetched_at, etag, last_modified) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (show_id) DO UPDATE SET value = excluded.value, '
+                'fetched_at = excluded.fetched_at, etag = excluded.etag, '
+                'last_modified = excluded.last_modified',
+                [
+                    (
+                        # JSON сохраняет тип ключа: show_id бывает числом
+                        json.dumps(row.show_id),
+                        json.dumps(row.value, ensure_ascii=False),
+                        row.fetched_at,
+                        row.etag,
+                        row.last_modified,
+                    )
+                    for row in rows
+                ],
+            )
+            conn.execute(
+                'DELETE FROM show_details WHERE show_id NOT IN ('
+                'SELECT show_id FROM show_details '
+                'ORDER BY fetched_at DESC LIMIT ?)',
+                (keep,),
+            )
@@ -0,0 +1,88 @@
+"""
+Инкрементальная сводка продаж по событиям (таблица show_stats).
+
+ShowUpdateService при каждом обновлении месяца продвигает сводку на
+один снимок: разница с прошлым снимком добавляется к продажам или
+возвратам, точка попадает в окно последних суток, по окну заново
+считается текущая скорость продаж. Отчёты по продажам и возвратам
+читают готовые итоги вместо пересчёта всей истории.
+"""
+
+import json
+
+import numpy as np
+
+from services.profticket.analytics import (
+    series_sales_rate,
+    series_valid_intervals,
+)
+
+# Окно и шаг, с которыми top_shows_by_current_sales_speed оценивает
+# скорость продаж
+RATE_LOOKBACK_HOURS = 24
+RATE_MIN_DT = 900
+
+
+def window_rate(window: list[list[int]]) -> tuple[float | None, int]:
+    """
+    Скорость продаж и число валидных интервалов по окну снимков.
+
+    :param window: Точки [timestamp, seats] по возрастанию времени
+    :return: Билетов/секунду (или None) и число интервалов
+    """
+    timestamps = np.fromiter(
+        (point[0] for point in window), dtype=np.int64, count=len(window)
+    )
+    seats = np.fromiter(
+        (point[1] for point in window), dtype=np.int32, count=len(window)
+    )
+    return (
+        series_sales_rate(timestamps, seats, RATE_LOOKBACK_HOURS),
+        series_valid_intervals(timestamps, RATE_LOOKBACK_HOURS, RATE_MIN_DT),
+    )
+
+
+def advance_show_stats(
+    stats: dict | None, event_id: str, timestamp: int, seats: int
+) -> dict:
+    """
+    Продвигает сводку события на один снимок.
+
+    :param stats: Текущая строка show_stats (или None для нового события)
+    :param event_id: Id события
+    :param timestamp: Время снимка
+    :param seats: Свободные места в снимке
+    :return: Новая строка show_stats
+    """
+    if stats is None:
+        gross = returned = 0
+        snapshots = 1
+        first_seen = timestamp
+        window = [[timestamp, seats]]
+    else:
+        diff = stats['last_seats'] - seats
+        gross = stats['gross'] + max(diff, 0)
+        returned = stats['returned'] + max(-diff, 0)
+        snapshots = stats['snapshots'] + 1
+        first_seen = stats['first_seen']
+        cutoff = timestamp - RATE_LOOKBACK_HOURS * 3600
+        window = [
+            point
+            for point in json.loads(stats['rate_window'] or '[]')
+            if point[0] >= cutoff
+        ]
+        window.append([timestamp, seats])
+
+    rate, intervals = window_rate(window)
+    return {
+        'show_id': event_id,
+        'gross': gross,
+        'returned': returned,
+        'snapshots': snapshots,
+        'first_seen': first_seen,
+        'last_timestamp': timestamp,
+        'last_seats': seats,
+        'rate_window': json.dumps(window, separators=(',', ':')),
+        'current_rate': rate,
+        'rate_intervals': intervals,
+    }
@@ -5,7 +5,10 @@ from sqlalchemy import (
     BigInteger,
     Boolean,
     Column,
+    DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     func,
@@ -64,7 +67,8 @@ class Show(Base):
     theater = Column(String)  # название театра
     scene = Column(String)  # название сцены
     show_name = Column(String)  # название спектакля
-    date = Column(String)  # дата и время
+    date = Column(String)  # дата и время (строка для показа)
+    starts_at = Column(DateTime(timezone=True))  # начало показа
     duration = Column(String)  # продолжительность
     age = Column(String)  # возрастное ограничение
     seats = Column(Integer)  # количество мест
@@ -83,11 +87,133 @@ class Show(Base):
     )  # время последнего обновления (Unix timestamp)
     is_deleted = Column(Boolean, default=False)  # мягкое удаление
 
+    __table_args__ = (
+        # Афиша и список доступных месяцев: активные показы месяца
+        Index(
+            'ix_shows_active_year_month',
+            'year',
+            'month',
+            'seats',
+            postgresql_where=~is_deleted,
+            sqlite_where=~is_deleted,
+        ),
+        # Проверка свежести: последний updated_at месяца
+        Index('ix_shows_year_month_updated_at', 'year', 'month', 'updated_at'),
+        # Афиша месяца в порядке начала показов
+        Index(
+            'ix_shows_active_year_month_starts_at',
+            'year',
+            'month',
+            'starts_at',
+            'id',
+            postgresql_where=~is_deleted,
+            sqlite_where=~is_deleted,
+        ),
+    )
+
 
 class ShowSeatHistory(Base):
     __tablename__ = 'show_seat_history'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    show_id = Column(String, ForeignKey('shows.id'), index=True)
+    show_id = Column(String, ForeignKey('shows.id'))
     timestamp = Column(Integer, default=current_timestamp, index=True)
     seats = Column(Integer)
+
+    # В Postgres таблица секционирована по месяцам (RANGE по timestamp),
+    # секциями управляет services/profticket/history_maintenance.py
+    __table_args__ = (
+        # История показа по времени; заменяет одиночный индекс по show_id
+        Index(
+            'ix_show_seat_history_show_id_timestamp', 'show_id', 'timestamp'
+        ),
+    )
+
+
+class ShowActor(Base):
+    """Актёр события: нормализованный индекс по полю shows.actors."""
+
+    __tablename__ = 'show_actors'
+
+    show_id = Column(String, ForeignKey('shows.id'), primary_key=True)
+    position = Column(Integer, primary_key=True)  # порядок в списке актёров
+    name = Column(String)  # имя без пробелов по краям
+
+
+class ShowSeatHistoryDaily(Base):
+    """Дневной агрегат истории мест, вытесненной из show_seat_history.
+
+    Хранит первое и последнее значение мест за сутки (UTC) и продажи/возвраты
+    внутри суток, поэтому итоги продаж по агрегатам совпадают с итогами по
+    сырым снимкам.
+    """
+
+    __tablename__ = 'show_seat_history_daily'
+
+    show_id = Column(String, ForeignKey('shows.id'), primary_key=True)
+    day = Column(Integer, primary_key=True)  # начало суток UTC, Unix time
+    first_timestamp = Column(Integer)
+    last_timestamp = Column(Integer)
+    first_seats = Column(Integer)
+    last_seats = Column(Integer)
+    gross = Column(Integer)  # продано внутри суток
+    returned = Column(Integer)  # возвращено внутри суток
+    snapshots = Column(Integer)  # сколько снимков свёрнуто
+
+
+class ShowStats(Base):
+    """Сводка продаж события, обновляется вместе с каждым снимком мест.
+
+    Продажи и возвраты накапливаются по разнице с предыдущим снимком,
+    окно последних суток хранится для расчёта текущей скорости продаж.
+    """
+
+    __tablename__ = 'show_stats'
+
+    show_id = Column(String, ForeignKey('shows.id'), primary_key=True)
+    gross = Column(Integer, default=0)  # продано за всё время
+    returned = Column(Integer, default=0)  # возвращено за всё время
+    snapshots = Column(Integer, default=0)  # сколько снимков учтено
+    first_seen = Column(Integer)  # время первого снимка
+    last_timestamp = Column(Integer)  # время последнего снимка
+    last_seats = Column(Integer)  # места в последнем снимке
+    rate_window = Column(String)  # JSON [[timestamp, seats], ...] за сутки
+    current_rate = Column(Float)  # билетов/секунду, None — нет оценки
+    rate_intervals = Column(Integer, default=0)  # валидных интервалов
+
+
+class ShowGroupFirstSeen(Base):
+    """Когда снапшотер впервые увидел спектакль (группу событий).
+
+    Ключ группы — show_id, а без него id события, строкой. Пишется при
+    первом снимке первого события группы.
+    """
+
+    __tablename__ = 'show_group_first_seen'
+
+    group_key = Column(String, primary_key=True)
+    first_seen = Column(Integer)
+
+
+class ArtistFirstSeen(Base):
+    """С какого времени отслеживается артист.
+
+    Самый ранний first_seen среди спектаклей, в составе которых он
+    значится; титулы из TITLES_TO_SKIP не индексируются.
+    """
+
+    __tablename__ = 'artist_first_seen'
+
+    name = Column(String, primary_key=True)
+    first_seen = Column(Integer)
+
+
+class SnapshotRun(Base):
+    """Отметка об успешном обновлении месяца (одна на цикл)."""
+
+    __tablename__ = 'snapshot_runs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    month = Column(Integer)
+    year = Column(Integer)
+    timestamp = Column(Integer, default=current_timestamp)
@@ -0,0 +1,425 @@
+from sqlalchemy import Float, and_, case, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from services.profticket.analytics import RETURN_RATE_MIN_SOLD
+from services.profticket.report_runner import ShowRow
+from telegram.db.models import (
+    ArtistFirstSeen,
+    Show,
+    ShowActor,
+    ShowGroupFirstSeen,
+    ShowStats,
+)
+
+
+def _period_filters(
+    month: int | None, year: int | None, include_past_shows: bool
+) -> list:
+    filters = []
+    if month is not None and year is not None:
+        filters += [Show.month == month, Show.year == year]
+    if not include_past_shows:
+        filters.append(Show.is_deleted.isnot(True))
+    return filters
+
+
+async def get_show_sales_totals(
+    session: AsyncSession,
+    month: int | None = None,
+    year: int | None = None,
+    include_past_shows: bool = False,
+) -> list:
+    """
+    Per-show gross sold and returned seats from the show_stats summary.
+
+    show_stats is advanced by the snapshotter in the same transaction as
+    every snapshot, so the totals are read as stored instead of being
+    recomputed from show_seat_history; the result is the same for dense
+    and change-only histories and survives the daily rollup.
+
+    Args:
+        session: Database session
+        month: Month number, or None for all time
+        year: Year, or None for all time
+        include_past_shows: Include soft-deleted (past) shows
+
+    Returns:
+        list: Rows with id, show_id, show_name, gross, returned and
+        first_seen, compatible with analytics.ShowSalesTotals
+    """
+    filters = _period_filters(month, year, include_past_shows)
+    result = await session.execute(
+        select(
+            Show.id,
+            Show.show_id,
+            Show.show_name,
+            ShowStats.gross,
+            ShowStats.returned,
+            ShowStats.first_seen,
+        )
+        .join(ShowStats, ShowStats.show_id == Show.id)
+        .where(*filters)
+        .order_by(Show.id)
+    )
+    return result.all()
+
+
+async def _top_groups(
+    session: AsyncSession,
+    metrics: list,
+    extra: list,
+    first_event,
+    having,
+    month: int | None,
+    year: int | None,
+    include_past_shows: bool,
+    n: int,
+) -> list[tuple]:
+    """
+    Top-n show groups by an aggregate over show_stats.
+
+    Events are grouped like in the analytics reports: by Show.show_id,
+    or by the event itself when show_id is empty. The group is named
+    after its first event (lowest id) that passed the report filter,
+    which is also the tie-breaker, so the order matches the stable sort
+    of the in-memory reports.
+
+    Args:
+        session: Database session
+        metrics: Aggregate columns of the report; the first one ranks
+        extra: Aggregate columns returned after the group key
+        first_event: Aggregate of the lowest qualifying event id
+        having: Condition on the group aggregates
+        month: Month number, or None for all time
+        year: Year, or None for all time
+        include_past_shows: Include soft-deleted (past) shows
+        n: Number of groups to return
+
+    Returns:
+        list: (show_name, *metrics, group_key, *extra) tuples
+    """
+    filters = _period_filters(month, year, include_past_shows)
+    columns = [
+        column.label(f'c{i}') for i, column in enumerate(metrics + extra)
+    ]
+    groups = (
+        select(first_event.label('first_id'), *columns)
+        .select_from(ShowStats)
+        .join(Show, Show.id == ShowStats.show_id)
+        .where(*filters)
+        .group_by(
+            Show.show_id,
+            case((func.coalesce(Show.show_id, 0) == 0, Show.id)),
+        )
+        .having(having)
+        .subquery()
+    )
+    first = aliased(Show)
+    result = await session.execute(
+        select(
+            first.show_name,
+            first.show_id,
+            first.id,
+            *[groups.c[column.name] for column in columns],
+        )
+        .join(groups, groups.c.first_id == first.id)
+        .order_by(groups.c.c0.desc(), groups.c.first_id)
+        .limit(n)
+    )
+    return [
+        (
+            name,
+            *values[: len(metrics)],
+            show_id or event_id,
+            *values[len(metrics) :],
+        )
+        for name, show_id, event_id, *values in result.all()
+    ]
+
+
+async def get_top_shows_by_sales(
+    session: AsyncSession,
+    month: int | None = None,
+    year: int | None = None,
+    include_past_shows: bool = False,
+    n: int = 5,
+) -> list[tuple[str, int, int, int | str]]:
+    """
+    Top shows by gross sales, ranked in the database.
+
+    Same ranking as analytics.top_shows_by_sales_from_totals over
+    get_show_sales_totals.
+
+    Args:
+        session: Database session
+        month: Month number, or None for all time
+        year: Year, or None for all time
+        include_past_shows: Include soft-deleted (past) shows
+        n: Number of shows to return
+
+    Returns:
+        list: (name, gross, net, group_key) tuples
+    """
+    sold = ShowStats.gross > 0
+    gross = func.sum(ShowStats.gross)
+    returned = func.sum(case((sold, ShowStats.returned), else_=0))
+    return await _top_groups(
+        session,
+        [gross, gross - returned],
+        [],
+        func.min(case((sold, Show.id))),
+        gross > 0,
+        month,
+        year,
+        include_past_shows,
+        n,
+    )
+
+
+async def get_top_shows_by_returns(
+    session: AsyncSession,
+    month: int | None = None,
+    year: int | None = None,
+    include_past_shows: bool = False,
+    n: int = 5,
+) -> list[tuple[str, int, int | str]]:
+    """
+    Top shows by returned seats, ranked in the database.
+
+    Same ranking as analytics.top_shows_by_returns_from_totals over
+    get_show_sales_totals.
+
+    Args:
+        session: Database session
+        month: Month number, or None for all time
+        year: Year, or None for all time
+        include_past_shows: Include soft-deleted (past) shows
+        n: Number of shows to return
+
+    Returns:
+        list: (name, returns, group_key) tuples
+    """
+    returned = func.sum(ShowStats.returned)
+    return await _top_groups(
+        session,
+        [returned],
+        [],
+        func.min(case((ShowStats.returned > 0, Show.id))),
+        returned > 0,
+        month,
+        year,
+        include_past_shows,
+        n,
+    )
+
+
+async def get_top_shows_by_return_rate(
+    session: AsyncSession,
+    month: int | None = None,
+    year: int | None = None,
+    include_past_shows: bool = False,
+    n: int = 5,
+) -> list[tuple[str, float, int | str]]:
+    """
+    Top shows by share of returned seats, ranked in the database.
+
+    Events with fewer than analytics.RETURN_RATE_MIN_SOLD gross sales
+    are skipped; the rate of a group is its returns over its gross
+    sales, the sales-weighted mean of analytics'
+    top_shows_by_return_rate_from_totals.
+
+    Args:
+        session: Database session
+        month: Month number, or None for all time
+        year: Year, or None for all time
+        include_past_shows: Include soft-deleted (past) shows
+        n: Number of shows to return
+
+    Returns:
+        list: (name, return_rate, group_key) tuples
+    """
+    counted = ShowStats.gross >= RETURN_RATE_MIN_SOLD
+    sold = func.sum(case((counted, ShowStats.gross), else_=0))
+    returned = func.sum(case((counted, ShowStats.returned), else_=0))
+    return await _top_groups(
+        session,
+        [cast(returned, Float) / sold],
+        [],
+        func.min(case((counted, Show.id))),
+        sold > 0,
+        month,
+        year,
+        include_past_shows,
+        n,
+    )
+
+
+async def get_top_shows_by_sales_speed(
+    session: AsyncSession,
+    month: int | None = None,
+    year: int | None = None,
+    include_past_shows: bool = True,
+    n: int = 5,
+) -> list[tuple[str, float, int | str, bool]]:
+    """
+    Top shows by current sales speed, ranked in the database.
+
+    Uses the rate the snapshotter keeps in show_stats for the last day
+    of snapshots. Like analytics.top_shows_by_current_sales_speed, only
+    events with at least three snapshots and a positive rate count, and
+    the group rate is weighted by the number of valid intervals.
+
+    Args:
+        session: Database session
+        month: Month number, or None for all time
+        year: Year, or None for all time
+        include_past_shows: Include soft-deleted (past) shows
+        n: Number of shows to return
+
+    Returns:
+        list: (name, tickets_per_second, group_key, is_past) tuples,
+        is_past is True when every event of the group is soft-deleted
+    """
+    counted = and_(ShowStats.snapshots >= 3, ShowStats.current_rate > 0)
+    weight = case(
+        (ShowStats.rate_intervals > 0, ShowStats.rate_intervals), else_=1
+    )
+    rate_sum = func.sum(
+        case((counted, ShowStats.current_rate * weight), else_=0)
+    )
+    weight_sum = func.sum(case((counted, weight), else_=0))
+    return await _top_groups(
+        session,
+        [rate_sum / weight_sum],
+        [func.min(case((Show.is_deleted.is_(True), 1), else_=0)) == 1],
+        func.min(case((counted, Show.id))),
+        weight_sum > 0,
+        month,
+        year,
+        include_past_shows,
+        n,
+    )
+
+
+async def get_group_first_seen(
+    session: AsyncSession, group_keys: list[int | str]
+) -> dict[int | str, int]:
+    """
+    When the snapshotter first saw each show group.
+
+    Args:
+        session: Database session
+        group_keys: Group keys as returned by the get_top_shows_* queries
+
+    Returns:
+        dict: group_key -> first_seen timestamp, for indexed groups only
+    """
+    keys = {str(key): key for key in group_keys}
+    if not keys:
+        return {}
+    result = await session.execute(
+        select(
+            ShowGroupFirstSeen.group_key, ShowGroupFirstSeen.first_seen
+        ).where(ShowGroupFirstSeen.group_key.in_(keys))
+    )
+    return {keys[key]: first_seen for key, first_seen in result.all()}
+
+
+async def get_artist_first_seen(
+    session: AsyncSession, names: list[str]
+) -> dict[str, int]:
+    """
+    Since when each artist has been tracked.
+
+    Args:
+        session: Database session
+        names: Artist names as stored in show_actors
+
+    Returns:
+        dict: name -> first_seen timestamp, for indexed artists only
+    """
+    if not names:
+        return {}
+    result = await session.execute(
+        select(ArtistFirstSeen.name, ArtistFirstSeen.first_seen).where(
+            ArtistFirstSeen.name.in_(names)
+        )
+    )
+    return dict(result.all())
+
+
+async def get_show_actors(
+    session: AsyncSession,
+    month: int | None = None,
+    year: int | None = None,
+    include_past_shows: bool = False,
+) -> list:
+    """
+    (event id, actor name) pairs from the show_actors index.
+
+    Args:
+        session: Database session
+        month: Month number, or None for all time
+        year: Year, or None for all time
+        include_past_shows: Include soft-deleted (past) shows
+
+    Returns:
+        list: Rows with show_id and name, in cast order
+    """
+    filters = _period_filters(month, year, include_past_shows)
+    result = await session.execute(
+        select(ShowActor.show_id, ShowActor.name)
+        .join(Show, Show.id == ShowActor.show_id)
+        .where(*filters)
+        .order_by(ShowActor.show_id, ShowActor.position)
+    )
+    return result.all()
+
+
+async def get_report_shows(
+    session: AsyncSession,
+    month: int | None = None,
+    year: int | None = None,
+    *criteria,
+) -> list[ShowRow]:
+    """
+    Shows of a history-based report as ShowRow tuples.
+
+    Only the ShowRow columns are selected and the period is filtered in
+    SQL, instead of loading the whole shows table as ORM objects.
+
+    Args:
+        session: Database session
+        month: Month number, or None for all time
+        year: Year, or None for all time
+        *criteria: Extra filters, e.g. on Show.starts_at
+
+    Returns:
+        list[ShowRow]: Matching shows
+    """
+    filters = _period_filters(month, year, include_past_shows=True)
+    result = await session.execute(
+        select(*(getattr(Show, field) for field in ShowRow._fields)).where(
+            *filters, *criteria
+        )
+    )
+    return [ShowRow._make(row) for row in result]
+
+
+async def get_report_months(session: AsyncSession) -> list[tuple[int, int]]:
+    """
+    Distinct (month, year) pairs that have show data.
+
+    Args:
+        session: Database session
+
+    Returns:
+        list: Sorted list of (month, year) tuples
+    """
+    result = await session.execute(
+        select(Show.month, Show.year)
+        .where(Show.month.isnot(None), Show.year.isnot(None))
+        .distinct()
+    )
+    return sorted((month, year) for month, year in result.all())
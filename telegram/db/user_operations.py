@@ -1,11 +1,13 @@
 import json
 import logging
+from collections import defaultdict
+from collections.abc import Sequence
 from datetime import datetime
-from typing import Any
+from typing import Any, NamedTuple
 
 import pytz
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import select
+from sqlalchemy import and_, or_, select
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
@@ -16,7 +18,7 @@ from config import settings
 from telegram.db import User
 from telegram.db.models import Show
 from telegram.lexicon.lexicon_ru import LEXICON_LOGS, LEXICON_MONTHS_RU
-from telegram.tg_utils import parse_show_date
+from telegram.tg_utils import split_message_by_separator
 
 logger = logging.getLogger(__name__)
 
@@ -101,10 +103,67 @@ def get_result_message(
     )
 
 
+# Кэш доступных месяцев: живёт до следующего коммита ShowUpdateService.
+# generation растёт при каждой инвалидации, чтобы результат запроса,
+# начатого до коммита, не попал в кэш после него.
+_available_months_cache: dict[str, Any] = {
+    'generation': 0,
+    'key': None,
+    'value': None,
+}
+
+
+# Готовые списки спектаклей по месяцам: (month, year) -> MonthListing.
+# Счётчик поколений свой у каждого месяца, чтобы параллельное обновление
+# соседних месяцев не отменяло запись друг друга.
+_month_listing_cache: dict[str, Any] = {
+    'generations': defaultdict(int),
+    'listings': {},
+}
+
+
+class ListingEntry(NamedTuple):
+    text: str  # готовый блок сообщения о показе
+    actors: frozenset[str]  # актёры в нижнем регистре
+    updated_at: int
+
+
+class MonthListing(NamedTuple):
+    entries: tuple[ListingEntry, ...]  # по дате показа
+    text: str  # полный список без фильтра
+    chunks: tuple[str, ...]  # text, разбитый на сообщения
+    by_actor: dict[str, tuple[int, ...]]  # актёр -> индексы в entries
+
+
+def invalidate_show_caches(
+    month: int | None = None, year: int | None = None
+) -> None:
+    """
+    Drop cached show data after the shows table has been updated.
+
+    Args:
+        month: Updated month; all month listings are dropped if None
+        year: Updated year
+    """
+    _available_months_cache['generation'] += 1
+    _available_months_cache['key'] = None
+    _available_months_cache['value'] = None
+
+    listings = _month_listing_cache['listings']
+    generations = _month_listing_cache['generations']
+    keys = list(listings) if month is None else [(month, year)]
+    for key in keys:
+        generations[key] += 1
+        listings.pop(key, None)
+
+
 async def get_available_months(session: AsyncSession) -> list:
     """
     Get available months that have show data.
 
+    The result is cached until invalidate_show_caches() is called
+    (after every ShowUpdateService commit) or the current month changes.
+
     Args:
         session: Database session
 
@@ -113,31 +172,44 @@ async def get_available_months(session: AsyncSession) -> list:
         for months with data
     """
     current_time = datetime.now(timezone)
-
-    available_months = []
-    for i in range(3):
-        month_date = current_time + relativedelta(months=i)
-        month_number = month_date.month
-        year = month_date.year
-
-        query = (
-            select(Show)
-            .where(
-                Show.month == month_number,
-                Show.year == year,
-                Show.seats > 0,
-                ~Show.is_deleted,
-            )
-            .limit(1)
+    month_dates = [current_time + relativedelta(months=i) for i in range(3)]
+    key = (current_time.month, current_time.year)
+
+    cache = _available_months_cache
+    if cache['key'] == key:
+        return list(cache['value'])
+    generation = cache['generation']
+
+    query = (
+        select(Show.year, Show.month)
+        .where(
+            or_(
+                *(
+                    and_(Show.year == d.year, Show.month == d.month)
+                    for d in month_dates
+                )
+            ),
+            Show.seats > 0,
+            ~Show.is_deleted,
         )
+        .group_by(Show.year, Show.month)
+    )
+    result = await session.execute(query)
+    with_data = set(result.all())
 
-        result = await session.execute(query)
-        if result.scalar():
+    available_months = []
+    for month_date in month_dates:
+        if (month_date.year, month_date.month) in with_data:
             month_name = month_date.strftime('%B')
             month_name_ru = LEXICON_MONTHS_RU[month_name]
-            available_months.append((month_number, month_name_ru, year))
+            available_months.append(
+                (month_date.month, month_name_ru, month_date.year)
+            )
 
-    return available_months
+    if cache['generation'] == generation:
+        cache['key'] = key
+        cache['value'] = available_months
+    return list(available_months)
 
 
 async def check_data_freshness(session_pool: async_sessionmaker) -> bool:
@@ -225,6 +297,114 @@ async def set_spectacle_fio(
     await session.commit()
 
 
+def _format_listing(entries: Sequence[ListingEntry]) -> str:
+    """Join listing entries into the month message with a footer."""
+    if not entries:
+        return 'Нет спектаклей в этом месяце'
+
+    last_update = max(entry.updated_at for entry in entries)
+    update_time = datetime.fromtimestamp(last_update, tz=timezone)
+    formatted_time = update_time.strftime('%d.%m.%Y %H:%M')
+
+    total = (
+        f'Всего {len(entries)} спектаклей🌚\n'
+        f'Данные актуальны на: {formatted_time}'
+    )
+    return ''.join(entry.text for entry in entries) + total
+
+
+def render_month_listing(shows: Sequence[Show]) -> MonthListing:
+    """
+    Render the month listing once so it can be served from the cache.
+
+    Args:
+        shows: Active shows of the month, ordered by start time
+
+    Returns:
+        MonthListing: Rendered entries, full text and its chunks
+    """
+    entries = []
+    for show in shows:
+        actors = json.loads(show.actors)
+        entries.append(
+            ListingEntry(
+                text=get_result_message(
+                    show.seats,
+                    show.previous_seats,
+                    show.show_name,
+                    show.date,
+                    show.buy_link,
+                ),
+                actors=frozenset(
+                    actor.lower().strip() for actor in actors if actor
+                ),
+                updated_at=show.updated_at,
+            )
+        )
+    by_actor = defaultdict(list)
+    for index, entry in enumerate(entries):
+        for actor in entry.actors:
+            by_actor[actor].append(index)
+
+    text = _format_listing(entries)
+    return MonthListing(
+        entries=tuple(entries),
+        text=text,
+        chunks=tuple(split_message_by_separator(text)),
+        by_actor={actor: tuple(ids) for actor, ids in by_actor.items()},
+    )
+
+
+async def get_month_listing(
+    session: AsyncSession, month: int, year: int
+) -> MonthListing:
+    """
+    Get the rendered listing for a month, building it on a cache miss.
+
+    ShowUpdateService renders the listing right after each commit, so
+    normally this is a dictionary lookup.
+
+    Args:
+        session: Database session
+        month: Month number
+        year: Year
+
+    Returns:
+        MonthListing: Rendered month listing
+    """
+    key = (month, year)
+    listing = _month_listing_cache['listings'].get(key)
+    if listing is not None:
+        return listing
+
+    generation = _month_listing_cache['generations'][key]
+    query = (
+        select(Show)
+        .where(Show.month == month, Show.year == year, ~Show.is_deleted)
+        .order_by(Show.starts_at, Show.id)
+    )
+    result = await session.execute(query)
+    listing = render_month_listing(result.scalars().all())
+    if _month_listing_cache['generations'][key] == generation:
+        _month_listing_cache['listings'][key] = listing
+    return listing
+
+
+def _select_entries(
+    listing: MonthListing, actor_filter: str | None, descending: bool
+) -> list[ListingEntry]:
+    if actor_filter:
+        entries = [
+            listing.entries[index]
+            for index in listing.by_actor.get(actor_filter, ())
+        ]
+    else:
+        entries = list(listing.entries)
+    if descending:
+        entries.reverse()
+    return entries
+
+
 async def get_shows_from_db(
     session: AsyncSession,
     month: int,
@@ -245,52 +425,38 @@ async def get_shows_from_db(
     Returns:
         str: Formatted message with shows information
     """
-    query = select(Show).where(
-        Show.month == month, Show.year == year, ~Show.is_deleted
-    )
-    result = await session.execute(query)
-    shows = result.scalars().all()
-
-    shows.sort(
-        key=lambda s: parse_show_date(s.date),
-        reverse=descending,
-    )
-
-    if not shows:
-        return 'Нет спектаклей в этом месяце'
+    listing = await get_month_listing(session, month, year)
+    if not actor_filter and not descending:
+        return listing.text
+    return _format_listing(_select_entries(listing, actor_filter, descending))
 
-    msg = ''
-    show_count = 0
-    last_update = 0
 
-    for show in shows:
-        actors = json.loads(show.actors)
-        actors_lower = [actor.lower().strip() for actor in actors if actor]
-
-        if actor_filter and actor_filter not in actors_lower:
-            continue
-
-        show_count += 1
-        msg += get_result_message(
-            show.seats,
-            show.previous_seats,
-            show.show_name,
-            show.date,
-            show.buy_link,
-        )
-        last_update = max(last_update, show.updated_at)
-
-    if show_count == 0:
-        return 'Нет спектаклей в этом месяце'
+async def get_shows_chunks(
+    session: AsyncSession,
+    month: int,
+    year: int,
+    actor_filter=None,
+    descending: bool = False,
+) -> list[str]:
+    """
+    Get the month listing already split into message chunks.
 
-    update_time = datetime.fromtimestamp(last_update, tz=timezone)
-    formatted_time = update_time.strftime('%d.%m.%Y %H:%M')
+    Args:
+        session: Database session
+        month: Month number
+        year: Year
+        actor_filter: Optional actor name to filter shows
+        descending: Sort in descending order if True
 
-    total = (
-        f'Всего {show_count} спектаклей🌚\n'
-        f'Данные актуальны на: {formatted_time}'
+    Returns:
+        list: Message chunks ready to be sent
+    """
+    listing = await get_month_listing(session, month, year)
+    if not actor_filter and not descending:
+        return list(listing.chunks)
+    return split_message_by_separator(
+        _format_listing(_select_entries(listing, actor_filter, descending))
     )
-    return f'{msg}{total}'
 
 
 async def setup_database() -> tuple[async_sessionmaker, dict[str, Any]]:
@@ -8,6 +8,7 @@ from sqlalchemy import desc, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
+from services.profticket.profticket_api import ProfticketsInfo
 from telegram.db.models import Show, ShowSeatHistory, User
 from telegram.filters.is_admin import IsAdmin
 from telegram.keyboards.admin_keyboard import admin_main_menu_keyboard
@@ -15,6 +16,7 @@ from telegram.keyboards.analytics_keyboard import RUS_TO_MONTH
 from telegram.keyboards.main_keyboard import main_keyboard
 from telegram.lexicon.lexicon_ru import LEXICON_BUTTONS_RU, LEXICON_RU
 from telegram.tg_utils import send_chunks_answer
+from telegram.utils.report_cache import report_cache
 
 logger = logging.getLogger(__name__)
 
@@ -395,3 +397,61 @@ async def cmd_admin_db_overview(message: Message, session: AsyncSession):
             lines.append(f'• {month_name} {year}: <b>{cnt}</b>')
 
     await send_chunks_answer(message, '\n'.join(lines))
+
+
+@admin_router.message(F.text == LEXICON_BUTTONS_RU['/admin_report_cache'])
+async def cmd_admin_report_cache(
+    message: Message, profticket: ProfticketsInfo
+):
+    """Счётчики кэша отчётов аналитики и кэша деталей спектаклей."""
+    stats = report_cache.stats()
+    requests = stats.hits + stats.misses + stats.coalesced
+    hit_rate = (stats.hits + stats.coalesced) / requests if requests else 0
+    lines: list[str] = [
+        f'<b>{LEXICON_RU["ADMIN_REPORT_CACHE_TITLE"]}</b>',
+        f'Попаданий: <b>{stats.hits}</b> | Промахов: <b>{stats.misses}</b>',
+        f'Дождались общего расчёта: <b>{stats.coalesced}</b>',
+        f'Без пересчёта: <b>{hit_rate:.0%}</b> из {requests} запросов',
+        f'Отчётов в кэше: <b>{stats.size}</b> из {stats.maxsize}'
+        f' | Вытеснено: <b>{stats.evictions}</b>',
+        f'Версия данных: <b>{stats.version}</b>',
+    ]
+    show_stats = profticket.cache_stats()
+    lines += [
+        '',
+        f'<b>{LEXICON_RU["ADMIN_SHOW_CACHE_TITLE"]}</b>',
+        f'Свежих: <b>{show_stats.hits}</b>'
+        f' | Устаревших: <b>{show_stats.stale_hits}</b>'
+        f' | Промахов: <b>{show_stats.misses}</b>',
+        f'Ошибок: <b>{show_stats.errors}</b>'
+        f' | Из кэша ошибок: <b>{show_stats.negative_hits}</b>',
+        f'Подтверждено 304: <b>{show_stats.revalidated}</b>'
+        f' | Загружено с диска: <b>{show_stats.restored}</b>',
+        f'Спектаклей в кэше: <b>{show_stats.size}</b> из {show_stats.maxsize}'
+        f' | Вытеснено: <b>{show_stats.evictions}</b>'
+        f' | Истекло: <b>{show_stats.expirations}</b>',
+    ]
+    for (month, year), summary in sorted(
+        profticket.detail_summaries.items(), key=lambda item: item[0][::-1]
+    ):
+        lines.append(
+            f'{month:02d}.{year}: без свежих деталей'
+            f' <b>{len(summary.failed)}</b> из {summary.total}'
+            f' | Из прошлых данных: <b>{summary.fallback}</b>'
+        )
+    conn = profticket.connection_stats()
+    limiter = profticket.limiter_stats()
+    lines += [
+        '',
+        f'<b>{LEXICON_RU["ADMIN_HTTP_TITLE"]}</b>',
+        f'Протокол: <b>{"HTTP/2" if profticket.http2 else "HTTP/1.1"}</b>'
+        f' | Ответов по HTTP/2: <b>{conn.http2_requests}</b>',
+        f'Запросов: <b>{conn.requests}</b>'
+        f' | Новых соединений: <b>{conn.connections}</b>'
+        f' | TLS-рукопожатий: <b>{conn.tls_handshakes}</b>',
+        f'Через открытые соединения: <b>{conn.reused}</b>',
+        f'Лимит параллельных запросов: <b>{limiter.limit}</b>'
+        f' | Снижений: <b>{limiter.backoffs}</b>'
+        f' | Пауз по 429: <b>{limiter.pauses}</b>',
+    ]
+    await message.answer('\n'.join(lines))
@@ -1,4 +1,3 @@
-import json
 import logging
 from datetime import datetime
 
@@ -13,8 +12,32 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
 from services.profticket import analytics
-from services.profticket.analytics import TITLES_TO_SKIP
-from telegram.db.models import Show, ShowSeatHistory
+from services.profticket.history_store import HistoryStore
+from services.profticket.report_runner import (
+    ReportInput,
+    ShowRow,
+    compute_report,
+    report_runner,
+    show_rows,
+)
+from telegram.db.models import (
+    Show,
+    ShowSeatHistory,
+    ShowSeatHistoryDaily,
+    SnapshotRun,
+)
+from telegram.db.report_queries import (
+    get_artist_first_seen,
+    get_group_first_seen,
+    get_report_months,
+    get_report_shows,
+    get_show_actors,
+    get_show_sales_totals,
+    get_top_shows_by_return_rate,
+    get_top_shows_by_returns,
+    get_top_shows_by_sales,
+    get_top_shows_by_sales_speed,
+)
 from telegram.keyboards.analytics_keyboard import (
     RUS_TO_MONTH,
     analytics_main_menu_keyboard,
@@ -24,6 +47,7 @@ from telegram.keyboards.analytics_keyboard import (
 from telegram.keyboards.main_keyboard import main_keyboard
 from telegram.lexicon.lexicon_ru import LEXICON_BUTTONS_RU, LEXICON_RU
 from telegram.tg_utils import MONTHS_GENITIVE_RU, send_chunks_answer
+from telegram.utils.report_cache import report_cache
 
 logger = logging.getLogger(__name__)
 analytics_router = Router(name='analytics_router')
@@ -76,6 +100,67 @@ REPORTS = {
 }
 
 
+async def load_report_input(
+    session: AsyncSession,
+    shows: list[Show] | list[ShowRow],
+    month: int | None = None,
+    year: int | None = None,
+) -> ReportInput:
+    """
+    Load shows and seat history for a report computed by report_runner.
+
+    Only the columns the reports need are selected. Raw snapshots are
+    packed into a columnar HistoryStore, which pickles cheaply; daily
+    rollups and skipped change-only snapshots are expanded in the worker.
+    """
+    history_query = select(
+        ShowSeatHistory.show_id,
+        ShowSeatHistory.timestamp,
+        ShowSeatHistory.seats,
+    )
+    daily_query = select(
+        ShowSeatHistoryDaily.show_id,
+        ShowSeatHistoryDaily.first_timestamp,
+        ShowSeatHistoryDaily.last_timestamp,
+        ShowSeatHistoryDaily.first_seats,
+        ShowSeatHistoryDaily.last_seats,
+    )
+    runs_query = select(
+        SnapshotRun.month, SnapshotRun.year, SnapshotRun.timestamp
+    )
+    if month is not None and year is not None:
+        history_query = history_query.join(
+            Show, Show.id == ShowSeatHistory.show_id
+        ).where(Show.month == month, Show.year == year)
+        daily_query = daily_query.join(
+            Show, Show.id == ShowSeatHistoryDaily.show_id
+        ).where(Show.month == month, Show.year == year)
+        runs_query = runs_query.where(
+            SnapshotRun.month == month, SnapshotRun.year == year
+        )
+    return ReportInput(
+        shows=show_rows(shows),
+        points=HistoryStore.from_rows(await session.execute(history_query)),
+        daily=[tuple(row) for row in await session.execute(daily_query)],
+        runs=[tuple(row) for row in await session.execute(runs_query)],
+    )
+
+
+# Отчёты, которые ранжируются в БД по сводке show_stats. Последний
+# столбец строки — ключ группы для поиска в show_group_first_seen; у
+# отчёта по скорости после него идёт признак прошедшего, он отрезается
+TOP_QUERIES = {
+    LEXICON_BUTTONS_RU['/report_top_shows_sales']: get_top_shows_by_sales,
+    LEXICON_BUTTONS_RU['/report_top_shows_returns']: get_top_shows_by_returns,
+    LEXICON_BUTTONS_RU[
+        '/report_top_shows_return_rate'
+    ]: get_top_shows_by_return_rate,
+    LEXICON_BUTTONS_RU[
+        '/report_top_shows_speed'
+    ]: get_top_shows_by_sales_speed,
+}
+
+
 # --- Navigation Handlers ---
 @analytics_router.message(F.text == LEXICON_BUTTONS_RU['/analytics_menu'])
 async def cmd_analytics_menu(message: Message, state: FSMContext):
@@ -134,8 +219,7 @@ async def cmd_select_report_type(
     message: Message, state: FSMContext, session: AsyncSession
 ):
     # Получаем все доступные месяцы из базы
-    shows = (await session.execute(select(Show))).scalars().all()
-    months = sorted({(s.month, s.year) for s in shows if s.month and s.year})
+    months = await get_report_months(session)
     if not months:
         await message.answer(LEXICON_RU['NO_DATA_FOR_REPORT'])
         return
@@ -154,8 +238,7 @@ async def cmd_select_soldout_report(
     message: Message, state: FSMContext, session: AsyncSession
 ):
     # Получаем все доступные месяцы из базы
-    shows = (await session.execute(select(Show))).scalars().all()
-    months = sorted({(s.month, s.year) for s in shows if s.month and s.year})
+    months = await get_report_months(session)
     if not months:
         await message.answer(LEXICON_RU['NO_DATA_FOR_REPORT'])
         return
@@ -195,8 +278,6 @@ async def cmd_generate_top_report_month(
             await message.answer(LEXICON_RU['ERROR_MSG'])
             return
     report_type_key = user_data.get('report_type_to_generate')
-    analytics_func = REPORTS[report_type_key]['handler']
-    report_title = REPORTS[report_type_key]['title']
 
     # Логгирование запроса аналитики
     period = (
@@ -211,54 +292,101 @@ async def cmd_generate_top_report_month(
     await message.answer(
         LEXICON_RU['WAIT_MSG'], reply_markup=analytics_main_menu_keyboard()
     )
-    all_shows = (await session.execute(select(Show))).scalars().all()
-    all_histories = (
-        (await session.execute(select(ShowSeatHistory))).scalars().all()
-    )
-    if not all_shows or not all_histories:
-        await message.answer(LEXICON_RU['NO_DATA_FOR_REPORT'])
+    # Одинаковые запросы до следующего обновления данных считаются
+    # один раз, параллельные ждут общий результат
+    try:
+        report_text = await report_cache.get_or_compute(
+            (report_type_key, month, year),
+            lambda: build_top_report(
+                session, report_type_key, month, year, period_text
+            ),
+        )
+    except TimeoutError:
+        await message.answer(LEXICON_RU['REPORT_TIMEOUT'])
         return
-
-    if month is None and year is None:
-        results = analytics_func(
-            shows=all_shows,
-            histories=all_histories,
-            month=month,
-            year=year,
-            n=10,
-            include_past_shows=True,
+    await send_chunks_answer(message, report_text)
+
+
+async def build_top_report(
+    session: AsyncSession,
+    report_type_key: str,
+    month: int | None,
+    year: int | None,
+    period_text: str,
+) -> str:
+    """
+    Текст отчёта из REPORTS за период (или сообщение об отсутствии данных).
+
+    Результат одинаков для всех пользователей до следующего обновления
+    данных, поэтому обработчик отдаёт его через report_cache.
+    """
+    analytics_func = REPORTS[report_type_key]['handler']
+    report_title = REPORTS[report_type_key]['title']
+    all_time = month is None and year is None
+    first_seen: dict[int | str, int] = {}
+    artist_first_seen: dict[str, int] = {}
+    show_status_map: dict[int | str, bool] = {}
+    top_query = TOP_QUERIES.get(report_type_key)
+    if top_query is not None:
+        # Топ ранжируется в БД по сводке show_stats, история не нужна
+        speed_report = (
+            report_type_key == LEXICON_BUTTONS_RU['/report_top_shows_speed']
         )
-    elif report_type_key == LEXICON_BUTTONS_RU['/report_top_shows_speed']:
         # Скорость продаж - всегда включаем прошедшие для анализа
-        results = analytics_func(
-            shows=all_shows,
-            histories=all_histories,
-            month=month,
-            year=year,
+        rows = await top_query(
+            session,
+            month,
+            year,
+            include_past_shows=all_time or speed_report,
             n=10,
-            include_past_shows=True,
         )
+        if speed_report:
+            results = [row[:-1] for row in rows]
+            show_status_map = {row[-2]: row[-1] for row in rows}
+        else:
+            results = rows
+        if all_time:
+            # «Отслеживается с» — из индекса, который ведёт снапшотер
+            first_seen = await get_group_first_seen(
+                session, [row[-1] for row in results]
+            )
+    elif report_type_key == LEXICON_BUTTONS_RU['/report_top_artists_sales']:
+        # Итоги gross/returned берутся из show_stats, историю не грузим
+        totals = await get_show_sales_totals(
+            session, month, year, include_past_shows=all_time
+        )
+        # Актёры событий берутся из индекса show_actors
+        show_actors = await get_show_actors(
+            session, month, year, include_past_shows=all_time
+        )
+        results = analytics.top_artists_by_sales_from_totals(
+            totals, show_actors, n=10
+        )
+        if all_time:
+            artist_first_seen = await get_artist_first_seen(
+                session, [artist for artist, _ in results]
+            )
     else:
-        # Конкретный период - только активные спектакли
-        results = analytics_func(
-            shows=all_shows,
-            histories=all_histories,
-            month=month,
-            year=year,
-            n=10,
+        # Отчёты за месяц смотрят только на спектакли этого месяца
+        shows = await get_report_shows(session, month, year)
+        report_input = await load_report_input(session, shows, month, year)
+        report_kwargs = {'month': month, 'year': year, 'n': 10}
+        if all_time:
+            report_kwargs['include_past_shows'] = True
+        # Тяжёлый расчёт идёт в пуле, цикл событий остаётся свободным
+        results = await report_runner.run(
+            compute_report, analytics_func, report_input, report_kwargs
         )
+        if results is None:
+            return LEXICON_RU['NO_DATA_FOR_REPORT']
 
     # Проверяем результаты с учётом типа отчёта
     if report_type_key == LEXICON_BUTTONS_RU['/report_calendar_pace']:
         # calendar_pace возвращает dict, а не list
         if not results or not results.get('dates'):
-            await message.answer(
-                LEXICON_RU['NO_DATA_FOR_REPORT'] + period_text
-            )
-            return
+            return LEXICON_RU['NO_DATA_FOR_REPORT'] + period_text
     elif not results:
-        await message.answer(LEXICON_RU['NO_DATA_FOR_REPORT'] + period_text)
-        return
+        return LEXICON_RU['NO_DATA_FOR_REPORT'] + period_text
 
     response_lines = [f'<b>{report_title}{period_text}:</b>']
 
@@ -276,44 +404,6 @@ async def cmd_generate_top_report_month(
             f'<i>{LEXICON_RU["CALENDAR_PACE_FORMAT_EXPLANATION"]}</i>'
         )
 
-    event_to_group = {
-        s.id: getattr(s, 'show_id', None) or s.id for s in all_shows
-    }
-    first_seen: dict[str, int] = {}
-    for h in all_histories:
-        gkey = event_to_group.get(h.show_id)
-        if not gkey:
-            continue
-        ts = first_seen.get(gkey)
-        first_seen[gkey] = (
-            h.timestamp if ts is None or h.timestamp < ts else ts
-        )
-
-    artist_first_seen: dict[str, int] = {}
-    if month is None and year is None:
-        titles_to_skip = TITLES_TO_SKIP
-        for show in all_shows:
-            gkey = getattr(show, 'show_id', None) or show.id
-            ts = first_seen.get(gkey)
-            if ts is None:
-                continue
-            try:
-                actors_list = json.loads(show.actors) if show.actors else []
-                if not isinstance(actors_list, list):
-                    actors_list = []
-            except json.JSONDecodeError:
-                actors_list = []
-            for actor in actors_list:
-                if not isinstance(actor, str) or not actor.strip():
-                    continue
-                name = actor.strip()
-                lower = name.lower()
-                if any(title in lower for title in titles_to_skip):
-                    continue
-                prev = artist_first_seen.get(name)
-                if prev is None or ts < prev:
-                    artist_first_seen[name] = ts
-
     # Форматирование результата в зависимости от типа отчёта
     if report_type_key == LEXICON_BUTTONS_RU['/report_top_shows_sales']:
         for i, (name, gross, net, _id) in enumerate(results, 1):
@@ -343,13 +433,6 @@ async def cmd_generate_top_report_month(
                 + track
             )
     elif report_type_key == LEXICON_BUTTONS_RU['/report_top_shows_speed']:
-        # Создаем маппинг show_id -> is_deleted для определения статуса
-        show_status_map = {}
-        for show in all_shows:
-            group_key = getattr(show, 'show_id', None) or show.id
-            is_deleted = getattr(show, 'is_deleted', False)
-            show_status_map[group_key] = is_deleted
-
         for i, (name, rate_sec, _id) in enumerate(results, 1):
             rate_day = rate_sec * 60 * 60 * 24
 
@@ -459,10 +542,8 @@ async def cmd_generate_top_report_month(
             )
 
     if len(response_lines) > 1:
-        full_text = '\n\n'.join(response_lines)
-        await send_chunks_answer(message, full_text)
-    else:
-        await message.answer(LEXICON_RU['NO_DATA_FOR_REPORT'] + period_text)
+        return '\n\n'.join(response_lines)
+    return LEXICON_RU['NO_DATA_FOR_REPORT'] + period_text
 
 
 @analytics_router.message(StateFilter(AnalyticsStates.choosing_month))
@@ -506,19 +587,25 @@ async def cmd_generate_soldout_report(
         LEXICON_RU['WAIT_MSG'], reply_markup=analytics_main_menu_keyboard()
     )
 
-    all_shows = (await session.execute(select(Show))).scalars().all()
-    all_histories = (
-        (await session.execute(select(ShowSeatHistory))).scalars().all()
-    )
+    # Прогноз нужен только для будущих показов — отбираем их в БД
+    now = datetime.now(DEFAULT_TIMEZONE)
+    shows = await get_report_shows(session, month, year, Show.starts_at >= now)
+    report_input = await load_report_input(session, shows, month, year)
+    try:
+        results = await report_runner.run(
+            compute_report,
+            analytics_func,
+            report_input,
+            {'month': month, 'year': year, 'n': 10},
+        )
+    except TimeoutError:
+        await message.answer(LEXICON_RU['REPORT_TIMEOUT'])
+        return
 
-    if not all_shows or not all_histories:
+    if results is None:
         await message.answer(LEXICON_RU['NO_DATA_FOR_REPORT'])
         return
 
-    results = analytics_func(
-        shows=all_shows, histories=all_histories, month=month, year=year, n=10
-    )
-
     if not results:
         await message.answer(LEXICON_RU['NO_DATA_FOR_REPORT'] + period_text)
         return
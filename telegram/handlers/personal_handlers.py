@@ -9,7 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from telegram.db.user_operations import (
     get_available_months,
-    get_shows_from_db,
+    get_shows_chunks,
     get_user,
     search_count,
     set_spectacle_fio,
@@ -22,7 +22,7 @@ from telegram.lexicon.lexicon_ru import (
     LEXICON_LOGS,
     LEXICON_RU,
 )
-from telegram.tg_utils import check_text, send_chunks_edit
+from telegram.tg_utils import check_text, edit_with_chunks
 
 personal_user_router = Router(name=__name__)
 logger = logging.getLogger(__name__)
@@ -119,13 +119,13 @@ async def cmd_show_month_personal(message: Message, session: AsyncSession):
         month_number, _, year = selected_month
         try:
             msg = await message.answer(LEXICON_RU['WAIT_MSG'])
-            shows_info = await get_shows_from_db(
+            chunks = await get_shows_chunks(
                 session,
                 month_number,
                 year,
                 actor_filter=user.spectacle_full_name.lower().strip(),
             )
-            await send_chunks_edit(message.chat.id, msg, shows_info)
+            await edit_with_chunks(msg, chunks)
 
             logger.info(
                 LEXICON_LOGS['USER_GOT_SHOWS'].format(
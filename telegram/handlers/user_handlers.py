@@ -7,7 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from telegram.db.user_operations import (
     get_available_months,
-    get_shows_from_db,
+    get_shows_chunks,
     search_count,
 )
 from telegram.filters.month_filter import MonthFilter
@@ -17,7 +17,7 @@ from telegram.lexicon.lexicon_ru import (
     LEXICON_LOGS,
     LEXICON_RU,
 )
-from telegram.tg_utils import send_chunks_edit
+from telegram.tg_utils import edit_with_chunks
 
 user_router = Router(name=__name__)
 logger = logging.getLogger(__name__)
@@ -54,8 +54,8 @@ async def cmd_show_month(message: Message, session: AsyncSession):
         month_number, _, year = selected_month
         try:
             msg = await message.answer(LEXICON_RU['WAIT_MSG'])
-            shows_info = await get_shows_from_db(session, month_number, year)
-            await send_chunks_edit(message.chat.id, msg, shows_info)
+            chunks = await get_shows_chunks(session, month_number, year)
+            await edit_with_chunks(msg, chunks)
 
             logger.info(
                 LEXICON_LOGS['USER_GOT_SHOWS'].format(
@@ -16,6 +16,7 @@ def admin_main_menu_keyboard() -> ReplyKeyboardMarkup:
             KeyboardButton(text=LEXICON_BUTTONS_RU['/admin_prefs']),
             KeyboardButton(text=LEXICON_BUTTONS_RU['/admin_db']),
         ],
+        [KeyboardButton(text=LEXICON_BUTTONS_RU['/admin_report_cache'])],
         [KeyboardButton(text=LEXICON_BUTTONS_RU['/back_to_main_menu'])],
     ]
     return ReplyKeyboardMarkup(
@@ -64,6 +64,7 @@ LEXICON_RU: dict[str, str] = {
         '   \u23F3 Ожидаемый sold out: {date}'
     ),
     'NO_DATA_FOR_REPORT': 'Нет данных для формирования отчета за указанный период.',
+    'REPORT_TIMEOUT': 'Отчёт считается слишком долго, попробуйте позже.',
     'SALES_SPEED_UNIT_PER_DAY': 'бил./день',
     'SOLD_OUT_AT_TIMESTAMP': 'Продано полностью в: ', # Used with datetime
     'ALREADY_SOLD_OUT': 'Уже распродано!',
@@ -111,6 +112,9 @@ LEXICON_RU: dict[str, str] = {
     'ADMIN_USERS_TITLE': '👥 Пользователи — обзор',
     'ADMIN_PREFS_TITLE': '🎭 Предпочтения пользователей',
     'ADMIN_DB_TITLE': '🗄 Сводка по базе',
+    'ADMIN_REPORT_CACHE_TITLE': '📦 Кэш отчётов аналитики',
+    'ADMIN_SHOW_CACHE_TITLE': '🎭 Кэш деталей спектаклей',
+    'ADMIN_HTTP_TITLE': '🌐 Соединения с Profticket',
     'NO_PREFS': 'Нет данных о предпочтениях пользователей.',
 }
 
@@ -177,4 +181,5 @@ LEXICON_BUTTONS_RU: dict[str, str] = {
     '/admin_users': '👥 Пользователи',
     '/admin_prefs': '🎭 Предпочтения',
     '/admin_db': '🗄 База (шоу)',
+    '/admin_report_cache': '📦 Кэш отчётов',
 }
@@ -166,11 +166,24 @@ async def send_chunks_edit(
         text: The message text to be sent
         **kwargs: Additional arguments to pass to the message sending functions
     """
-    chunks = split_message_by_separator(text)
+    await edit_with_chunks(message, split_message_by_separator(text), **kwargs)
 
+
+async def edit_with_chunks(
+    message: Message, chunks: list[str], **kwargs
+) -> None:
+    """
+    Sends already split chunks: the first one replaces the message text,
+    the rest are sent using message.answer.
+
+    Args:
+        message: The message object
+        chunks: Message chunks to send
+        **kwargs: Additional arguments to pass to the message sending functions
+    """
     if chunks:
-        await message.edit_text(chunks.pop(0), **kwargs)
-        for chunk in chunks:
+        await message.edit_text(chunks[0], **kwargs)
+        for chunk in chunks[1:]:
             await message.answer(chunk, **kwargs)
             await asyncio.sleep(1)
 
@@ -0,0 +1,130 @@
+import asyncio
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, NamedTuple
+
+from config import settings
+
+
+class ReportCacheStats(NamedTuple):
+    hits: int  # ответ взят из кэша
+    misses: int  # отчёт посчитан заново
+    coalesced: int  # дождались уже идущего расчёта
+    evictions: int  # вытеснено по LRU
+    size: int
+    maxsize: int
+    version: int  # версия данных, растёт с каждым обновлением
+
+
+class ComputationCancelled(Exception):
+    """The caller that owned a shared computation was cancelled"""
+
+
+class ReportCache:
+    """
+    LRU cache of rendered reports for the current data version.
+
+    Reports are identical for every user until ShowUpdateService commits
+    new data, so results are keyed by the request and the data version.
+    Concurrent requests for the same key share a single computation.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple, Any] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Future] = {}
+
+    def bump_version(self) -> None:
+        """
+        Start a new data version after a ShowUpdateService commit.
+
+        Cached reports are dropped; computations already running finish
+        for their waiters but are not stored.
+        """
+        self.version += 1
+        self._entries.clear()
+
+    def stats(self) -> ReportCacheStats:
+        return ReportCacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            coalesced=self.coalesced,
+            evictions=self.evictions,
+            size=len(self._entries),
+            maxsize=self.maxsize,
+            version=self.version,
+        )
+
+    async def get_or_compute(
+        self, key: Hashable, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Get a cached report or compute it once for all concurrent callers.
+
+        Args:
+            key: Report request, e.g. (report_type_key, month, year)
+            compute: Coroutine factory building the report
+
+        Returns:
+            Any: The report; errors of compute are raised to every caller
+            waiting for it and are not cached. If the caller running the
+            computation is cancelled, a waiter computes the report with
+            its own compute instead
+        """
+        while True:
+            version = self.version
+            full_key = (version, key)
+            if full_key in self._entries:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return self._entries[full_key]
+
+            inflight = self._inflight.get(full_key)
+            if inflight is None:
+                return await self._compute(full_key, compute)
+            self.coalesced += 1
+            try:
+                # shield: отмена одного ожидающего не отменяет расчёт
+                return await asyncio.shield(inflight)
+            except ComputationCancelled:
+                # Расчёт шёл на сессии отменённого запроса; считаем сами
+                continue
+
+    async def _compute(
+        self, full_key: tuple, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Run compute for full_key, sharing the result with waiters."""
+        version = full_key[0]
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.set_exception(ComputationCancelled())
+            future.exception()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Помечаем исключение полученным, даже если никто не ждал
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(full_key, None)
+
+        future.set_result(value)
+        # Данные обновились во время расчёта — результат уже устарел
+        if version == self.version and self.maxsize > 0:
+            self._entries[full_key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+
+report_cache = ReportCache(settings.REPORT_CACHE_SIZE)
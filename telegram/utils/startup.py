@@ -11,6 +11,7 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 
 from config import settings
+from services.profticket.report_runner import report_runner
 from telegram.handlers import (
     admin_handlers,
     analytics_handlers,
@@ -102,6 +103,7 @@ async def on_shutdown(
             update_task.cancel()
             with contextlib.suppress(asyncio.CancelledError):
                 await update_task
+        report_runner.shutdown()
         await bot.session.close()
         logger.info(LEXICON_LOGS['BOT_SHUTDOWN_COMPLETE'])
     except Exception as e:
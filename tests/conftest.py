@@ -44,6 +44,27 @@ def stub_modules(monkeypatch):
         PROXY_URL = ''
         STOP_AFTER_ATTEMPT = 3
         DEFAULT_TIMEZONE = 'Europe/Moscow'
+        SEAT_HISTORY_CHANGES_ONLY = False
+        SEAT_HISTORY_HEARTBEAT = 21600
+        SEAT_HISTORY_RETENTION_MONTHS = 6
+        SEAT_HISTORY_MAINTENANCE_INTERVAL = 86400
+        REPORT_CACHE_SIZE = 128
+        SHOW_CACHE_SIZE = 2000
+        SHOW_CACHE_TTL = 21600
+        SHOW_CACHE_STALE_TTL = 86400
+        SHOW_CACHE_ERROR_TTL = 600
+        SHOW_CACHE_PATH = ''
+        REQUEST_RATE = 5.0
+        REQUEST_BURST = 5
+        REQUEST_MAX_CONCURRENCY = 10
+        HTTP2 = False
+        HTTP_MAX_CONNECTIONS = 10
+        HTTP_MAX_KEEPALIVE = 5
+        HTTP_KEEPALIVE_EXPIRY = 30.0
+        ANALYTICS_EXECUTOR = 'thread'
+        ANALYTICS_WORKERS = 2
+        ANALYTICS_TIMEOUT = 120
+        ANALYTICS_MAX_CONCURRENT = 2
         MAX_CONSECUTIVE_ERRORS = 3
 
     config.settings = Settings()
@@ -83,6 +104,7 @@ def stub_modules(monkeypatch):
             pass
 
     httpx.Limits = Limits
+    httpx.AsyncBaseTransport = object
     httpx.TimeoutException = Exception
     httpx.ProxyError = Exception
     httpx.HTTPStatusError = Exception
@@ -5,7 +5,9 @@ from services.profticket.analytics import (
     calendar_pace_dashboard,
     filter_data_by_period,
     get_net_sales_and_returns,
+    localize_show_date,
     parse_show_date,
+    show_starts_at,
 )
 from telegram.db.models import Show, ShowSeatHistory
 
@@ -70,6 +72,21 @@ class AnalyticsUtilsTestCase(unittest.TestCase):
         self.assertIsInstance(dt2, datetime)
         self.assertIsNone(parse_show_date('not a date'))
 
+    def test_show_starts_at(self):
+        starts_at = localize_show_date('18 мая 2025, вс, 16:00')
+        self.assertEqual(starts_at.isoformat(), '2025-05-18T16:00:00+03:00')
+        self.assertIsNone(localize_show_date(None))
+        # Заполненный столбец важнее строки
+        show = Show(id='s1', date='не дата', starts_at=starts_at)
+        self.assertEqual(show_starts_at(show), starts_at)
+        # из SQLite starts_at приходит без пояса
+        show.starts_at = datetime(2025, 5, 18, 16, 0)
+        self.assertEqual(show_starts_at(show), starts_at)
+        self.assertEqual(
+            show_starts_at(Show(id='s2', date='18 мая 2025, вс, 16:00')),
+            starts_at,
+        )
+
     def test_calculate_show_sales_from_history(self):
         # 10 -> 8, sold 2
         sold, returned = get_net_sales_and_returns(
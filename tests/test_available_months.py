@@ -0,0 +1,117 @@
+import unittest
+from datetime import UTC, datetime, timedelta
+from unittest import mock
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from telegram.db import Base, user_operations
+from telegram.db.models import Show
+from tests.test_seat_history import (
+    DummyBot,
+    DummyProfticket,
+    FakeAsyncSession,
+    ShowUpdateService,
+    make_event,
+)
+
+NOW = datetime(2024, 1, 20, 12, tzinfo=UTC)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+class AvailableMonthsCacheTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(self.engine, expire_on_commit=False)
+        with self.Session() as session:
+            session.add_all(
+                [
+                    Show(
+                        id='a', month=1, year=2024, seats=5, is_deleted=False
+                    ),
+                    # нет мест — месяц недоступен
+                    Show(
+                        id='b', month=2, year=2024, seats=0, is_deleted=False
+                    ),
+                    Show(
+                        id='c', month=3, year=2024, seats=3, is_deleted=False
+                    ),
+                    # вне окна из трёх месяцев
+                    Show(
+                        id='d', month=4, year=2024, seats=3, is_deleted=False
+                    ),
+                ]
+            )
+            session.commit()
+
+        self.queries = 0
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        user_operations.invalidate_show_caches()
+
+        patches = [
+            mock.patch.object(user_operations, 'datetime', FrozenDatetime),
+            mock.patch.object(
+                user_operations,
+                'relativedelta',
+                lambda months: timedelta(days=31 * months),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def asyncTearDown(self):
+        user_operations.invalidate_show_caches()
+        self.engine.dispose()
+
+    def _count(self, *args):
+        self.queries += 1
+
+    async def months(self):
+        async with FakeAsyncSession(self.Session()) as session:
+            return await user_operations.get_available_months(session)
+
+    async def test_single_grouped_query(self):
+        months = await self.months()
+        self.assertEqual(
+            [(m, y) for m, _name, y in months], [(1, 2024), (3, 2024)]
+        )
+        self.assertEqual(self.queries, 1)
+
+    async def test_cached_until_invalidated(self):
+        first = await self.months()
+        for _ in range(5):
+            self.assertEqual(await self.months(), first)
+        self.assertEqual(self.queries, 1)
+
+        with self.Session() as session:
+            session.get(Show, 'b').seats = 7
+            session.commit()
+        self.assertEqual(await self.months(), first)
+
+        user_operations.invalidate_show_caches()
+        self.assertEqual(len(await self.months()), 3)
+
+    async def test_snapshoter_commit_invalidates(self):
+        await self.months()
+        service = ShowUpdateService(
+            self.Session, DummyProfticket({'x': make_event(4)}), DummyBot()
+        )
+        async with FakeAsyncSession(self.Session()) as session:
+            self.assertTrue(await service._update_month_data(session, 2, 2024))
+
+        months = await self.months()
+        self.assertEqual(
+            [(m, y) for m, _name, y in months],
+            [(1, 2024), (2, 2024), (3, 2024)],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import math
+import unittest
+from datetime import UTC, datetime
+
+import numpy as np
+
+from services.profticket import analytics
+from services.profticket.batch_fits import (
+    batch_predict_sold_out,
+    batch_sales_rates,
+)
+from services.profticket.history_store import HistoryStore
+
+NOW = 1_760_000_000
+# Допуск сравнения со скоростью из analytics.series_sales_rate: пакетный
+# МНК и np.polyfit расходятся в последних знаках, а на ряду без продаж
+# np.polyfit даёт шум порядка 1e-18 билетов/с вместо нуля
+RATE_RTOL = 1e-9
+RATE_ATOL = 1e-12
+
+
+def make_store(series: dict[str, tuple[list[int], list[int]]]):
+    offsets = [0]
+    for timestamps, _ in series.values():
+        offsets.append(offsets[-1] + len(timestamps))
+    return HistoryStore(
+        list(series),
+        np.asarray(offsets, dtype=np.int64),
+        np.asarray(
+            [t for timestamps, _ in series.values() for t in timestamps],
+            dtype=np.int64,
+        ),
+        np.asarray(
+            [s for _, seats in series.values() for s in seats],
+            dtype=np.int32,
+        ),
+    )
+
+
+class BatchFitsTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        series = {}
+        for i in range(300):
+            size = int(rng.integers(0, 120))
+            # Шаги от нуля (совпадающие timestamp) до нескольких часов
+            steps = rng.choice([0, 60, 300, 600, 900, 1800, 7200], size=size)
+            timestamps = (
+                NOW - int(rng.integers(0, 3 * 86400)) - np.cumsum(steps)[::-1]
+            )
+            sales = rng.choice([-2, -1, 0, 0, 1, 2, 5], size=size)
+            seats = np.clip(300 - np.cumsum(sales), 0, None)
+            series[f'e{i}'] = (timestamps.tolist(), seats.tolist())
+        self.store = make_store(series)
+        self.event_ids = list(series) + ['missing']
+
+    def test_sales_rates_match_per_show(self):
+        rates, intervals = batch_sales_rates(self.store, self.event_ids)
+        fitted = 0
+        for event_id, rate, count in zip(
+            self.event_ids, rates, intervals, strict=True
+        ):
+            timestamps, seats = self.store.series(event_id)
+            expected = analytics.series_sales_rate(timestamps, seats)
+            self.assertEqual(
+                count, analytics.series_valid_intervals(timestamps)
+            )
+            self.assertRateMatches(rate, expected, event_id)
+            fitted += expected is not None
+        self.assertGreater(fitted, 100)
+
+    def assertRateMatches(self, rate, expected, event_id):
+        # nan и None — «скорости нет», то есть ноль
+        rate = 0.0 if math.isnan(rate) else rate
+        expected = expected or 0.0
+        self.assertAlmostEqual(
+            rate,
+            expected,
+            delta=RATE_RTOL * abs(expected) + RATE_ATOL,
+            msg=event_id,
+        )
+
+    def test_clip_boundary_matches_per_show(self):
+        # Редкие продажи по 1-2 билета: остатки часто попадают ровно на
+        # порог 3*MAD, и отбор точек решает округление
+        rng = np.random.default_rng(0)
+        series = {}
+        for i in range(300):
+            size = int(rng.integers(7, 80))
+            timestamps = NOW - np.cumsum(rng.choice([900, 1800], size))
+            sales = rng.choice([0, 0, 0, 0, 0, 1, 2], size=size)
+            seats = 300 - np.cumsum(sales)
+            series[f'e{i}'] = (timestamps[::-1].tolist(), seats.tolist())
+        store = make_store(series)
+        rates, _ = batch_sales_rates(store, list(series))
+        for event_id, rate in zip(series, rates, strict=True):
+            expected = analytics.series_sales_rate(*store.series(event_id))
+            self.assertRateMatches(rate, expected, event_id)
+
+    def test_sold_out_matches_per_show(self):
+        show_timestamps = [
+            NOW + 86400 * (i % 40) if i % 9 else None
+            for i in range(len(self.event_ids))
+        ]
+        predicted = 0
+        for now in (NOW, NOW + 5 * 86400):
+            predictions = batch_predict_sold_out(
+                self.store, self.event_ids, show_timestamps, now
+            )
+            for event_id, show_ts, prediction in zip(
+                self.event_ids, show_timestamps, predictions, strict=True
+            ):
+                timestamps, seats = self.store.series(event_id)
+                show_dt = (
+                    datetime.fromtimestamp(show_ts, UTC) if show_ts else None
+                )
+                expected = analytics.series_predict_sold_out(
+                    timestamps, seats, show_dt, now
+                )
+                if expected is None:
+                    self.assertIsNone(prediction, event_id)
+                else:
+                    predicted += 1
+                    # int() от корня может разойтись на секунду
+                    self.assertAlmostEqual(prediction, expected, delta=1)
+        self.assertGreater(predicted, 50)
+
+    def test_linear_series(self):
+        # Ровно 3 места за 30 минут: парабола вырождается в прямую
+        timestamps = [NOW - 1800 * k for k in range(10, 0, -1)]
+        seats = [30 + 3 * k for k in range(10, 0, -1)]
+        store = make_store({'e1': (timestamps, seats)})
+        expected = NOW - 1800 + 11 * 1800
+        self.assertEqual(
+            batch_predict_sold_out(store, ['e1'], [None], NOW), [expected]
+        )
+        self.assertEqual(
+            analytics.series_predict_sold_out(*store.series('e1'), None, NOW),
+            expected,
+        )
+        rates, _ = batch_sales_rates(store, ['e1'])
+        self.assertAlmostEqual(rates[0], 3 / 1800)
+
+    def test_constant_series_has_no_rate(self):
+        timestamps = [NOW - 900 * k for k in range(20, 0, -1)]
+        store = make_store({'e1': (timestamps, [50] * 20)})
+        rates, intervals = batch_sales_rates(store, ['e1'])
+        self.assertTrue(math.isnan(rates[0]))
+        self.assertEqual(intervals[0], 19)
+        self.assertAlmostEqual(
+            analytics.series_sales_rate(*store.series('e1')) or 0.0,
+            0.0,
+            delta=RATE_ATOL,
+        )
+
+    def test_empty_store(self):
+        store = HistoryStore.from_rows([])
+        rates, intervals = batch_sales_rates(store, ['e1'])
+        self.assertTrue(math.isnan(rates[0]))
+        self.assertEqual(intervals[0], 0)
+        self.assertEqual(
+            batch_predict_sold_out(store, ['e1'], [None], NOW), [None]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,299 @@
+import unittest
+from datetime import UTC, datetime
+from unittest import mock
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from services.profticket import analytics, history_maintenance
+from telegram.db import Base
+from telegram.db.models import (
+    Show,
+    ShowSeatHistory,
+    ShowSeatHistoryDaily,
+    SnapshotRun,
+)
+from telegram.db.report_queries import get_show_sales_totals
+from tests.test_seat_history import (
+    DummyBot,
+    DummyProfticket,
+    FakeAsyncSession,
+    ShowUpdateService,
+    profticket_snapshoter,
+)
+from tests.test_show_stats import show_stats_rows
+
+DAY = 86400
+HOUR = 3600
+CUTOFF = int(datetime(2024, 3, 1, tzinfo=UTC).timestamp())
+
+# (секунды от CUTOFF, места): возвраты внутри суток и между сутками
+SERIES = {
+    'e1': [
+        (-3 * DAY, 100),
+        (-3 * DAY + HOUR, 90),
+        (-3 * DAY + 2 * HOUR, 95),
+        (-2 * DAY, 99),
+        (-2 * DAY + HOUR, 80),
+        (-HOUR, 70),
+        (HOUR, 75),
+        (2 * HOUR, 60),
+    ],
+    'e2': [
+        (-DAY, 50),
+        (-DAY + HOUR, 40),
+        (DAY, 45),
+    ],
+    'e3': [(HOUR, 30), (2 * HOUR, 20)],
+}
+
+
+class SeatHistoryRollupTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(self.engine, expire_on_commit=False)
+        with self.Session() as session:
+            session.add_all(
+                Show(
+                    id=event_id,
+                    show_id=i,
+                    show_name=event_id,
+                    month=3,
+                    year=2024,
+                )
+                for i, event_id in enumerate(SERIES)
+            )
+            session.flush()
+            session.add_all(
+                ShowSeatHistory(
+                    show_id=event_id, timestamp=CUTOFF + offset, seats=seats
+                )
+                for event_id, series in SERIES.items()
+                for offset, seats in series
+            )
+            session.flush()
+            session.add_all(
+                show_stats_rows(session.scalars(select(ShowSeatHistory)))
+            )
+            session.add_all(
+                SnapshotRun(month=3, year=2024, timestamp=CUTOFF + offset)
+                for offset in (-DAY, HOUR)
+            )
+            session.commit()
+
+    async def asyncTearDown(self):
+        self.engine.dispose()
+
+    async def totals(self):
+        async with FakeAsyncSession(self.Session()) as session:
+            rows = await get_show_sales_totals(session, 3, 2024)
+        return [tuple(row) for row in rows]
+
+    async def rollup(self):
+        async with FakeAsyncSession(self.Session()) as session:
+            rows = await history_maintenance.rollup_seat_history(
+                session, CUTOFF
+            )
+            await session.commit()
+        return rows
+
+    async def test_rollup_keeps_sales_totals_exact(self):
+        before = await self.totals()
+        self.assertEqual(len(before), len(SERIES))
+        self.assertEqual(await self.rollup(), 4)
+        self.assertEqual(await self.totals(), before)
+
+    async def test_rollup_moves_old_rows_to_daily_table(self):
+        await self.rollup()
+        with self.Session() as session:
+            oldest = session.scalar(
+                select(func.min(ShowSeatHistory.timestamp))
+            )
+            runs = session.scalars(select(SnapshotRun.timestamp)).all()
+            first_day = session.get(
+                ShowSeatHistoryDaily, ('e1', CUTOFF - 3 * DAY)
+            )
+        self.assertGreaterEqual(oldest, CUTOFF)
+        self.assertEqual(runs, [CUTOFF + HOUR])
+        self.assertEqual(
+            (
+                first_day.first_seats,
+                first_day.last_seats,
+                first_day.gross,
+                first_day.returned,
+                first_day.snapshots,
+            ),
+            (100, 95, 10, 5, 3),
+        )
+
+    async def test_rollup_points_keep_day_boundaries(self):
+        await self.rollup()
+        with self.Session() as session:
+            daily = session.scalars(
+                select(ShowSeatHistoryDaily).where(
+                    ShowSeatHistoryDaily.show_id == 'e1'
+                )
+            ).all()
+        points = sorted(
+            (p.timestamp, p.seats) for p in analytics.rollup_points(daily)
+        )
+        self.assertEqual(
+            points,
+            [
+                (CUTOFF - 3 * DAY, 100),
+                (CUTOFF - 3 * DAY + 2 * HOUR, 95),
+                (CUTOFF - 2 * DAY, 99),
+                (CUTOFF - 2 * DAY + HOUR, 80),
+                (CUTOFF - HOUR, 70),
+            ],
+        )
+
+    async def test_maintain_uses_retention_months(self):
+        now = datetime(2024, 9, 15, 12, tzinfo=UTC)
+        with (
+            mock.patch.object(
+                history_maintenance, 'rollup_seat_history', return_value=0
+            ) as rollup,
+            mock.patch.object(
+                history_maintenance.settings,
+                'SEAT_HISTORY_RETENTION_MONTHS',
+                6,
+            ),
+        ):
+            async with FakeAsyncSession(self.Session()) as session:
+                await history_maintenance.maintain_seat_history(session, now)
+        rollup.assert_awaited_once_with(mock.ANY, CUTOFF)
+
+    def test_month_start(self):
+        moment = datetime(2024, 1, 31, 23, tzinfo=UTC)
+        self.assertEqual(
+            history_maintenance.month_start(moment, -2),
+            datetime(2023, 11, 1, tzinfo=UTC),
+        )
+        self.assertEqual(
+            history_maintenance.month_start(moment, 12),
+            datetime(2025, 1, 1, tzinfo=UTC),
+        )
+
+
+class Result:
+    def __init__(self, value=None, rows=()):
+        self.value = value
+        self.rows = rows
+
+    def scalar(self):
+        return self.value
+
+    def all(self):
+        return list(self.rows)
+
+
+class PartitionedSession:
+    """Записывает SQL и отвечает как секционированный Postgres"""
+
+    def __init__(self, partitions, stranded):
+        self.partitions = partitions
+        self.stranded = stranded
+        self.statements = []
+
+    async def execute(self, statement):
+        sql = str(statement)
+        self.statements.append(sql)
+        if 'pg_partitioned_table' in sql:
+            return Result(1)
+        if 'pg_inherits' in sql:
+            return Result(rows=self.partitions)
+        if sql.startswith('SELECT count(*)'):
+            start = int(sql.split('>= ')[1].split(' ')[0])
+            return Result(self.stranded.get(start, 0))
+        return Result()
+
+    def get_bind(self):
+        bind = mock.Mock()
+        bind.dialect.name = 'postgresql'
+        return bind
+
+
+class EnsurePartitionsTestCase(unittest.IsolatedAsyncioTestCase):
+    async def ensure(self, stranded):
+        session = PartitionedSession(
+            [
+                ('show_seat_history_default', 'DEFAULT'),
+                (
+                    'show_seat_history_p202409',
+                    'FOR VALUES FROM (1725148800) TO (1727740800)',
+                ),
+            ],
+            stranded,
+        )
+        await history_maintenance.ensure_partitions(
+            session, datetime(2024, 9, 15, tzinfo=UTC)
+        )
+        return [
+            sql for sql in session.statements if not sql.startswith('SELECT')
+        ]
+
+    async def test_missing_partitions_are_created(self):
+        statements = await self.ensure({})
+        self.assertEqual(
+            statements,
+            [
+                'CREATE TABLE IF NOT EXISTS show_seat_history_p202410 '
+                'PARTITION OF show_seat_history FOR VALUES '
+                'FROM (1727740800) TO (1730419200)',
+                'CREATE TABLE IF NOT EXISTS show_seat_history_p202411 '
+                'PARTITION OF show_seat_history FOR VALUES '
+                'FROM (1730419200) TO (1733011200)',
+            ],
+        )
+
+    async def test_rows_in_default_partition_are_moved(self):
+        # После простоя строки октября уже лежат в секции DEFAULT
+        statements = await self.ensure({1727740800: 12})
+        in_range = '"timestamp" >= 1727740800 AND "timestamp" < 1730419200'
+        self.assertEqual(
+            statements[:5],
+            [
+                'ALTER TABLE show_seat_history '
+                'DETACH PARTITION show_seat_history_default',
+                'CREATE TABLE show_seat_history_p202410 '
+                'PARTITION OF show_seat_history '
+                'FOR VALUES FROM (1727740800) TO (1730419200)',
+                'INSERT INTO show_seat_history '
+                '(id, show_id, "timestamp", seats) '
+                'SELECT id, show_id, "timestamp", seats '
+                f'FROM show_seat_history_default WHERE {in_range}',
+                f'DELETE FROM show_seat_history_default WHERE {in_range}',
+                'ALTER TABLE show_seat_history '
+                'ATTACH PARTITION show_seat_history_default DEFAULT',
+            ],
+        )
+        self.assertTrue(
+            statements[5].startswith(
+                'CREATE TABLE IF NOT EXISTS show_seat_history_p202411 '
+            )
+        )
+
+
+class MaintenanceFailureTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_failed_maintenance_is_logged_and_not_retried(self):
+        service = ShowUpdateService(
+            mock.MagicMock(), DummyProfticket({}), DummyBot()
+        )
+        failing = mock.AsyncMock(side_effect=RuntimeError('partition'))
+        with (
+            mock.patch.object(
+                profticket_snapshoter, 'maintain_seat_history', failing
+            ),
+            self.assertLogs(profticket_snapshoter.logger, 'ERROR'),
+        ):
+            await service._maintain_history()
+            # Следующая попытка — только через полный интервал
+            await service._maintain_history()
+        self.assertEqual(failing.await_count, 1)
+        self.assertGreater(service.history_maintained_at, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
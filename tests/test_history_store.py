@@ -0,0 +1,157 @@
+import random
+import unittest
+
+import numpy as np
+
+from services.profticket import analytics
+from services.profticket.history_store import HistoryStore, series_from_rows
+from telegram.db.models import Show, ShowSeatHistory
+
+
+def reference_sales(rows):
+    """Построчный подсчёт продаж и возвратов, как до колоночной истории"""
+    rows = sorted(rows, key=lambda r: r.timestamp)
+    sold = returned = 0
+    for prev, curr in zip(rows, rows[1:], strict=False):
+        diff = prev.seats - curr.seats
+        if diff > 0:
+            sold += diff
+        else:
+            returned -= diff
+    return sold, returned
+
+
+def reference_intervals(rows, lookback_hours=24, min_dt=900):
+    rows = sorted(rows, key=lambda r: r.timestamp)
+    cutoff = rows[-1].timestamp - lookback_hours * 3600
+    recent = [r for r in rows if r.timestamp >= cutoff]
+    count = 0
+    last = recent[0]
+    for rec in recent[1:]:
+        if rec.timestamp - last.timestamp >= min_dt:
+            count += 1
+            last = rec
+    return count
+
+
+class HistoryStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(11)
+        self.histories = []
+        for i in range(30):
+            seats = rnd.randint(10, 200)
+            ts = 1_700_000_000 + rnd.randint(0, 5) * 3600
+            for _ in range(rnd.randint(0, 40)):
+                self.histories.append(
+                    ShowSeatHistory(show_id=f'e{i}', timestamp=ts, seats=seats)
+                )
+                # Нулевой шаг даёт снимки с одинаковым timestamp
+                ts += rnd.choice([0, 300, 900, 1800, 3600])
+                seats = max(0, seats - rnd.choice([-2, -1, 0, 1, 2, 5]))
+        rnd.shuffle(self.histories)
+        self.store = HistoryStore.from_rows(self.histories)
+        self.buckets = {}
+        for h in self.histories:
+            self.buckets.setdefault(h.show_id, []).append(h)
+
+    def test_layout(self):
+        self.assertEqual(len(self.store), len(self.buckets))
+        self.assertEqual(self.store.offsets[-1], len(self.histories))
+        for event_id, rows in self.buckets.items():
+            timestamps, seats = self.store.series(event_id)
+            ordered = sorted(rows, key=lambda r: r.timestamp)
+            self.assertEqual(
+                timestamps.tolist(), [r.timestamp for r in ordered]
+            )
+            # Снимки с одинаковым timestamp сохраняют исходный порядок
+            self.assertEqual(seats.tolist(), [r.seats for r in ordered])
+
+    def test_series_from_rows_matches_store(self):
+        for event_id, rows in self.buckets.items():
+            timestamps, seats = series_from_rows(rows)
+            expected_ts, expected_seats = self.store.series(event_id)
+            np.testing.assert_array_equal(timestamps, expected_ts)
+            np.testing.assert_array_equal(seats, expected_seats)
+
+    def test_sales_and_returns_match_reference(self):
+        gross, returned = self.store.sales_and_returns()
+        for i, event_id in enumerate(self.store.event_ids):
+            expected = reference_sales(self.buckets[event_id])
+            self.assertEqual((gross[i], returned[i]), expected)
+            self.assertEqual(
+                analytics.get_net_sales_and_returns(self.buckets[event_id]),
+                expected,
+            )
+
+    def test_valid_intervals_match_reference(self):
+        for rows in self.buckets.values():
+            if len(rows) < 2:
+                continue
+            self.assertEqual(
+                analytics._count_valid_intervals(rows),
+                reference_intervals(rows),
+            )
+
+    def test_first_timestamps(self):
+        first = dict(
+            zip(
+                self.store.event_ids,
+                self.store.first_timestamps().tolist(),
+                strict=True,
+            )
+        )
+        for event_id, rows in self.buckets.items():
+            self.assertEqual(first[event_id], min(r.timestamp for r in rows))
+
+    def test_empty_store(self):
+        store = HistoryStore.from_rows([])
+        self.assertEqual(len(store), 0)
+        self.assertNotIn('e1', store)
+        gross, returned = store.sales_and_returns()
+        self.assertEqual(len(gross), 0)
+        self.assertEqual(len(returned), 0)
+        self.assertEqual(len(store.series('e1')[0]), 0)
+        self.assertEqual(
+            analytics.top_shows_by_sales_detailed(
+                [Show(id='e1', show_name='Alpha', month=1, year=2024)], store
+            ),
+            [],
+        )
+
+    def test_reports_accept_store_and_list(self):
+        shows = [
+            Show(
+                id=f'e{i}',
+                show_id=i % 4 or None,
+                show_name=f'Show {i % 4}',
+                date=f'2024-01-{i % 28 + 1:02d}T19:00:00',
+                month=1 + i % 2,
+                year=2024,
+                actors='["Иван", "Анна"]',
+                is_deleted=i % 7 == 0,
+            )
+            for i in range(30)
+        ]
+        reports = [
+            analytics.top_shows_by_sales_detailed,
+            analytics.top_shows_by_returns,
+            analytics.top_shows_by_return_rate,
+            analytics.top_artists_by_sales,
+            analytics.top_shows_by_current_sales_speed,
+            analytics.calendar_pace_dashboard,
+        ]
+        for report in reports:
+            for month, year in [(None, None), (1, 2024)]:
+                with self.subTest(report=report.__name__, month=month):
+                    self.assertEqual(
+                        report(shows, self.store, month, year, n=10),
+                        report(shows, self.histories, month, year, n=10),
+                    )
+        self.assertEqual(
+            analytics.show_financial_summary(1, shows, self.store),
+            analytics.show_financial_summary(1, shows, self.histories),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from datetime import UTC, timedelta
+from unittest import mock
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from telegram.db import Base, user_operations
+from telegram.db.models import Show, ShowSeatHistory
+from tests.test_seat_history import FakeAsyncSession, ShowUpdateService
+
+
+class IndexUsageTestCase(unittest.IsolatedAsyncioTestCase):
+    """EXPLAIN QUERY PLAN горячих запросов должен использовать индексы."""
+
+    async def asyncSetUp(self):
+        self.engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(self.engine, expire_on_commit=False)
+        with self.Session() as session:
+            for i in range(200):
+                session.add(
+                    Show(
+                        id=f'e{i}',
+                        show_id=i % 20,
+                        show_name=f'Show {i % 20}',
+                        date='01 января 12:00',
+                        actors='[]',
+                        seats=i % 7,
+                        month=i % 12 + 1,
+                        year=2024 + i % 3,
+                        updated_at=1000 + i,
+                        is_deleted=i % 5 == 0,
+                    )
+                )
+            session.flush()
+            session.add_all(
+                ShowSeatHistory(
+                    show_id=f'e{i % 200}', timestamp=100 * i, seats=i % 50
+                )
+                for i in range(2000)
+            )
+            session.commit()
+
+        user_operations.invalidate_show_caches()
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._capture)
+
+    async def asyncTearDown(self):
+        self.engine.dispose()
+
+    def _capture(self, conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.statements.append((statement, parameters))
+
+    def plans(self):
+        """Планы всех перехваченных SELECT-запросов."""
+        event.remove(self.engine, 'before_cursor_execute', self._capture)
+        with self.engine.connect() as conn:
+            return [
+                ' '.join(
+                    row[-1]
+                    for row in conn.exec_driver_sql(
+                        f'EXPLAIN QUERY PLAN {statement}', parameters
+                    )
+                )
+                for statement, parameters in self.statements
+            ]
+
+    def assertUsesIndex(self, index_name):
+        plans = self.plans()
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertIn(index_name, plan)
+            self.assertNotIn('SCAN shows', plan)
+
+    async def test_available_months_uses_partial_index(self):
+        with (
+            mock.patch.object(user_operations, 'timezone', UTC),
+            mock.patch.object(
+                user_operations,
+                'relativedelta',
+                lambda months: timedelta(days=31 * months),
+            ),
+        ):
+            async with FakeAsyncSession(self.Session()) as session:
+                await user_operations.get_available_months(session)
+        self.assertUsesIndex('ix_shows_active_year_month')
+
+    async def test_shows_from_db_uses_partial_index(self):
+        async with FakeAsyncSession(self.Session()) as session:
+            await user_operations.get_shows_from_db(session, 3, 2024)
+        plans = self.plans()
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertIn('ix_shows_active_year_month_starts_at', plan)
+            # Порядок афиши даёт индекс, без сортировки во временном дереве
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    async def test_data_freshness_uses_updated_at_index(self):
+        service = ShowUpdateService(self.Session, None, None)
+        async with FakeAsyncSession(self.Session()) as session:
+            await service._check_data_freshness(session, 3, 2024)
+        self.assertUsesIndex('ix_shows_year_month_updated_at')
+
+    async def test_seat_history_uses_composite_index(self):
+        async with FakeAsyncSession(self.Session()) as session:
+            await session.execute(
+                select(
+                    ShowSeatHistory.show_id,
+                    func.max(ShowSeatHistory.timestamp),
+                )
+                .where(ShowSeatHistory.show_id.in_(['e1', 'e2']))
+                .group_by(ShowSeatHistory.show_id)
+            )
+            await session.execute(
+                select(ShowSeatHistory)
+                .where(ShowSeatHistory.show_id == 'e1')
+                .order_by(ShowSeatHistory.timestamp)
+            )
+        plans = self.plans()
+        self.assertEqual(len(plans), 2)
+        for plan in plans:
+            self.assertIn('ix_show_seat_history_show_id_timestamp', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import unittest
+
+from services.profticket.mock_upstream import MockProfticketUpstream
+from services.profticket.profticket_api import ProfticketsInfo
+
+
+class MockUpstreamTestCase(unittest.TestCase):
+    def setUp(self):
+        self.upstream = MockProfticketUpstream(events=25, shows=4, per_page=10)
+        self.api = ProfticketsInfo('1')
+
+    def get(self, url, **headers):
+        response = self.upstream.respond(url, headers)
+        body = json.loads(response.body) if response.body else None
+        return response, body
+
+    def test_listing_is_paginated_until_empty_page(self):
+        counts = []
+        for page in range(1, 5):
+            _, body = self.get(self.api._create_url(page, 5, 2025))
+            counts.append(len(body['response']['items']))
+        self.assertEqual(counts, [10, 10, 5, 0])
+        _, body = self.get(self.api._create_url(1, 5, 2025))
+        event = body['response']['items'][0]['events'][0]
+        self.assertEqual(event['date_formatted'], '1 мая 2025, чт, 19:00')
+        self.assertEqual(self.upstream.requests['listing'], 5)
+
+    def test_etag_revalidation_and_sales(self):
+        url = f'{ProfticketsInfo.EVENT_DATA_URL}1/'
+        response, body = self.get(url)
+        self.assertEqual(body['events']['e0'], {'seats': 200})
+        etag = response.headers['ETag']
+        response, _ = self.get(url, **{'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.upstream.sell(25)
+        response, _ = self.get(url, **{'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.upstream.requests['not_modified'], 1)
+
+    def test_show_details_and_throttling(self):
+        url = f'{ProfticketsInfo.SHOW_URL}?company_id=1&show_id=3'
+        _, body = self.get(url)
+        self.assertIn('Актёр 3', body['response']['show_detail']['actors'])
+
+        self.upstream.throttle_rate = 1
+        self.upstream.retry_after = 2
+        response, _ = self.get(url)
+        self.assertEqual(
+            (response.status_code, response.headers['Retry-After']),
+            (429, '2'),
+        )
+        self.assertEqual(self.upstream.requests['throttled'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import json
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from services.profticket.analytics import localize_show_date
+from telegram.db import Base, user_operations
+from telegram.db.models import Show
+from telegram.tg_utils import split_message_by_separator
+from tests.test_seat_history import (
+    DummyBot,
+    DummyProfticket,
+    FakeAsyncSession,
+    ShowUpdateService,
+    make_event,
+)
+
+
+def make_show(event_id, date, actors, seats=10, **kw):
+    values = {
+        'id': event_id,
+        'show_name': f'Show {event_id}',
+        'date': date,
+        'starts_at': localize_show_date(date),
+        'actors': json.dumps(actors),
+        'seats': seats,
+        'previous_seats': seats,
+        'buy_link': f'https://example.com/{event_id}',
+        'month': 3,
+        'year': 2024,
+        'updated_at': 1709251200,
+        'is_deleted': False,
+    }
+    values.update(kw)
+    return Show(**values)
+
+
+class MonthListingCacheTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(self.engine, expire_on_commit=False)
+        with self.Session() as session:
+            session.add_all(
+                [
+                    make_show(
+                        'b', '12 марта 2024, вторник, 19:00', ['Иван Петров']
+                    ),
+                    make_show(
+                        'a', '2 марта 2024, суббота, 12:00', ['Анна Ли']
+                    ),
+                    make_show(
+                        'c',
+                        '20 марта 2024, среда, 19:00',
+                        [' Иван Петров ', ''],
+                        seats=0,
+                    ),
+                    make_show(
+                        'd',
+                        '1 марта 2024, пятница, 19:00',
+                        [],
+                        is_deleted=True,
+                    ),
+                ]
+            )
+            session.commit()
+
+        self.queries = 0
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        user_operations.invalidate_show_caches()
+
+    async def asyncTearDown(self):
+        user_operations.invalidate_show_caches()
+        self.engine.dispose()
+
+    def _count(self, *args):
+        self.queries += 1
+
+    async def shows(self, **kw):
+        async with FakeAsyncSession(self.Session()) as session:
+            return await user_operations.get_shows_from_db(
+                session, 3, 2024, **kw
+            )
+
+    async def chunks(self, **kw):
+        async with FakeAsyncSession(self.Session()) as session:
+            return await user_operations.get_shows_chunks(
+                session, 3, 2024, **kw
+            )
+
+    async def test_listing_sorted_with_footer(self):
+        text = await self.shows()
+        self.assertLess(text.index('Show a'), text.index('Show b'))
+        self.assertLess(text.index('Show b'), text.index('Show c'))
+        self.assertNotIn('Show d', text)
+        self.assertIn('SOLD OUT', text)
+        self.assertIn('Всего 3 спектаклей', text)
+        self.assertEqual(await self.chunks(), split_message_by_separator(text))
+
+    async def test_listing_follows_starts_at(self):
+        with self.Session() as session:
+            session.add(
+                make_show('a0', '31 марта 2024, воскресенье, 19:00', [])
+            )
+            session.commit()
+        text = await self.shows()
+        # порядок задаёт starts_at, а не id события
+        self.assertLess(text.index('Show c'), text.index('Show a0'))
+        self.assertLess(text.index('Show a\n'), text.index('Show b'))
+
+    async def test_repeated_requests_are_served_from_cache(self):
+        first = await self.chunks()
+        for _ in range(5):
+            self.assertEqual(await self.chunks(), first)
+            await self.chunks(actor_filter='иван петров')
+        self.assertEqual(self.queries, 1)
+
+    async def test_actor_filter_and_descending(self):
+        text = await self.shows(actor_filter='иван петров')
+        self.assertNotIn('Show a', text)
+        self.assertLess(text.index('Show b'), text.index('Show c'))
+        self.assertIn('Всего 2 спектаклей', text)
+
+        text = await self.shows(descending=True)
+        self.assertLess(text.index('Show c'), text.index('Show a'))
+
+        self.assertEqual(
+            await self.shows(actor_filter='никто'),
+            'Нет спектаклей в этом месяце',
+        )
+
+    async def test_snapshoter_commit_rerenders_month(self):
+        await self.chunks()
+        service = ShowUpdateService(
+            self.Session, DummyProfticket({'x': make_event(4)}), DummyBot()
+        )
+        async with FakeAsyncSession(self.Session()) as session:
+            self.assertTrue(await service._update_month_data(session, 3, 2024))
+
+        queries = self.queries
+        text = await self.shows()
+        self.assertEqual(self.queries, queries)
+        self.assertIn('Всего 1 спектаклей', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from services.profticket import profticket_api
+from services.profticket.profticket_api import (
+    ProfticketAPIError,
+    ProfticketsInfo,
+)
+
+
+class FakeResponse:
+    parsed = 0
+    http_version = 'HTTP/1.1'
+
+    def __init__(self, payload, status_code=200, headers=None):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    @property
+    def content(self):
+        return json.dumps(self.payload).encode()
+
+    def json(self):
+        FakeResponse.parsed += 1
+        return self.payload
+
+    def raise_for_status(self):
+        pass
+
+
+def listing_page(page_num, per_page=2):
+    return {
+        'response': {
+            'items': [
+                {'events': [], 'page': page_num, 'n': i}
+                for i in range(per_page)
+            ]
+        }
+    }
+
+
+class LoadDataTestCase(unittest.IsolatedAsyncioTestCase):
+    def make_api(self, pages, delay=0.0, fail_on=None, **kwargs):
+        api = ProfticketsInfo('42', **kwargs)
+        api.set_date(5, 2024)
+        api.requested = []
+        api.in_flight = api.max_in_flight = 0
+
+        async def fake_request(url, headers=None):
+            page_num = int(url.split('&page=')[1].split('&')[0])
+            api.requested.append(page_num)
+            api.in_flight += 1
+            api.max_in_flight = max(api.max_in_flight, api.in_flight)
+            try:
+                await asyncio.sleep(delay)
+                if fail_on is not None and page_num == fail_on:
+                    raise ProfticketAPIError('boom')
+                if page_num > pages:
+                    return FakeResponse({'response': {'items': []}})
+                return FakeResponse(listing_page(page_num))
+            finally:
+                api.in_flight -= 1
+
+        api._make_request = fake_request
+        return api
+
+    async def test_pages_loaded_in_order(self):
+        api = self.make_api(pages=5, delay=0.01, concurrent_requests=3)
+        items = await api._load_data()
+        self.assertEqual(len(items), 10)
+        self.assertEqual(
+            [item['page'] for item in items],
+            [1, 1, 2, 2, 3, 3, 4, 4, 5, 5],
+        )
+
+    async def test_window_bounds_in_flight_requests(self):
+        api = self.make_api(pages=8, delay=0.01, concurrent_requests=3)
+        await api._load_data()
+        self.assertGreater(api.max_in_flight, 1)
+        self.assertLessEqual(api.max_in_flight, api.page_window)
+        # Не запрашиваем страницы дальше окна после первой пустой
+        self.assertLessEqual(max(api.requested), 9 + api.page_window - 1)
+
+    async def test_partial_data_on_error(self):
+        api = self.make_api(pages=5, fail_on=3, concurrent_requests=2)
+        items = await api._load_data()
+        self.assertEqual([item['page'] for item in items], [1, 1, 2, 2])
+
+    async def test_error_on_first_page_raises(self):
+        api = self.make_api(pages=5, fail_on=1, concurrent_requests=2)
+        with self.assertRaises(ProfticketAPIError):
+            await api._load_data()
+
+    async def test_error_past_last_page_is_ignored(self):
+        api = self.make_api(pages=2, fail_on=4, concurrent_requests=3)
+        items = await api._load_data()
+        self.assertEqual(len(items), 4)
+
+
+class StatelessMonthTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_months_loaded_concurrently_do_not_mix(self):
+        api = ProfticketsInfo('42', concurrent_requests=2)
+        seen = []
+
+        async def fake_request(url, headers=None):
+            date = url.split('&date=')[1].split('&')[0]
+            page_num = int(url.split('&page=')[1].split('&')[0])
+            seen.append(date)
+            await asyncio.sleep(0.01)
+            if page_num > 2:
+                return FakeResponse({'response': {'items': []}})
+            items = [{'date': date, 'page': page_num}]
+            return FakeResponse({'response': {'items': items}})
+
+        api._make_request = fake_request
+        may, june = await asyncio.gather(
+            api._load_data(5, 2024), api._load_data(6, 2024)
+        )
+        self.assertIsNone(api.month)
+        self.assertEqual({item['date'] for item in may}, {'2024.5'})
+        self.assertEqual({item['date'] for item in june}, {'2024.6'})
+        self.assertEqual(set(seen), {'2024.5', '2024.6'})
+
+    def test_create_url_explicit_date_overrides_set_date(self):
+        api = ProfticketsInfo('42')
+        api.set_date(5, 2024)
+        self.assertIn('&date=2025.1&', api._create_url(1, 1, 2025))
+
+
+class UnchangedUpstreamTestCase(unittest.IsolatedAsyncioTestCase):
+    def make_api(self, etags):
+        api = ProfticketsInfo('42')
+        self.requests = []
+        self.seats = 3
+        show = {'actors': ['Иван']}
+
+        async def fake_request(url, headers=None):
+            self.requests.append((url, headers))
+            if 'event/show' in url:
+                detail = {'response': {'show_detail': show}}
+                return FakeResponse(detail)
+            if 'events-data' in url:
+                payload = {'events': {'e1': {'seats': self.seats}}}
+            elif '&page=1&' in url:
+                events = [{'id': 'e1', 'show': {'show_id': 5}}]
+                payload = {'response': {'items': [{'events': events}]}}
+            else:
+                payload = {'response': {'items': []}}
+            if not etags:
+                return FakeResponse(payload)
+            etag = f'"{hash(json.dumps(payload))}"'
+            if headers.get('If-None-Match') == etag:
+                return FakeResponse(None, status_code=304)
+            return FakeResponse(payload, headers={'ETag': etag})
+
+        api._make_request = fake_request
+        return api
+
+    async def collect(self, api, unchanged_since=None):
+        with mock.patch.object(profticket_api.asyncio, 'sleep'):
+            return await api.collect_full_info(
+                5, 2024, unchanged_since=unchanged_since
+            )
+
+    async def test_conditional_requests_skip_unchanged_month(self):
+        api = self.make_api(etags=True)
+        first = await self.collect(api)
+        fingerprint = api.fingerprints[(5, 2024)]
+        self.assertEqual(first['e1']['seats'], 3)
+
+        self.requests.clear()
+        parsed = FakeResponse.parsed
+        self.assertIsNone(await self.collect(api, fingerprint))
+        self.assertTrue(
+            all(
+                headers.get('If-None-Match')
+                for url, headers in self.requests
+                if 'event/show' not in url
+            )
+        )
+        self.assertEqual(FakeResponse.parsed, parsed)
+
+        self.seats = 2
+        second = await self.collect(api, fingerprint)
+        self.assertEqual(second['e1']['seats'], 2)
+        self.assertNotEqual(api.fingerprints[(5, 2024)], fingerprint)
+
+    async def test_identical_bodies_are_not_parsed_again(self):
+        api = self.make_api(etags=False)
+        await self.collect(api)
+        fingerprint = api.fingerprints[(5, 2024)]
+        parsed = FakeResponse.parsed
+        self.assertIsNone(await self.collect(api, fingerprint))
+        self.assertEqual(FakeResponse.parsed, parsed)
+        # Без отпечатка вызывающего результат собирается как обычно
+        result = await self.collect(api)
+        self.assertEqual(result['e1']['actors'], ['Иван'])
+
+    async def test_partial_listing_has_no_fingerprint(self):
+        api = self.make_api(etags=False)
+        make_request = api._make_request
+
+        async def failing_request(url, headers=None):
+            if '&page=2&' in url:
+                raise ProfticketAPIError('boom')
+            return await make_request(url, headers)
+
+        api._make_request = failing_request
+        result = await self.collect(api)
+        self.assertIn('e1', result)
+        self.assertNotIn((5, 2024), api.fingerprints)
+
+
+class PipelinedCollectTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_places_and_details_overlap_pagination(self):
+        api = ProfticketsInfo('42', concurrent_requests=1, page_window=1)
+        log = []
+
+        async def fake_request(url, headers=None):
+            if 'event/show' in url:
+                log.append('details')
+                detail = {'actors': [url.split('show_id=')[1]]}
+                return FakeResponse({'response': {'show_detail': detail}})
+            if 'events-data' in url:
+                log.append('places')
+                await asyncio.sleep(0.02)
+                return FakeResponse({'events': {'e1': {'seats': 4}}})
+            page_num = int(url.split('&page=')[1].split('&')[0])
+            await asyncio.sleep(0.01)
+            log.append(f'page {page_num}')
+            if page_num > 3:
+                return FakeResponse({'response': {'items': []}})
+            events = [{'id': f'e{page_num}', 'show': {'show_id': page_num}}]
+            return FakeResponse({'response': {'items': [{'events': events}]}})
+
+        api._make_request = fake_request
+        result = await api.collect_full_info(5, 2024)
+
+        self.assertEqual(log[0], 'places')
+        self.assertLess(log.index('details'), log.index('page 3'))
+        self.assertEqual(result['e1']['seats'], 4)
+        self.assertEqual(
+            [result[f'e{i}']['actors'] for i in (1, 2, 3)],
+            [['1'], ['2'], ['3']],
+        )
+        self.assertEqual(api.detail_summaries[(5, 2024)].total, 3)
+
+    async def test_listing_failure_cancels_side_fetches(self):
+        api = ProfticketsInfo('42')
+        started = asyncio.Event()
+
+        async def fake_request(url, headers=None):
+            if 'events-data' in url:
+                started.set()
+                await asyncio.sleep(10)
+            await started.wait()
+            raise ProfticketAPIError('boom')
+
+        api._make_request = fake_request
+        with self.assertRaises(ProfticketAPIError):
+            await asyncio.wait_for(api.collect_full_info(5, 2024), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
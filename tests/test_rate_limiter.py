@@ -0,0 +1,149 @@
+import asyncio
+import time
+import unittest
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+from unittest import mock
+
+from services.profticket import profticket_api
+from services.profticket.profticket_api import (
+    ProfticketsInfo,
+    RateLimitError,
+    _parse_retry_after,
+)
+from services.profticket.rate_limiter import AdaptiveLimiter
+from tests.test_profticket_api import FakeResponse
+
+
+class AdaptiveLimiterTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_bucket_paces_requests_after_burst(self):
+        limiter = AdaptiveLimiter(rate=50, burst=2, initial_limit=10)
+        started = time.monotonic()
+        for _ in range(7):
+            ticket = await limiter.acquire()
+            await limiter.release(ticket, AdaptiveLimiter.NEUTRAL)
+        # Два токена сразу, остальные пять — по 20 мс
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(limiter.stats().requests, 7)
+
+    async def test_concurrency_never_exceeds_limit(self):
+        limiter = AdaptiveLimiter(rate=1000, burst=100, initial_limit=2)
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            ticket = await limiter.acquire()
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            await limiter.release(ticket, AdaptiveLimiter.NEUTRAL)
+
+        await asyncio.gather(*(request() for _ in range(10)))
+        self.assertEqual(peak, 2)
+
+    async def test_additive_increase_multiplicative_decrease(self):
+        limiter = AdaptiveLimiter(
+            rate=1000, burst=100, initial_limit=2, max_limit=4
+        )
+        for _ in range(4):
+            ticket = await limiter.acquire()
+            await limiter.release(ticket, AdaptiveLimiter.SUCCESS)
+        self.assertGreater(limiter.limit, 3)
+
+        # Отказы одной волны срезают лимит один раз
+        tickets = [await limiter.acquire() for _ in range(3)]
+        for ticket in tickets:
+            await limiter.release(ticket, AdaptiveLimiter.OVERLOAD)
+        self.assertAlmostEqual(limiter.limit, 3.5 / 2, places=1)
+        self.assertEqual(limiter.stats().backoffs, 1)
+
+        ticket = await limiter.acquire()
+        await limiter.release(ticket, AdaptiveLimiter.OVERLOAD)
+        self.assertEqual(limiter.limit, 1)
+
+    async def test_pause_holds_back_every_caller(self):
+        limiter = AdaptiveLimiter(rate=1000, burst=100, initial_limit=5)
+        await limiter.pause(0.05)
+        started = time.monotonic()
+        tickets = await asyncio.gather(*(limiter.acquire() for _ in range(3)))
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        self.assertEqual(len(tickets), 3)
+        self.assertEqual(limiter.stats().pauses, 1)
+
+
+class RateLimitedRequestTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_429_pauses_the_whole_client(self):
+        api = ProfticketsInfo('42')
+        responses = [
+            FakeResponse(None, status_code=429, headers={'Retry-After': '7'})
+        ]
+
+        class Client:
+            async def get(self, url, headers=None, **kwargs):
+                return responses.pop(0)
+
+        api.client = Client()
+        with self.assertRaises(RateLimitError):
+            await api._make_request('https://example.invalid/')
+        stats = api.limiter_stats()
+        self.assertEqual((stats.pauses, stats.backoffs), (1, 1))
+        self.assertEqual(stats.in_flight, 0)
+        self.assertGreater(api._limiter._resume_at, time.monotonic() + 6)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(_parse_retry_after('3'), 3)
+        self.assertEqual(_parse_retry_after(None), 5)
+        self.assertEqual(_parse_retry_after('soon'), 5)
+        retry_at = datetime.now(UTC) + timedelta(seconds=30)
+        self.assertAlmostEqual(
+            _parse_retry_after(format_datetime(retry_at)), 30, delta=2
+        )
+
+
+class ConnectionStatsTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_trace_events_count_connections(self):
+        api = ProfticketsInfo('42')
+        response = FakeResponse({})
+        response.http_version = 'HTTP/2'
+        seen = []
+
+        class Client:
+            async def get(self, url, headers=None, extensions=None):
+                seen.append(headers)
+                # Первый запрос открывает соединение, остальные его берут
+                if len(seen) == 1:
+                    trace = extensions['trace']
+                    await trace('connection.connect_tcp.complete', {})
+                    await trace('connection.start_tls.complete', {})
+                    await trace('http2.send_request_headers.started', {})
+                return response
+
+        api.client = Client()
+        for _ in range(3):
+            await api._make_request('https://example.invalid/')
+        self.assertEqual(
+            api.connection_stats(),
+            profticket_api.ConnectionStats(
+                requests=3,
+                connections=1,
+                tls_handshakes=1,
+                reused=2,
+                http2_requests=3,
+            ),
+        )
+        # Сессионные заголовки заданы клиенту, а не каждому запросу
+        self.assertEqual(seen, [None] * 3)
+
+    def test_http2_falls_back_without_h2(self):
+        with (
+            mock.patch.object(profticket_api.settings, 'HTTP2', True),
+            mock.patch.object(
+                profticket_api.importlib.util, 'find_spec', return_value=None
+            ),
+            self.assertLogs(profticket_api.logger, 'WARNING'),
+        ):
+            api = ProfticketsInfo('42')
+        self.assertFalse(api.http2)
+
+
+if __name__ == '__main__':
+    unittest.main()
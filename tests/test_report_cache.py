@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+
+from telegram.utils.report_cache import ReportCache
+
+
+class ReportCacheTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = ReportCache(maxsize=2)
+        self.calls = []
+
+    def compute(self, value, delay=0):
+        async def build():
+            self.calls.append(value)
+            await asyncio.sleep(delay)
+            return value
+
+        return build
+
+    async def test_hit_after_miss(self):
+        key = ('sales', 1, 2024)
+        self.assertEqual(
+            await self.cache.get_or_compute(key, self.compute('a')), 'a'
+        )
+        self.assertEqual(
+            await self.cache.get_or_compute(key, self.compute('b')), 'a'
+        )
+        self.assertEqual(self.calls, ['a'])
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 1, 1))
+
+    async def test_lru_eviction(self):
+        await self.cache.get_or_compute('k1', self.compute(1))
+        await self.cache.get_or_compute('k2', self.compute(2))
+        # k1 становится самым свежим, вытесняется k2
+        await self.cache.get_or_compute('k1', self.compute(0))
+        await self.cache.get_or_compute('k3', self.compute(3))
+        self.assertEqual(
+            await self.cache.get_or_compute('k1', self.compute(0)), 1
+        )
+        self.assertEqual(
+            await self.cache.get_or_compute('k2', self.compute(4)), 4
+        )
+        self.assertEqual(self.calls, [1, 2, 3, 4])
+        self.assertEqual(self.cache.stats().evictions, 2)
+
+    async def test_concurrent_requests_share_one_computation(self):
+        results = await asyncio.gather(
+            *(
+                self.cache.get_or_compute('k', self.compute('a', delay=0.01))
+                for _ in range(5)
+            )
+        )
+        self.assertEqual(results, ['a'] * 5)
+        self.assertEqual(self.calls, ['a'])
+        stats = self.cache.stats()
+        self.assertEqual((stats.misses, stats.coalesced), (1, 4))
+
+    async def test_version_bump_invalidates(self):
+        await self.cache.get_or_compute('k', self.compute('old'))
+        self.cache.bump_version()
+        self.assertEqual(
+            await self.cache.get_or_compute('k', self.compute('new')), 'new'
+        )
+        self.assertEqual(self.cache.stats().version, 1)
+
+    async def test_result_computed_before_bump_is_not_stored(self):
+        task = asyncio.create_task(
+            self.cache.get_or_compute('k', self.compute('old', delay=0.01))
+        )
+        await asyncio.sleep(0)
+        self.cache.bump_version()
+        self.assertEqual(await task, 'old')
+        self.assertEqual(self.cache.stats().size, 0)
+        self.assertEqual(
+            await self.cache.get_or_compute('k', self.compute('new')), 'new'
+        )
+
+    async def test_errors_reach_waiters_and_are_not_cached(self):
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError('boom')
+
+        results = await asyncio.gather(
+            self.cache.get_or_compute('k', fail),
+            self.cache.get_or_compute('k', fail),
+            return_exceptions=True,
+        )
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(
+            await self.cache.get_or_compute('k', self.compute('a')), 'a'
+        )
+
+    async def test_waiter_recomputes_when_owner_is_cancelled(self):
+        owner = asyncio.create_task(
+            self.cache.get_or_compute('k', self.compute('owner', delay=1))
+        )
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(
+            self.cache.get_or_compute('k', self.compute('waiter'))
+        )
+        await asyncio.sleep(0)
+        owner.cancel()
+        # Ожидающий не отменён: он считает отчёт сам и получает ответ
+        self.assertEqual(await waiter, 'waiter')
+        with self.assertRaises(asyncio.CancelledError):
+            await owner
+        self.assertEqual(self.calls, ['owner', 'waiter'])
+        self.assertEqual(
+            await self.cache.get_or_compute('k', self.compute('again')),
+            'waiter',
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,290 @@
+import json
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.profticket import analytics
+from services.profticket.report_runner import ShowRow
+from telegram.db import Base
+from telegram.db.models import (
+    ArtistFirstSeen,
+    Show,
+    ShowActor,
+    ShowGroupFirstSeen,
+    ShowSeatHistory,
+    ShowStats,
+)
+from telegram.db.report_queries import (
+    get_artist_first_seen,
+    get_group_first_seen,
+    get_report_months,
+    get_report_shows,
+    get_show_actors,
+    get_show_sales_totals,
+    get_top_shows_by_return_rate,
+    get_top_shows_by_returns,
+    get_top_shows_by_sales,
+    get_top_shows_by_sales_speed,
+)
+from tests.test_seat_history import FakeAsyncSession
+from tests.test_show_stats import show_stats_rows
+
+SEATS = {
+    # 100 -> 90 -> 95 -> 80: gross 25, returned 5
+    'e1': [100, 90, 95, 80],
+    # та же постановка, другой показ
+    'e2': [50, 40, 40, 30],
+    # только возвраты
+    'e3': [20, 25, 30],
+    # одна запись — не участвует в продажах
+    'e4': [60],
+    # прошедший (удалённый) показ
+    'e5': [70, 50, 55],
+    # другой месяц
+    'e6': [200, 150, 160, 100],
+}
+
+
+class ReportQueriesTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(self.engine, expire_on_commit=False)
+
+        self.shows = [
+            Show(id='e1', show_id=1, show_name='Alpha', month=1, year=2024),
+            Show(id='e2', show_id=1, show_name='Alpha', month=1, year=2024),
+            Show(id='e3', show_id=2, show_name='Beta', month=1, year=2024),
+            Show(id='e4', show_id=3, show_name='Gamma', month=1, year=2024),
+            Show(
+                id='e5',
+                show_id=4,
+                show_name='Delta',
+                month=1,
+                year=2024,
+                is_deleted=True,
+            ),
+            Show(id='e6', show_id=5, show_name='Omega', month=2, year=2024),
+        ]
+        casts = {
+            'e1': ['Иван', 'Режиссёр-постановщик Пётр', 'Анна'],
+            'e2': ['Иван', ' Олег '],
+            'e3': ['Анна'],
+            'e5': ['Иван'],
+            'e6': ['Олег'],
+        }
+        for show in self.shows:
+            show.actors = json.dumps(casts.get(show.id, []))
+        self.actors = [
+            ShowActor(show_id=event_id, position=position, name=name)
+            for position, (event_id, name) in enumerate(
+                analytics.show_actor_names(self.shows)
+            )
+        ]
+        self.histories = [
+            ShowSeatHistory(show_id=event_id, timestamp=100 * i, seats=seats)
+            for event_id, series in SEATS.items()
+            for i, seats in enumerate(series, 1)
+        ]
+        with self.Session() as session:
+            session.add_all(self.shows)
+            session.flush()
+            session.add_all(self.histories)
+            session.add_all(self.actors)
+            session.add_all(show_stats_rows(self.histories))
+            session.commit()
+
+    async def asyncTearDown(self):
+        self.engine.dispose()
+
+    async def totals(self, month, year, include_past_shows):
+        async with FakeAsyncSession(self.Session()) as session:
+            return await get_show_sales_totals(
+                session, month, year, include_past_shows
+            )
+
+    async def test_totals_match_python_reports(self):
+        cases = [
+            (1, 2024, False),
+            (2, 2024, False),
+            (None, None, True),
+            (None, None, False),
+        ]
+        reports = [
+            (
+                analytics.top_shows_by_sales_detailed,
+                analytics.top_shows_by_sales_from_totals,
+            ),
+            (
+                analytics.top_shows_by_returns,
+                analytics.top_shows_by_returns_from_totals,
+            ),
+            (
+                analytics.top_shows_by_return_rate,
+                analytics.top_shows_by_return_rate_from_totals,
+            ),
+        ]
+        for month, year, include_past in cases:
+            totals = await self.totals(month, year, include_past)
+            for in_memory, from_totals in reports:
+                with self.subTest(
+                    month=month, report=in_memory.__name__, past=include_past
+                ):
+                    expected = in_memory(
+                        self.shows,
+                        self.histories,
+                        month=month,
+                        year=year,
+                        n=10,
+                        include_past_shows=include_past,
+                    )
+                    self.assertEqual(from_totals(totals, n=10), expected)
+
+    async def test_top_queries_match_python_reports(self):
+        cases = [
+            (1, 2024, False),
+            (2, 2024, False),
+            (None, None, True),
+            (None, None, False),
+        ]
+        reports = [
+            (analytics.top_shows_by_sales_detailed, get_top_shows_by_sales),
+            (analytics.top_shows_by_returns, get_top_shows_by_returns),
+            (
+                analytics.top_shows_by_return_rate,
+                get_top_shows_by_return_rate,
+            ),
+        ]
+        for month, year, include_past in cases:
+            for in_memory, top_query in reports:
+                with self.subTest(
+                    month=month, report=in_memory.__name__, past=include_past
+                ):
+                    expected = in_memory(
+                        self.shows,
+                        self.histories,
+                        month=month,
+                        year=year,
+                        n=10,
+                        include_past_shows=include_past,
+                    )
+                    async with FakeAsyncSession(self.Session()) as session:
+                        rows = await top_query(
+                            session, month, year, include_past, n=10
+                        )
+                    self.assertEqual(len(rows), len(expected))
+                    for row, values in zip(rows, expected, strict=True):
+                        self.assertEqual(row[-1], values[-1])
+                        for got, want in zip(
+                            row[:-1], values[:-1], strict=True
+                        ):
+                            self.assertAlmostEqual(got, want)
+
+        async with FakeAsyncSession(self.Session()) as session:
+            top = await get_top_shows_by_sales(session, 1, 2024, n=1)
+        self.assertEqual(top, [('Alpha', 45, 40, 1)])
+
+    async def test_top_sales_speed_matches_python_report(self):
+        histories = [
+            ShowSeatHistory(
+                show_id=event_id, timestamp=1800 * i, seats=300 - k * i
+            )
+            for k, event_id in enumerate(['e1', 'e2', 'e3', 'e5', 'e6'], 1)
+            for i in range(1, 8 + k)
+        ]
+        with self.Session() as session:
+            session.query(ShowStats).delete()
+            session.add_all(show_stats_rows(histories))
+            session.commit()
+        for month, year in [(1, 2024), (None, None)]:
+            expected = analytics.top_shows_by_current_sales_speed(
+                self.shows, histories, month, year, n=10
+            )
+            async with FakeAsyncSession(self.Session()) as session:
+                rows = await get_top_shows_by_sales_speed(
+                    session, month, year, n=10
+                )
+            self.assertEqual(
+                [(name, key) for name, _, key, _ in rows],
+                [(name, key) for name, _, key in expected],
+            )
+            for row, (_, rate, _) in zip(rows, expected, strict=True):
+                self.assertAlmostEqual(row[1], rate)
+        self.assertEqual(
+            [(key, is_past) for _, _, key, is_past in rows],
+            [(5, False), (4, True), (2, False), (1, False)],
+        )
+
+    async def test_artists_from_index_match_python_report(self):
+        for month, year, include_past in [
+            (1, 2024, False),
+            (None, None, True),
+        ]:
+            totals = await self.totals(month, year, include_past)
+            async with FakeAsyncSession(self.Session()) as session:
+                actors = await get_show_actors(
+                    session, month, year, include_past
+                )
+            expected = analytics.top_artists_by_sales(
+                self.shows,
+                self.histories,
+                month=month,
+                year=year,
+                n=10,
+                include_past_shows=include_past,
+            )
+            self.assertTrue(expected)
+            self.assertEqual(
+                analytics.top_artists_by_sales_from_totals(
+                    totals, actors, n=10
+                ),
+                expected,
+            )
+
+    async def test_first_seen_lookups(self):
+        with self.Session() as session:
+            session.add_all(
+                [
+                    ShowGroupFirstSeen(group_key='1', first_seen=100),
+                    ShowGroupFirstSeen(group_key='e9', first_seen=300),
+                    ArtistFirstSeen(name='Иван', first_seen=100),
+                ]
+            )
+            session.commit()
+        async with FakeAsyncSession(self.Session()) as session:
+            groups = await get_group_first_seen(session, [1, 'e9', 2])
+            artists = await get_artist_first_seen(session, ['Иван', 'Анна'])
+            self.assertEqual(await get_group_first_seen(session, []), {})
+        # ключи возвращаются в том виде, в каком их отдают топ-запросы
+        self.assertEqual(groups, {1: 100, 'e9': 300})
+        self.assertEqual(artists, {'Иван': 100})
+
+    async def test_totals_values(self):
+        totals = {row.id: row for row in await self.totals(1, 2024, False)}
+        self.assertNotIn('e5', totals)
+        self.assertNotIn('e6', totals)
+        self.assertEqual((totals['e1'].gross, totals['e1'].returned), (25, 5))
+        self.assertEqual((totals['e3'].gross, totals['e3'].returned), (0, 10))
+        self.assertEqual((totals['e4'].gross, totals['e4'].returned), (0, 0))
+        self.assertEqual(totals['e1'].first_seen, 100)
+
+    async def test_report_months(self):
+        async with FakeAsyncSession(self.Session()) as session:
+            months = await get_report_months(session)
+        self.assertEqual(months, [(1, 2024), (2, 2024)])
+
+    async def test_report_shows(self):
+        async with FakeAsyncSession(self.Session()) as session:
+            shows = await get_report_shows(session, 1, 2024)
+            every = await get_report_shows(session)
+        # Прошедшие показы остаются: отчёты по истории включают их
+        self.assertEqual(
+            sorted(show.id for show in shows), ['e1', 'e2', 'e3', 'e4', 'e5']
+        )
+        self.assertIsInstance(shows[0], ShowRow)
+        self.assertEqual(len(every), len(self.shows))
+
+
+if __name__ == '__main__':
+    unittest.main()
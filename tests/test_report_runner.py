@@ -0,0 +1,172 @@
+import asyncio
+import time
+import unittest
+
+from services.profticket import analytics
+from services.profticket.history_store import HistoryStore
+from services.profticket.report_runner import (
+    ReportInput,
+    ReportRunner,
+    SeatPoint,
+    ShowRow,
+    compute_report,
+    history_store_from_input,
+)
+from telegram.db.models import Show, ShowSeatHistory, SnapshotRun
+
+START = 1_700_000_000
+KWARGS = {'month': 1, 'year': 2024, 'n': 10}
+
+
+def report_input(events: int, snapshots: int) -> ReportInput:
+    shows = [
+        ShowRow(
+            id=f'e{i}',
+            show_id=i // 3,
+            show_name=f'Show {i // 3}',
+            date=f'2024-01-{i % 28 + 1:02d}T19:00:00',
+            month=1,
+            year=2024,
+            actors='[]',
+            updated_at=None,
+            is_deleted=False,
+        )
+        for i in range(events)
+    ]
+    # Ряд «только изменения»: строка пишется при смене мест, а каждое
+    # обновление отмечено в runs
+    points = [
+        SeatPoint(f'e{i}', START + 600 * k, 500 - k * (i % 5) // 7)
+        for i in range(events)
+        for k in range(snapshots)
+        if k % 7 == 0 or (i % 5 and k * (i % 5) % 7 < i % 5)
+    ]
+    runs = [(1, 2024, START + 600 * k) for k in range(snapshots)]
+    return ReportInput(shows, HistoryStore.from_rows(points), [], runs)
+
+
+def slow_report(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def timed_report(seconds: float, spans: list) -> None:
+    started = time.perf_counter()
+    time.sleep(seconds)
+    spans.append((started, time.perf_counter()))
+
+
+async def max_event_loop_lag(task: asyncio.Future, tick: float = 0.01):
+    """Наибольшая задержка тика цикла событий, пока выполняется task"""
+    lag = 0.0
+    while not task.done():
+        started = time.perf_counter()
+        await asyncio.sleep(tick)
+        lag = max(lag, time.perf_counter() - started - tick)
+    return lag
+
+
+class ReportRunnerTestCase(unittest.IsolatedAsyncioTestCase):
+    def test_compute_report_matches_direct_call(self):
+        data = report_input(20, 50)
+        shows = [Show(**row._asdict()) for row in data.shows]
+        histories = [
+            ShowSeatHistory(show_id=event_id, timestamp=ts, seats=seats)
+            for event_id in data.points.event_ids
+            for ts, seats in zip(*data.points.series(event_id), strict=True)
+        ]
+        runs = [
+            SnapshotRun(month=month, year=year, timestamp=ts)
+            for month, year, ts in data.runs
+        ]
+        expanded = analytics.expand_seat_history(shows, histories, runs)
+        for report in (
+            analytics.calendar_pace_dashboard,
+            analytics.top_shows_by_sales_detailed,
+            analytics.top_shows_by_current_sales_speed,
+        ):
+            with self.subTest(report=report.__name__):
+                self.assertEqual(
+                    compute_report(report, data, KWARGS),
+                    report(shows=shows, histories=expanded, **KWARGS),
+                )
+        self.assertEqual(len(history_store_from_input(data)), 20)
+        self.assertIsNone(
+            compute_report(
+                analytics.calendar_pace_dashboard,
+                ReportInput(data.shows, HistoryStore.from_rows([]), [], []),
+                KWARGS,
+            )
+        )
+
+    async def test_event_loop_stays_responsive_during_heavy_report(self):
+        data = report_input(60, 400)
+
+        # Тот же отчёт прямо в обработчике блокирует цикл целиком
+        started = time.perf_counter()
+        expected = compute_report(
+            analytics.calendar_pace_dashboard, data, KWARGS
+        )
+        duration = time.perf_counter() - started
+
+        runner = ReportRunner(executor='process', workers=1, timeout=60)
+        try:
+            task = asyncio.ensure_future(
+                runner.run(
+                    compute_report,
+                    analytics.calendar_pace_dashboard,
+                    data,
+                    KWARGS,
+                )
+            )
+            lag = await max_event_loop_lag(task)
+            self.assertEqual(await task, expected)
+        finally:
+            runner.shutdown()
+        self.assertGreater(duration, 0.2)
+        self.assertLess(lag, min(0.1, duration / 2))
+
+    async def test_timeout(self):
+        runner = ReportRunner(executor='thread', workers=1, timeout=0.05)
+        try:
+            with self.assertRaises(TimeoutError):
+                await runner.run(slow_report, 0.5)
+        finally:
+            runner.shutdown()
+
+    async def test_timed_out_report_keeps_its_slot(self):
+        runner = ReportRunner(
+            executor='thread', workers=2, timeout=0.05, max_concurrent=1
+        )
+        spans = []
+        try:
+            with self.assertRaises(TimeoutError):
+                await runner.run(timed_report, 0.3, spans)
+            # Первый отчёт ещё считается: второй ждёт его слот
+            await runner.run(timed_report, 0.01, spans)
+        finally:
+            runner.shutdown()
+        (_, first_end), (second_start, _) = spans
+        self.assertGreaterEqual(second_start, first_end)
+
+    async def test_concurrent_reports_are_capped(self):
+        runner = ReportRunner(executor='thread', workers=4, max_concurrent=2)
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(runner.run(slow_report, 0.1) for _ in range(4))
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            runner.shutdown()
+        self.assertEqual(results, [0.1] * 4)
+        # Четыре отчёта по 0.1 с идут двумя волнами
+        self.assertGreaterEqual(elapsed, 0.2)
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            ReportRunner(executor='fiber')
+
+
+if __name__ == '__main__':
+    unittest.main()
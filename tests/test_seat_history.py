@@ -1,6 +1,9 @@
+import json
 import sys
 import types
 import unittest
+from datetime import datetime
+from unittest import mock
 
 from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
@@ -15,20 +18,39 @@ if not hasattr(sys.modules['aiogram'], 'Bot'):
 
     sys.modules['aiogram'].Bot = Bot
 
-from services.profticket import analytics
+from services.profticket import analytics, profticket_snapshoter
 from services.profticket.profticket_snapshoter import ShowUpdateService
 from telegram.db import Base
-from telegram.db.models import Show, ShowSeatHistory
+from telegram.db.models import (
+    Show,
+    ShowActor,
+    ShowSeatHistory,
+    SnapshotRun,
+)
+from telegram.db.user_operations import render_month_listing
 
 
 class DummyProfticket:
     def __init__(self, data):
         self.data = data
+        self.fingerprints = {}
+
+    async def collect_full_info(
+        self, month=None, year=None, unchanged_since=None
+    ):
+        return self.data
 
-    def set_date(self, month, year):
-        pass
 
-    async def collect_full_info(self):
+class FingerprintProfticket(DummyProfticket):
+    """Как ProfticketsInfo: None, если данные совпали с отпечатком"""
+
+    async def collect_full_info(
+        self, month=None, year=None, unchanged_since=None
+    ):
+        fingerprint = json.dumps(self.data, sort_keys=True)
+        self.fingerprints[(month, year)] = fingerprint
+        if fingerprint == unchanged_since:
+            return None
         return self.data
 
 
@@ -50,6 +72,9 @@ class FakeAsyncSession:
     async def rollback(self):
         self._session.rollback()
 
+    def get_bind(self):
+        return self._session.get_bind()
+
     async def __aenter__(self):
         return self
 
@@ -99,6 +124,107 @@ class SeatHistoryTestCase(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(row.show_id, 'e1')
             self.assertEqual(row.seats, 5)
 
+    async def test_bulk_upsert_updates_existing_rows(self):
+        def event(seats):
+            return {
+                'show_id': '1',
+                'theater': 't',
+                'scene': 's',
+                'show_name': 'n',
+                'date': 'd',
+                'duration': '1h',
+                'age': '0+',
+                'seats': seats,
+                'image': 'i',
+                'annotation': 'a',
+                'min_price': 0,
+                'max_price': 0,
+                'pushkin': False,
+                'buy_link': 'b',
+                'actors': ['ac'],
+            }
+
+        profticket = DummyProfticket({'e1': event(5), 'e2': event(7)})
+        service = ShowUpdateService(self.Session, profticket, DummyBot())
+        sync_session = self.Session()
+        async with FakeAsyncSession(sync_session) as session:
+            await service._update_month_data(session, 1, 2024)
+            profticket.data = {'e1': event(3), 'e2': event(7)}
+            await service._update_month_data(session, 1, 2024)
+
+            res = await session.execute(select(Show).order_by(Show.id))
+            shows = res.scalars().all()
+            self.assertEqual([s.seats for s in shows], [3, 7])
+            self.assertEqual([s.previous_seats for s in shows], [5, 7])
+
+            res = await session.execute(select(ShowSeatHistory))
+            self.assertEqual(len(res.scalars().all()), 4)
+
+    async def test_starts_at_is_parsed_at_ingest(self):
+        data = make_event(5)
+        data['date'] = '18 мая 2025, вс, 16:00'
+        profticket = DummyProfticket({'e1': data, 'e2': make_event(5)})
+        service = ShowUpdateService(self.Session, profticket, DummyBot())
+        async with FakeAsyncSession(self.Session()) as session:
+            await service._update_month_data(session, 5, 2025)
+            res = await session.execute(
+                select(Show.id, Show.starts_at).order_by(Show.id)
+            )
+            # SQLite отдаёт местное время театра без пояса
+            self.assertEqual(
+                res.all(),
+                [('e1', datetime(2025, 5, 18, 16, 0)), ('e2', None)],
+            )
+
+    async def test_show_actors_index_follows_cast_changes(self):
+        def event(actors):
+            data = make_event(5)
+            data['actors'] = actors
+            return data
+
+        async def actors(session):
+            res = await session.execute(
+                select(ShowActor.show_id, ShowActor.name).order_by(
+                    ShowActor.show_id, ShowActor.position
+                )
+            )
+            return res.all()
+
+        profticket = DummyProfticket(
+            {'e1': event([' Иван Петров ', '', 'Анна']), 'e2': event([])}
+        )
+        service = ShowUpdateService(self.Session, profticket, DummyBot())
+        async with FakeAsyncSession(self.Session()) as session:
+            await service._update_month_data(session, 1, 2024)
+            self.assertEqual(
+                await actors(session),
+                [
+                    ('e1', 'Иван Петров'),
+                    ('e1', 'Анна'),
+                ],
+            )
+
+            profticket.data = {
+                'e1': event([' Иван Петров ', '', 'Анна']),
+                'e2': event(['Олег']),
+            }
+            with mock.patch.object(
+                ShowUpdateService,
+                '_actor_rows',
+                wraps=ShowUpdateService._actor_rows,
+            ) as actor_rows:
+                await service._update_month_data(session, 1, 2024)
+            # Состав e1 не менялся — его строки не переписываются
+            actor_rows.assert_called_once_with('e2', '["Олег"]')
+            self.assertEqual(
+                await actors(session),
+                [
+                    ('e1', 'Иван Петров'),
+                    ('e1', 'Анна'),
+                    ('e2', 'Олег'),
+                ],
+            )
+
     def test_calculate_average_sales_rate_for_show(self):
         history_s1 = [
             ShowSeatHistory(show_id='s1', timestamp=10, seats=10),
@@ -568,3 +694,214 @@ class SeatHistoryTestCase(unittest.IsolatedAsyncioTestCase):
         name, pred_ts, _id, returned_date = predictions[0]
         self.assertEqual(returned_date, show_date)
         self.assertGreater(pred_ts, int(now.timestamp()))
+
+    async def test_listing_render_failure_keeps_update(self):
+        profticket = FingerprintProfticket({'e1': make_event(5)})
+        service = ShowUpdateService(self.Session, profticket, DummyBot())
+        with (
+            mock.patch.object(
+                profticket_snapshoter,
+                'get_month_listing',
+                side_effect=RuntimeError('render'),
+            ),
+            self.assertLogs(profticket_snapshoter.logger, 'ERROR'),
+        ):
+            async with FakeAsyncSession(self.Session()) as session:
+                updated = await service._update_month_data(session, 1, 2024)
+        # Данные уже в базе: обновление засчитано, список отрисуется
+        # по первому запросу
+        self.assertTrue(updated)
+        self.assertEqual(service.consecutive_errors, 0)
+        self.assertEqual(
+            service.applied_fingerprints[(1, 2024)],
+            profticket.fingerprints[(1, 2024)],
+        )
+
+    async def test_first_seen_rows_are_upserted_in_key_order(self):
+        show_rows = [
+            {'id': f'e{i}', 'show_id': show_id}
+            for i, show_id in enumerate(['9', '3', '5'])
+        ]
+        actor_rows = [
+            {'show_id': f'e{i}', 'name': name}
+            for i, name in enumerate(['Яна', 'Анна', 'Олег'])
+        ]
+        sync_session = self.Session()
+        async with FakeAsyncSession(sync_session) as session:
+            with mock.patch.object(
+                session, 'execute', wraps=session.execute
+            ) as execute:
+                await ShowUpdateService._update_first_seen(
+                    session, show_rows, show_rows, actor_rows, 100
+                )
+        inserts = [
+            call.args[0].compile().params
+            for call in execute.call_args_list
+            if call.args[0].is_insert
+        ]
+        # Одинаковый порядок блокировок у параллельно пишущих месяцев
+        self.assertEqual(
+            [v for k, v in inserts[0].items() if k.startswith('group_key')],
+            ['3', '5', '9'],
+        )
+        self.assertEqual(
+            [v for k, v in inserts[1].items() if k.startswith('name')],
+            ['Анна', 'Олег', 'Яна'],
+        )
+
+
+def make_event(seats):
+    return {
+        'show_id': '1',
+        'theater': 't',
+        'scene': 's',
+        'show_name': 'n',
+        'date': 'd',
+        'duration': '1h',
+        'age': '0+',
+        'seats': seats,
+        'image': 'i',
+        'annotation': 'a',
+        'min_price': 0,
+        'max_price': 0,
+        'pushkin': False,
+        'buy_link': 'b',
+        'actors': ['ac'],
+    }
+
+
+class ChangeOnlyHistoryTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(self.engine, expire_on_commit=False)
+        settings = profticket_snapshoter.settings
+        self.patches = [
+            mock.patch.object(settings, 'SEAT_HISTORY_CHANGES_ONLY', True),
+            mock.patch.object(settings, 'SEAT_HISTORY_HEARTBEAT', 3 * 3600),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.engine.dispose()
+
+    async def run_refreshes(
+        self, seat_series, start=1_700_000_000, profticket=None
+    ):
+        profticket = profticket or DummyProfticket({})
+        service = ShowUpdateService(self.Session, profticket, DummyBot())
+        async with FakeAsyncSession(self.Session()) as session:
+            for i, seats in enumerate(seat_series):
+                profticket.data = {'e1': make_event(seats)}
+                now = datetime.fromtimestamp(start + i * 1800)
+                with mock.patch.object(
+                    profticket_snapshoter, 'datetime'
+                ) as dt:
+                    dt.now.return_value = now
+                    await service._update_month_data(session, 1, 2024)
+            history = (
+                (await session.execute(select(ShowSeatHistory)))
+                .scalars()
+                .all()
+            )
+            runs = (await session.execute(select(SnapshotRun))).scalars().all()
+            shows = (await session.execute(select(Show))).scalars().all()
+        return shows, history, runs
+
+    async def test_rows_written_only_on_change_and_heartbeat(self):
+        # 12 обновлений по 30 минут, места меняются дважды
+        series = [10, 10, 10, 8, 8, 8, 8, 8, 8, 8, 8, 5]
+        shows, history, runs = await self.run_refreshes(series)
+        self.assertEqual(len(runs), len(series))
+        # первая запись, изменение на 4-м шаге, heartbeat через 3 часа
+        # после него и изменение на последнем шаге
+        self.assertEqual([h.seats for h in history], [10, 8, 8, 5])
+
+    async def test_analytics_match_dense_series(self):
+        series = [100, 100, 98, 98, 98, 95, 97, 97, 90, 90, 90, 90, 85]
+        series += [85] * 20 + [80, 79, 79, 70]
+        shows, history, runs = await self.run_refreshes(series)
+        self.assertLess(len(history), len(series))
+
+        start = runs[0].timestamp
+        dense = [
+            ShowSeatHistory(show_id='e1', timestamp=start + i * 1800, seats=s)
+            for i, s in enumerate(series)
+        ]
+        expanded = analytics.expand_seat_history(shows, history, runs)
+
+        self.assertEqual(
+            analytics.get_net_sales_and_returns(history),
+            analytics.get_net_sales_and_returns(dense),
+        )
+        self.assertEqual(
+            sorted((h.timestamp, h.seats) for h in expanded),
+            [(h.timestamp, h.seats) for h in dense],
+        )
+        self.assertEqual(
+            analytics.calculate_current_sales_rate(expanded),
+            analytics.calculate_current_sales_rate(dense),
+        )
+
+    async def test_unchanged_months_skip_show_writes(self):
+        series = [10, 10, 10, 8, 8, 8, 8, 8, 8, 8, 8, 5]
+        with mock.patch.object(
+            ShowUpdateService,
+            '_write_month_data',
+            autospec=True,
+            side_effect=ShowUpdateService._write_month_data,
+        ) as write:
+            shows, history, runs = await self.run_refreshes(
+                series, profticket=FingerprintProfticket({})
+            )
+        # Пишем только первое обновление и два изменения мест
+        self.assertEqual(write.call_count, 3)
+        self.assertEqual(len(runs), len(series))
+        self.assertEqual([h.seats for h in history], [10, 8, 8, 5])
+        self.assertEqual(shows[0].updated_at, runs[-1].timestamp)
+        expanded = analytics.expand_seat_history(shows, history, runs)
+        self.assertEqual(
+            [h.seats for h in sorted(expanded, key=lambda h: h.timestamp)],
+            series,
+        )
+
+    async def test_unchanged_month_clears_seat_diff(self):
+        with mock.patch.object(
+            ShowUpdateService,
+            '_write_month_data',
+            autospec=True,
+            side_effect=ShowUpdateService._write_month_data,
+        ) as write:
+            shows, _, _ = await self.run_refreshes(
+                [10, 8, 8], profticket=FingerprintProfticket({})
+            )
+        # Третье обновление без изменений: разница 10 -> 8 уже не новость
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual((shows[0].seats, shows[0].previous_seats), (8, 8))
+        self.assertNotIn('🔻', render_month_listing(shows).text)
+
+    async def test_unchanged_months_keep_dense_history(self):
+        series = [10, 10, 8]
+        with mock.patch.object(
+            profticket_snapshoter.settings, 'SEAT_HISTORY_CHANGES_ONLY', False
+        ):
+            _, history, _ = await self.run_refreshes(
+                series, profticket=FingerprintProfticket({})
+            )
+        self.assertEqual([h.seats for h in history], series)
+
+    def test_expand_keeps_dense_series_unchanged(self):
+        shows = [Show(id='s1', month=1, year=2024, updated_at=30)]
+        histories = [
+            ShowSeatHistory(show_id='s1', timestamp=ts, seats=10 - ts // 10)
+            for ts in (10, 20, 30)
+        ]
+        runs = [
+            SnapshotRun(month=1, year=2024, timestamp=ts)
+            for ts in (10, 20, 30, 40)
+        ]
+        expanded = analytics.expand_seat_history(shows, histories, runs)
+        self.assertEqual(len(expanded), 3)
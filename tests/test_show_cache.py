@@ -0,0 +1,351 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from services.profticket import profticket_api
+from services.profticket.profticket_api import ProfticketsInfo
+from services.profticket.show_cache import (
+    PersistedShow,
+    ShowCacheStore,
+    ShowDetailsCache,
+)
+from tests.test_profticket_api import FakeResponse
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ShowDetailsCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = ShowDetailsCache(
+            maxsize=2, ttl=10, stale_ttl=20, error_ttl=5, clock=self.clock
+        )
+
+    def test_fresh_stale_and_expired(self):
+        self.cache.store('s1', 'a')
+        self.assertEqual(self.cache.lookup('s1'), ('fresh', 'a'))
+        self.clock.now = 15
+        self.assertEqual(self.cache.lookup('s1'), ('stale', 'a'))
+        self.clock.now = 30
+        self.assertEqual(self.cache.lookup('s1'), ('miss', None))
+        stats = self.cache.stats()
+        self.assertEqual(
+            (stats.hits, stats.stale_hits, stats.misses, stats.expirations),
+            (1, 1, 1, 1),
+        )
+        # Истёкшая запись остаётся ради валидаторов и запасного значения
+        self.assertEqual(self.cache.peek('s1'), 'a')
+
+    def test_size_bound_evicts_least_recently_used(self):
+        self.cache.store('s1', 'a')
+        self.cache.store('s2', 'b')
+        self.cache.lookup('s1')
+        self.cache.store('s3', 'c')
+        self.assertEqual(self.cache.lookup('s2'), ('miss', None))
+        self.assertEqual(self.cache.lookup('s1'), ('fresh', 'a'))
+        self.assertEqual(self.cache.stats().evictions, 1)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_errors_are_cached_negatively(self):
+        self.cache.store_error('s1')
+        self.assertEqual(self.cache.lookup('s1'), ('fresh', None))
+        self.clock.now = 5
+        self.assertEqual(self.cache.lookup('s1'), ('miss', None))
+        stats = self.cache.stats()
+        self.assertEqual((stats.errors, stats.negative_hits), (1, 1))
+
+    def test_failed_refresh_keeps_stale_value(self):
+        self.cache.store('s1', 'a')
+        self.clock.now = 12
+        self.cache.store_error('s1')
+        # Повтор не раньше error_ttl, до тех пор — прежнее значение
+        self.assertEqual(self.cache.lookup('s1'), ('fresh', 'a'))
+        self.clock.now = 17
+        self.assertEqual(self.cache.lookup('s1'), ('stale', 'a'))
+
+    def test_revalidate_renews_entry_with_validators(self):
+        self.cache.store('s1', 'a', etag='"v1"', last_modified='Mon')
+        self.assertEqual(
+            self.cache.conditional_headers('s1'),
+            {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon'},
+        )
+        self.clock.now = 40
+        self.assertEqual(self.cache.lookup('s1'), ('miss', None))
+        self.assertEqual(self.cache.revalidate('s1'), 'a')
+        self.assertEqual(self.cache.lookup('s1'), ('fresh', 'a'))
+        self.assertIsNone(self.cache.revalidate('s2'))
+        self.assertEqual(self.cache.conditional_headers('s2'), {})
+
+    def test_restore_ages_entries_by_wall_clock(self):
+        wall = Clock()
+        wall.now = 1000
+        cache = ShowDetailsCache(
+            maxsize=2,
+            ttl=10,
+            stale_ttl=20,
+            clock=self.clock,
+            wall_clock=wall,
+        )
+        restored = cache.restore(
+            [
+                PersistedShow('old', 'x', 900, '"e"', None),
+                PersistedShow('stale', 'y', 985, None, None),
+                PersistedShow('fresh', 'z', 995, None, None),
+            ]
+        )
+        self.assertEqual(restored, 3)
+        # Самая старая вытеснена, свежие по времени загрузки — на месте
+        self.assertEqual(cache.lookup('old'), ('miss', None))
+        self.assertEqual(cache.lookup('stale'), ('stale', 'y'))
+        self.assertEqual(cache.lookup('fresh'), ('fresh', 'z'))
+        self.assertEqual(cache.take_dirty(), [])
+        cache.store(1, {'actors': []})
+        self.assertEqual(
+            cache.take_dirty(),
+            [PersistedShow(1, {'actors': []}, 1000, None, None)],
+        )
+
+
+class ProfticketShowCacheTestCase(unittest.IsolatedAsyncioTestCase):
+    def make_api(self):
+        api = ProfticketsInfo('42')
+        self.clock = Clock()
+        api._show_cache = ShowDetailsCache(
+            maxsize=10, ttl=10, stale_ttl=20, error_ttl=5, clock=self.clock
+        )
+        self.requests = []
+        self.actors = ['Иван']
+        self.fail = False
+
+        async def fake_request(url, headers=None):
+            self.requests.append((url, headers))
+            await asyncio.sleep(0.01)
+            if self.fail:
+                raise RuntimeError('boom')
+            etag = f'"{"-".join(self.actors)}"'
+            if (headers or {}).get('If-None-Match') == etag:
+                return FakeResponse(None, status_code=304)
+            detail = {'actors': list(self.actors)}
+            return FakeResponse(
+                {'response': {'show_detail': detail}}, headers={'ETag': etag}
+            )
+
+        api._make_request = fake_request
+        return api
+
+    async def test_stale_entry_is_served_and_refreshed(self):
+        api = self.make_api()
+        details = await api._get_show_details('s1')
+        self.assertEqual(details['actors'], ['Иван'])
+        await api._get_show_details('s1')
+        self.assertEqual(len(self.requests), 1)
+
+        self.actors = ['Олег']
+        self.clock.now = 15
+        # Устаревший состав отдаётся сразу, обновление идёт в фоне
+        details = await api._get_show_details('s1')
+        self.assertEqual(details['actors'], ['Иван'])
+        await asyncio.gather(*api._show_fetches.values())
+        details = await api._get_show_details('s1')
+        self.assertEqual(details['actors'], ['Олег'])
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_concurrent_misses_share_one_request(self):
+        api = self.make_api()
+        results = await asyncio.gather(
+            *(api._get_show_details('s1') for _ in range(3))
+        )
+        self.assertEqual([r['actors'] for r in results], [['Иван']] * 3)
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_errors_are_not_retried_every_cycle(self):
+        api = self.make_api()
+        self.fail = True
+        for _ in range(3):
+            details = await api._get_show_details('s1')
+            self.assertEqual(details, {'actors': [''], 'details': {}})
+        self.assertEqual(len(self.requests), 1)
+
+        self.clock.now = 5
+        self.fail = False
+        details = await api._get_show_details('s1')
+        self.assertEqual(details['actors'], ['Иван'])
+        stats = api.cache_stats()
+        self.assertEqual((stats.errors, stats.negative_hits), (1, 2))
+
+    async def test_unchanged_details_are_revalidated(self):
+        api = self.make_api()
+        await api._get_show_details('s1')
+        self.clock.now = 40
+        details = await api._get_show_details('s1')
+        self.assertEqual(details['actors'], ['Иван'])
+        self.assertEqual(self.requests[-1][1], {'If-None-Match': '"Иван"'})
+        self.assertEqual(api.cache_stats().revalidated, 1)
+
+
+class ShowDetailsPoolTestCase(unittest.IsolatedAsyncioTestCase):
+    def make_api(self, delays, failing=()):
+        api = ProfticketsInfo('42')
+        self.done = []
+
+        async def fake_request(url, headers=None):
+            show_id = url.split('show_id=')[1]
+            await asyncio.sleep(delays.get(show_id, 0.01))
+            self.done.append(show_id)
+            if show_id in failing:
+                raise RuntimeError(f'{show_id} is broken')
+            detail = {'actors': [show_id]}
+            return FakeResponse({'response': {'show_detail': detail}})
+
+        api._make_request = fake_request
+        return api
+
+    async def test_slow_show_holds_only_its_worker(self):
+        show_ids = [f's{i}' for i in range(10)]
+        api = self.make_api({'s0': 0.2})
+        with mock.patch.object(
+            profticket_api.settings, 'REQUEST_MAX_CONCURRENCY', 3
+        ):
+            details, summary = await api._collect_show_details(show_ids)
+        # Остальные девять прошли через два свободных обработчика
+        self.assertEqual(self.done[-1], 's0')
+        self.assertEqual(
+            {show_id: d['actors'] for show_id, d in details.items()},
+            {show_id: [show_id] for show_id in show_ids},
+        )
+        self.assertEqual((summary.total, summary.failed), (10, {}))
+
+    async def test_failures_are_summarised(self):
+        api = self.make_api({}, failing={'s1', 's2'})
+        clock = Clock()
+        api._show_cache.clock = clock
+        for show_id in ('s2', 's3'):
+            api._show_cache.store(show_id, {'actors': ['Иван']})
+        # Записи истекли: детали запрашиваются заново
+        clock.now = 10**6
+        details, summary = await api._collect_show_details(['s1', 's2', 's3'])
+        self.assertEqual(
+            summary.failed, {'s1': 's1 is broken', 's2': 's2 is broken'}
+        )
+        self.assertEqual(summary.fallback, 1)
+        self.assertEqual(details['s1']['actors'], [''])
+        self.assertEqual(details['s2']['actors'], ['Иван'])
+        self.assertEqual(details['s3']['actors'], ['s3'])
+
+
+class PersistentShowCacheTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'shows.sqlite3')
+
+    def test_store_round_trip_keeps_most_recent(self):
+        store = ShowCacheStore(self.path)
+        store.save(
+            [
+                PersistedShow(7, {'actors': ['Иван']}, 100, '"a"', None),
+                PersistedShow('s8', {'actors': []}, 200, None, 'Mon'),
+            ],
+            keep=10,
+        )
+        store.save([PersistedShow(9, {'actors': []}, 300, None, None)], keep=2)
+        self.assertEqual(
+            ShowCacheStore(self.path).load(limit=10),
+            [
+                PersistedShow('s8', {'actors': []}, 200, None, 'Mon'),
+                PersistedShow(9, {'actors': []}, 300, None, None),
+            ],
+        )
+
+    async def test_concurrent_callers_wait_for_restore(self):
+        ShowCacheStore(self.path).save(
+            [PersistedShow(7, {'actors': ['Иван']}, 100, None, None)], keep=10
+        )
+        with mock.patch.object(
+            profticket_api.settings, 'SHOW_CACHE_PATH', self.path
+        ):
+            api = ProfticketsInfo('42')
+
+        async def restore_and_peek():
+            await api._restore_show_cache()
+            return api._show_cache.peek(7)
+
+        # Три месяца одного цикла обновления стартуют одновременно
+        results = await asyncio.gather(*(restore_and_peek() for _ in range(3)))
+        self.assertEqual(results, [{'actors': ['Иван']}] * 3)
+        self.assertEqual(api.cache_stats().restored, 1)
+
+    async def test_failed_save_keeps_rows_dirty(self):
+        with mock.patch.object(
+            profticket_api.settings, 'SHOW_CACHE_PATH', self.path
+        ):
+            api = ProfticketsInfo('42')
+        api._show_cache.store(7, {'actors': ['Иван']})
+        with (
+            mock.patch.object(
+                api._show_cache_store, 'save', side_effect=OSError('full')
+            ),
+            self.assertLogs(profticket_api.logger, 'ERROR'),
+        ):
+            await api._save_show_cache()
+        # Следующее сохранение пишет строки, не попавшие на диск
+        await api._save_show_cache()
+        self.assertEqual(
+            [row.show_id for row in ShowCacheStore(self.path).load(10)], [7]
+        )
+
+    async def test_cold_start_warms_from_disk(self):
+        events = {
+            'response': {
+                'items': [{'events': [{'id': 'e1', 'show': {'show_id': 5}}]}]
+            }
+        }
+        requests = []
+
+        def make_api():
+            api = ProfticketsInfo('42')
+
+            async def fake_request(url, headers=None):
+                requests.append(url)
+                if 'event/show' in url:
+                    detail = {'actors': ['Иван']}
+                    return FakeResponse({'response': {'show_detail': detail}})
+                if 'events-data' in url:
+                    return FakeResponse({'events': {'e1': {'seats': 3}}})
+                if '&page=1&' in url:
+                    return FakeResponse(events)
+                return FakeResponse({'response': {'items': []}})
+
+            api._make_request = fake_request
+            return api
+
+        with (
+            mock.patch.object(
+                profticket_api.settings, 'SHOW_CACHE_PATH', self.path
+            ),
+            mock.patch.object(profticket_api.asyncio, 'sleep'),
+        ):
+            first = await make_api().collect_full_info(5, 2024)
+            detail_requests = [url for url in requests if 'event/show' in url]
+            self.assertEqual(len(detail_requests), 1)
+
+            # Новый экземпляр — как после перезапуска бота
+            requests.clear()
+            api = make_api()
+            second = await api.collect_full_info(5, 2024)
+        self.assertEqual(second, first)
+        self.assertEqual(second['e1']['actors'], ['Иван'])
+        self.assertFalse([url for url in requests if 'event/show' in url])
+        self.assertEqual(api.cache_stats().restored, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import json
+import random
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from services.profticket import analytics
+from services.profticket.history_store import HistoryStore
+from services.profticket.show_stats import advance_show_stats
+from telegram.db import Base
+from telegram.db.models import (
+    ArtistFirstSeen,
+    Show,
+    ShowGroupFirstSeen,
+    ShowSeatHistory,
+    ShowStats,
+    SnapshotRun,
+)
+from tests.test_seat_history import (
+    DummyBot,
+    DummyProfticket,
+    FakeAsyncSession,
+    ShowUpdateService,
+    make_event,
+    profticket_snapshoter,
+)
+
+START = 1_700_000_000
+
+
+def show_stats_rows(histories) -> list[ShowStats]:
+    """Сводка show_stats, как её построил бы снапшотер по этим снимкам"""
+    stats = {}
+    for row in sorted(histories, key=lambda r: r.timestamp):
+        stats[row.show_id] = advance_show_stats(
+            stats.get(row.show_id), row.show_id, row.timestamp, row.seats
+        )
+    return [ShowStats(**row) for row in stats.values()]
+
+
+class ShowStatsTestCase(unittest.TestCase):
+    def test_advance_accumulates_sales_and_returns(self):
+        stats = None
+        for ts, seats in [(0, 100), (900, 90), (1800, 95), (2700, 80)]:
+            stats = advance_show_stats(stats, 'e1', START + ts, seats)
+        self.assertEqual((stats['gross'], stats['returned']), (25, 5))
+        self.assertEqual(stats['snapshots'], 4)
+        self.assertEqual(stats['first_seen'], START)
+        self.assertEqual(
+            (stats['last_timestamp'], stats['last_seats']), (START + 2700, 80)
+        )
+
+    def test_window_keeps_last_day(self):
+        stats = None
+        for hour in range(30):
+            stats = advance_show_stats(stats, 'e1', START + hour * 3600, 100)
+        window = json.loads(stats['rate_window'])
+        self.assertEqual(window[0][0], START + 5 * 3600)
+        self.assertEqual(len(window), 25)
+        # Продаж нет: np.polyfit даёт нулевую скорость с точностью до шума
+        self.assertAlmostEqual(stats['current_rate'] or 0.0, 0.0)
+        self.assertEqual(stats['rate_intervals'], 24)
+
+    def test_rate_matches_full_series(self):
+        rnd = random.Random(3)
+        histories = []
+        for i in range(20):
+            seats = 300
+            ts = START
+            for _ in range(rnd.randint(1, 80)):
+                histories.append(
+                    ShowSeatHistory(show_id=f'e{i}', timestamp=ts, seats=seats)
+                )
+                ts += rnd.choice([300, 900, 1800, 3600])
+                seats = max(0, seats - rnd.choice([-1, 0, 1, 2, 4]))
+        store = HistoryStore.from_rows(histories)
+        gross, returned = store.sales_and_returns()
+        for row in show_stats_rows(histories):
+            i = store.positions[row.show_id]
+            timestamps, seats = store.series(row.show_id)
+            self.assertEqual(
+                (row.gross, row.returned), (gross[i], returned[i])
+            )
+            self.assertEqual(row.snapshots, len(timestamps))
+            self.assertEqual(
+                row.rate_intervals,
+                analytics.series_valid_intervals(timestamps),
+            )
+            expected = analytics.series_sales_rate(timestamps, seats)
+            if expected is None:
+                self.assertIsNone(row.current_rate)
+            else:
+                self.assertAlmostEqual(row.current_rate, expected)
+
+
+class SnapshotterShowStatsTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(self.engine, expire_on_commit=False)
+
+    async def asyncTearDown(self):
+        self.engine.dispose()
+
+    async def run_refreshes(self, seat_series):
+        profticket = DummyProfticket({})
+        service = ShowUpdateService(self.Session, profticket, DummyBot())
+        async with FakeAsyncSession(self.Session()) as session:
+            for i, seats in enumerate(zip(*seat_series.values(), strict=True)):
+                profticket.data = {
+                    event_id: make_event(value)
+                    for event_id, value in zip(seat_series, seats, strict=True)
+                }
+                now = datetime.fromtimestamp(START + i * 1800)
+                with mock.patch.object(
+                    profticket_snapshoter, 'datetime'
+                ) as dt:
+                    dt.now.return_value = now
+                    await service._update_month_data(session, 1, 2024)
+            shows = (await session.execute(select(Show))).scalars().all()
+            history = (
+                (await session.execute(select(ShowSeatHistory)))
+                .scalars()
+                .all()
+            )
+            runs = (await session.execute(select(SnapshotRun))).scalars().all()
+            stats = (await session.execute(select(ShowStats))).scalars().all()
+        return (
+            shows,
+            analytics.expand_seat_history(shows, history, runs),
+            stats,
+        )
+
+    async def check_matches_history(self):
+        series = {
+            'e1': [100, 100, 98, 98, 95, 97, 97, 90] + [90] * 10 + [85, 80],
+            'e2': [50, 48, 45, 45, 40, 41, 41, 41] + [41] * 10 + [39, 30],
+        }
+        shows, history, stats = await self.run_refreshes(series)
+        store = HistoryStore.from_rows(history)
+        totals = {
+            row.id: row
+            for row in analytics.collect_store_sales_totals(shows, store)
+        }
+        self.assertEqual(len(stats), 2)
+        for row in stats:
+            timestamps, seats = store.series(row.show_id)
+            self.assertEqual(
+                (row.gross, row.returned, row.first_seen),
+                (
+                    totals[row.show_id].gross,
+                    totals[row.show_id].returned,
+                    totals[row.show_id].first_seen,
+                ),
+            )
+            self.assertEqual(row.snapshots, len(series[row.show_id]))
+            self.assertEqual(row.last_seats, series[row.show_id][-1])
+            self.assertAlmostEqual(
+                row.current_rate,
+                analytics.series_sales_rate(timestamps, seats),
+            )
+
+    async def test_dense_history(self):
+        with mock.patch.object(
+            profticket_snapshoter.settings, 'SEAT_HISTORY_CHANGES_ONLY', False
+        ):
+            await self.check_matches_history()
+
+    async def test_changes_only_history(self):
+        settings = profticket_snapshoter.settings
+        with (
+            mock.patch.object(settings, 'SEAT_HISTORY_CHANGES_ONLY', True),
+            mock.patch.object(settings, 'SEAT_HISTORY_HEARTBEAT', 3 * 3600),
+        ):
+            await self.check_matches_history()
+
+    async def test_first_seen_index(self):
+        def event(show_id, actors):
+            return make_event(100) | {'show_id': show_id, 'actors': actors}
+
+        profticket = DummyProfticket({})
+        service = ShowUpdateService(self.Session, profticket, DummyBot())
+        refreshes = [
+            {'e1': event('1', ['Иван', 'Народный артист России'])},
+            # новый показ той же постановки и новая постановка
+            {
+                'e1': event('1', ['Иван']),
+                'e2': event('1', ['Иван']),
+                'e3': event('2', ['Иван', 'Анна']),
+            },
+            # в давнюю постановку ввели нового артиста
+            {'e1': event('1', ['Иван', 'Олег']), 'e3': event('2', ['Анна'])},
+        ]
+        async with FakeAsyncSession(self.Session()) as session:
+            for i, data in enumerate(refreshes):
+                profticket.data = data
+                now = datetime.fromtimestamp(START + i * 1800)
+                with mock.patch.object(
+                    profticket_snapshoter, 'datetime'
+                ) as dt:
+                    dt.now.return_value = now
+                    await service._update_month_data(session, 1, 2024)
+            groups = await session.execute(select(ShowGroupFirstSeen))
+            artists = await session.execute(select(ArtistFirstSeen))
+            groups = {
+                row.group_key: row.first_seen for row in groups.scalars()
+            }
+            artists = {row.name: row.first_seen for row in artists.scalars()}
+        self.assertEqual(groups, {'1': START, '2': START + 1800})
+        # Олег появился позже, но отслеживается с начала своей постановки
+        self.assertEqual(
+            artists, {'Иван': START, 'Анна': START + 1800, 'Олег': START}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
 import unittest
+from unittest import mock
 
 from services.profticket import utils as pt_utils
-from services.profticket.profticket_api import ProfticketsInfo
+from services.profticket.profticket_api import (
+    ProfticketsInfo,
+    UserAgentProvider,
+)
 from telegram import tg_utils
 
 
@@ -35,10 +39,18 @@ class UtilsTestCase(unittest.TestCase):
         self.assertEqual(url, exp)
 
     def test_get_headers(self):
-        api = ProfticketsInfo('42')
-        api.user_agent_provider.get_random_user_agent = lambda: 'UA'
-        headers = api._get_headers()
-        self.assertEqual(headers['User-Agent'], 'UA')
+        agents = iter(['UA', 'other'])
+        with mock.patch.object(
+            UserAgentProvider,
+            'get_random_user_agent',
+            lambda self: next(agents),
+        ):
+            api = ProfticketsInfo('42')
+            headers = api._get_headers()
+            # User-Agent выбирается один раз на сессию
+            self.assertEqual(headers['User-Agent'], 'UA')
+            self.assertEqual(api._get_headers()['User-Agent'], 'UA')
+        self.assertNotIn('Connection', headers)
 
     def test_split_message_by_separator(self):
         text = 'a\n------------------------\nb\n------------------------\nc'